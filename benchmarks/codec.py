@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Micro-benchmarks of encoding requests, decoding responses and the helpers
+on the request path. No server is needed.
+
+    python benchmarks/codec.py --json
+    python benchmarks/codec.py --save benchmarks/codec_baseline.json
+    python benchmarks/codec.py --baseline benchmarks/codec_baseline.json
+
+Timings are also stored relative to a pure Python reference loop, and
+a baseline is compared by these ratios so it stays usable on a machine
+faster or slower than the one it was recorded on. The comparison exits
+with status 1 if a case is slower than the baseline by more than the
+tolerance.
+'''
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import uuid
+
+import msgpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tarantool.connection import Connection
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_DATA,
+    IPROTO_ERROR,
+    IPROTO_SCHEMA_ID,
+    IPROTO_SYNC,
+    REQUEST_TYPE_ERROR
+)
+from tarantool.request import (
+    RequestAuthenticate,
+    RequestCall,
+    RequestDelete,
+    RequestEval,
+    RequestInsert,
+    RequestJoin,
+    RequestOK,
+    RequestPing,
+    RequestReplace,
+    RequestSelect,
+    RequestSubscribe,
+    RequestUpdate,
+    RequestUpsert
+)
+from tarantool.response import Response
+from tarantool.schema import (
+    SchemaIndex,
+    SchemaSpace
+)
+from tarantool.utils import (
+    check_key,
+    greeting_decode,
+    perf_counter
+)
+
+GREETING = (b'Tarantool 2.2.1 (Binary) 3b151c25-4c4a-4b5d-8042-0f1b3a6f61c3'
+            .ljust(63) + b'\n' +
+            b'c2FsdHNhbHRzYWx0c2FsdHNhbHRzYWx0c2FsdHNhbHQ='.ljust(63) + b'\n')
+SALT = b'saltsaltsaltsaltsaltsaltsaltsalt'
+UUID = str(uuid.UUID(int=1))
+TUPLE = [1, 'name', 2.5, 'x' * 32, 100500]
+
+
+def connection():
+    conn = Connection('localhost', 3301, connect_now=False)
+    space = SchemaSpace([512, 1, 'users', 'memtx', 0, {},
+                         [{'name': 'id', 'type': 'unsigned'},
+                          {'name': 'name', 'type': 'string'},
+                          {'name': 'rating', 'type': 'number'},
+                          {'name': 'bio', 'type': 'string'},
+                          {'name': 'visits', 'type': 'unsigned'}]],
+                        conn.schema.schema)
+    SchemaIndex([512, 0, 'primary', 'tree', {'unique': True},
+                 [[0, 'unsigned']]], space)
+    SchemaIndex([512, 1, 'name', 'tree', {'unique': False},
+                 [[1, 'string']]], space)
+    return conn
+
+
+def response(body, code=0):
+    '''
+    :return: a response packet without the size, as passed to `Response`
+    '''
+    return msgpack.packb({IPROTO_CODE: code, IPROTO_SYNC: 0,
+                          IPROTO_SCHEMA_ID: 1}) + msgpack.packb(body)
+
+
+def cases():
+    '''
+    :return: functions without arguments by names
+    :rtype: dict
+    '''
+    conn = connection()
+    small = response({IPROTO_DATA: [TUPLE]})
+    wide = response({IPROTO_DATA: [list(range(100)) + ['x' * 10] * 100]})
+    large = response({IPROTO_DATA: [[i] + TUPLE[1:] for i in range(1000)]})
+    error = response({IPROTO_ERROR: 'Duplicate key exists'},
+                     REQUEST_TYPE_ERROR | 3)
+    ops = [['+', 'visits', 1], ['=', 'name', 'new'], ['=', 3, 'bio']]
+    schema = conn.schema
+
+    def decode_error():
+        conn.error = False
+        try:
+            Response(conn, error)
+        finally:
+            conn.error = True
+
+    def reference():
+        total = 0
+        for i in range(100):
+            total += i * i
+        return total
+
+    return {
+        'reference': reference,
+        'request.ping': lambda: bytes(RequestPing(conn)),
+        'request.select': lambda: bytes(
+            RequestSelect(conn, 512, 0, [1], 0, 0xffffffff, 0)),
+        'request.insert': lambda: bytes(RequestInsert(conn, 512, TUPLE)),
+        'request.replace': lambda: bytes(RequestReplace(conn, 512, TUPLE)),
+        'request.delete': lambda: bytes(RequestDelete(conn, 512, 0, [1])),
+        'request.update': lambda: bytes(
+            RequestUpdate(conn, 512, 0, [1], [['+', 4, 1], ['=', 1, 'x']])),
+        'request.upsert': lambda: bytes(
+            RequestUpsert(conn, 512, 0, TUPLE, [['+', 4, 1]])),
+        'request.call': lambda: bytes(
+            RequestCall(conn, 'func', [1, 'arg'], False)),
+        'request.call_16': lambda: bytes(
+            RequestCall(conn, 'func', [1, 'arg'], True)),
+        'request.eval': lambda: bytes(
+            RequestEval(conn, 'return ...', [1, 'arg'])),
+        'request.authenticate': lambda: bytes(
+            RequestAuthenticate(conn, SALT, 'user', 'password')),
+        'request.join': lambda: bytes(RequestJoin(conn, UUID)),
+        'request.subscribe': lambda: bytes(
+            RequestSubscribe(conn, UUID, UUID, {1: 100, 2: 200})),
+        'request.ok': lambda: bytes(RequestOK(conn, 1)),
+        'response.small': lambda: Response(conn, small),
+        'response.wide': lambda: Response(conn, wide),
+        'response.large': lambda: Response(conn, large),
+        'response.error': decode_error,
+        'check_key.scalar': lambda: check_key(1),
+        'check_key.list': lambda: check_key([1, 'a', 2.5]),
+        'check_key.select_all': lambda: check_key(None, select=True),
+        'greeting_decode': lambda: greeting_decode(GREETING),
+        'schema.get_space': lambda: schema.get_space('users'),
+        'schema.get_index': lambda: schema.get_index('users', 'name'),
+        'schema.get_field': lambda: schema.get_field('users', 'visits'),
+        'ops_process': lambda: conn._ops_process('users', ops)
+    }
+
+
+def calibrate(func, min_time):
+    '''
+    :return: number of calls taking at least `min_time` seconds
+    '''
+    number = 1
+    while True:
+        if timeit(func, number) >= min_time:
+            return number
+        number *= 2
+
+
+def timeit(func, number):
+    started = perf_counter()
+    for _ in range(number):
+        func()
+    return perf_counter() - started
+
+
+def measure(func, reference, min_time, repeat):
+    '''
+    Time the function and the reference loop alternately, so both are
+    affected by the same changes of the load of the machine.
+
+    :return: the best time of a call and of the reference loop in
+        nanoseconds
+    '''
+    number = calibrate(func, min_time)
+    ref_number = calibrate(reference, min_time)
+    best = ref_best = None
+    for _ in range(repeat):
+        elapsed = timeit(func, number) / number
+        best = elapsed if best is None else min(best, elapsed)
+        elapsed = timeit(reference, ref_number) / ref_number
+        ref_best = elapsed if ref_best is None else min(ref_best, elapsed)
+    return best * 1e9, ref_best * 1e9
+
+
+def run(selected, min_time, repeat):
+    '''
+    :param selected: function telling if a case is to be run by its name
+    '''
+    functions = cases()
+    reference = functions.pop('reference')
+    results = {}
+    references = []
+    for name in sorted(functions):
+        if not selected(name):
+            continue
+        ns, ref_ns = measure(functions[name], reference, min_time, repeat)
+        references.append(ref_ns)
+        results[name] = {'ns': round(ns, 1),
+                         'relative': round(ns / ref_ns, 4)}
+    return {
+        'version': 1,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'msgpack': '.'.join(map(str, msgpack.version)),
+        'reference_ns': round(min(references or [0]), 1),
+        'results': results
+    }
+
+
+def changes(report, baseline):
+    '''
+    :return: relative changes of the cases present in the baseline
+    :rtype: dict
+    '''
+    return dict((name, result['relative'] /
+                 baseline['results'][name]['relative'] - 1)
+                for name, result in report['results'].items()
+                if name in baseline['results'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', action='append', default=[],
+                        help='run the cases whose names contain this')
+    parser.add_argument('--min-time', type=float, default=0.01,
+                        help='seconds of a measurement')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with this file')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed slowdown relative to the baseline')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='times to measure regressed cases again '
+                        'before failing, the best result is kept')
+    args = parser.parse_args()
+
+    filters = args.filter or ['']
+    report = run(lambda name: any(part in name for part in filters),
+                 args.min_time, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        for _ in range(args.retries):
+            regressions = [name for name, change
+                           in changes(report, baseline).items()
+                           if change > args.tolerance]
+            if not regressions:
+                break
+            retry = run(lambda name: name in regressions, args.min_time,
+                        args.repeat)
+            for name, result in retry['results'].items():
+                if result['relative'] < report['results'][name]['relative']:
+                    report['results'][name] = result
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    elif baseline is None:
+        for name, result in sorted(report['results'].items()):
+            print('%-24s %10.1f ns' % (name, result['ns']))
+    if baseline is None:
+        return 0
+
+    for field in ('implementation', 'python', 'msgpack'):
+        if baseline.get(field) != report[field]:
+            print('Warning: the baseline was recorded with %s %s, this is '
+                  '%s' % (field, baseline.get(field), report[field]),
+                  file=sys.stderr)
+    diff = changes(report, baseline)
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        if name not in diff:
+            print('%-24s %10.1f ns %10s' % (name, result['ns'], 'new'),
+                  file=sys.stderr)
+            continue
+        mark = ''
+        if diff[name] > args.tolerance:
+            mark = 'REGRESSION'
+            regressions.append(name)
+        print('%-24s %10.1f ns %+9.1f%% %s' % (
+            name, result['ns'], diff[name] * 100, mark), file=sys.stderr)
+    if regressions:
+        print('%d of %d cases regressed by more than %d%%: %s' % (
+            len(regressions), len(report['results']), args.tolerance * 100,
+            ', '.join(regressions)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
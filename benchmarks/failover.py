@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Recovery of clients from a failure of an instance: a steady stream of
+SELECT requests is sent through a Connection or a MeshConnection while
+an instance is killed, paused or cut off, and the failed requests, the
+time to recovery and the latency spikes are reported for every
+combination of the reconnect settings and strategies.
+
+    python benchmarks/failover.py --fault kill pause blackhole
+    python benchmarks/failover.py --client mesh --strategy round_robin \\
+        least_outstanding --reconnect-delay 0.01 0.1 --json
+    python benchmarks/failover.py --addrs 10.0.0.1:3301 10.0.0.2:3301 \\
+        --kill-cmd 'ssh {host} systemctl kill -s STOP tarantool' \\
+        --restore-cmd 'ssh {host} systemctl kill -s CONT tarantool'
+
+By default the instances are in-process stand-in servers (see
+`tarantool.standin`): "kill" stops one and starts it again on the same
+port, "pause" freezes it like a stopped process and "blackhole" drops
+all traffic like a firewall. With --addrs the fault is injected by shell
+commands formatted with the host and the port of the instance.
+
+Requests are sent at a fixed rate and the latency of a request delayed
+by a previous one is counted from the time it was due, so a stalled
+client shows up as a latency spike instead of a lower rate. A request
+is slow if it takes more than --spike-factor times the p99 before the
+fault; the time to recovery is the time from the fault to the end of
+the last failed or slow request.
+'''
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tarantool.connection import Connection
+from tarantool.error import (
+    DatabaseError,
+    NetworkWarning
+)
+from tarantool.mesh_connection import (
+    LatencyStrategy,
+    LeastOutstandingStrategy,
+    MeshConnection,
+    PowerOfTwoStrategy,
+    RoundRobinStrategy,
+    addr_key,
+    parse_uri
+)
+from tarantool.metrics import (
+    Histogram,
+    error_name
+)
+from tarantool.standin import StandinServer
+from tarantool.utils import perf_counter
+
+STRATEGIES = {
+    'round_robin': RoundRobinStrategy,
+    'least_outstanding': LeastOutstandingStrategy,
+    'latency': LatencyStrategy,
+    'power_of_two': PowerOfTwoStrategy
+}
+
+
+class StandinCluster(object):
+    '''
+    Stand-in servers with the same space on each of them.
+    '''
+
+    def __init__(self, nodes, space):
+        self.servers = [StandinServer().start() for _ in range(nodes)]
+        for server in self.servers:
+            server.create_space(space)
+        self.addrs = [{'host': server.host, 'port': server.port}
+                      for server in self.servers]
+
+    def _server(self, addr):
+        return self.servers[self.addrs.index(addr)]
+
+    def inject(self, fault, addr):
+        server = self._server(addr)
+        if fault == 'kill':
+            server.stop()
+        elif fault == 'pause':
+            server.pause()
+        else:
+            server.blackhole = True
+
+    def restore(self, fault, addr):
+        server = self._server(addr)
+        if fault == 'kill':
+            server.start()
+        elif fault == 'pause':
+            server.resume()
+        else:
+            server.blackhole = False
+            # Connections opened while the traffic was dropped are never
+            # greeted, as if the SYN was lost
+            server.drop_connections()
+
+    def close(self):
+        for server in self.servers:
+            server.stop()
+
+
+class CommandCluster(object):
+    '''
+    Real instances whose failures are injected by shell commands.
+    '''
+
+    def __init__(self, addrs, kill_cmd, restore_cmd):
+        self.addrs = addrs
+        self.kill_cmd = kill_cmd
+        self.restore_cmd = restore_cmd
+
+    def _run(self, command, addr):
+        subprocess.check_call(command.format(**addr), shell=True)
+
+    def inject(self, fault, addr):
+        self._run(self.kill_cmd, addr)
+
+    def restore(self, fault, addr):
+        self._run(self.restore_cmd, addr)
+
+    def close(self):
+        pass
+
+
+def connect(config, cluster, strategy, delay, attempts):
+    kwargs = dict(socket_timeout=config.socket_timeout,
+                  connection_timeout=config.socket_timeout,
+                  reconnect_delay=delay, reconnect_max_attempts=attempts,
+                  user=config.user, password=config.password)
+    if config.client == 'connection':
+        addr = cluster.addrs[0]
+        return Connection(addr['host'], addr['port'], **kwargs)
+    return MeshConnection(cluster.addrs, strategy_class=STRATEGIES[strategy],
+                          **kwargs)
+
+
+def victim(conn, cluster):
+    '''
+    :return: the address of the instance the client sends requests to
+    '''
+    if isinstance(conn, MeshConnection) and conn._balancing:
+        return cluster.addrs[0]
+    for addr in cluster.addrs:
+        if addr_key(addr) == (conn.host, conn.port):
+            return addr
+    return cluster.addrs[0]
+
+
+def load(conn, config, cluster, fault):
+    '''
+    Send requests at the configured rate, inject the fault after the
+    warm-up and restore the instance after the fault duration.
+
+    :return: (due time, latency, error name or None) of every request
+        and times of the fault and of the restore relative to the start
+    '''
+    addr = victim(conn, cluster)
+    samples = []
+    started = perf_counter()
+    injected = restored = None
+    period = 1.0 / config.rate
+    for number in itertools.count():
+        due = number * period
+        now = perf_counter() - started
+        if due >= config.duration:
+            break
+        if injected is None and now >= config.warmup:
+            cluster.inject(fault, addr)
+            injected = perf_counter() - started
+        if (restored is None and injected is not None and
+                now >= injected + config.fault_duration):
+            cluster.restore(fault, addr)
+            restored = perf_counter() - started
+        if due > now:
+            time.sleep(due - now)
+        error = None
+        try:
+            conn.select(config.space, number % config.keys)
+        except DatabaseError as e:
+            error = error_name(e)
+        samples.append((due, perf_counter() - started - due, error))
+    if injected is not None and restored is None:
+        cluster.restore(fault, addr)
+        restored = perf_counter() - started
+    return samples, injected, restored
+
+
+def analyze(samples, injected, restored, spike_factor):
+    before = Histogram()
+    during = Histogram()
+    for due, latency, error in samples:
+        if error is None:
+            (before if due < injected else during).record(latency)
+    threshold = max(before.percentile(99) * spike_factor, 0.001)
+    errors = {}
+    spikes = 0
+    recovered = injected
+    for due, latency, error in samples:
+        if due + latency < injected:
+            continue
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+        elif latency > threshold:
+            spikes += 1
+        else:
+            continue
+        recovered = max(recovered, due + latency)
+    return {
+        'requests': len(samples),
+        'failed': sum(errors.values()),
+        'errors': errors,
+        'spikes': spikes,
+        'spike_threshold': threshold,
+        'recovery_time': recovered - injected,
+        'recovery_after_restore': max(recovered - restored, 0.0),
+        'fault_duration': restored - injected,
+        'before': before.to_dict(),
+        'during': during.to_dict()
+    }
+
+
+def run(config, cluster):
+    results = []
+    strategies = config.strategy if config.client == 'mesh' else [None]
+    for fault, strategy, delay, attempts in itertools.product(
+            config.fault, strategies, config.reconnect_delay,
+            config.reconnect_max_attempts):
+        conn = connect(config, cluster, strategy, delay, attempts)
+        try:
+            samples, injected, restored = load(conn, config, cluster, fault)
+        finally:
+            conn.close()
+        result = analyze(samples, injected, restored, config.spike_factor)
+        result.update({'client': config.client, 'fault': fault,
+                       'strategy': strategy, 'reconnect_delay': delay,
+                       'reconnect_max_attempts': attempts})
+        results.append(result)
+        if not config.json:
+            print_result(result)
+    return results
+
+
+def print_result(result):
+    setting = '%s %s delay=%g attempts=%d' % (
+        result['fault'], result['strategy'] or result['client'],
+        result['reconnect_delay'], result['reconnect_max_attempts'])
+    print('%-48s failed %5d/%-6d slow %5d recovery %7.3fs '
+          '(%+.3fs after restore) p99 %7.2f -> %7.2f ms max %8.2f ms' % (
+              setting, result['failed'], result['requests'],
+              result['spikes'], result['recovery_time'],
+              result['recovery_after_restore'],
+              result['before']['p99'] * 1000,
+              result['during']['p99'] * 1000,
+              result['during']['max'] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--client', choices=('connection', 'mesh'),
+                        default='connection')
+    parser.add_argument('--strategy', nargs='+', choices=sorted(STRATEGIES),
+                        default=['round_robin'],
+                        help='strategies of the mesh client')
+    parser.add_argument('--fault', nargs='+',
+                        choices=('kill', 'pause', 'blackhole'),
+                        default=['kill'])
+    parser.add_argument('--reconnect-delay', nargs='+', type=float,
+                        default=[0.1])
+    parser.add_argument('--reconnect-max-attempts', nargs='+', type=int,
+                        default=[10])
+    parser.add_argument('--socket-timeout', type=float, default=1.0,
+                        help='socket and connection timeout')
+    parser.add_argument('--nodes', type=int, default=3,
+                        help='number of stand-in servers')
+    parser.add_argument('--addrs', nargs='+',
+                        help='addresses of real instances, the first one '
+                        'fails unless a balancing strategy is used')
+    parser.add_argument('--kill-cmd', help='command injecting the fault')
+    parser.add_argument('--restore-cmd', help='command restoring the '
+                        'instance')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--space', default='bench')
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200.0,
+                        help='requests per second')
+    parser.add_argument('--warmup', type=float, default=1.0,
+                        help='seconds before the fault')
+    parser.add_argument('--fault-duration', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=6.0,
+                        help='seconds of a run')
+    parser.add_argument('--spike-factor', type=float, default=10.0)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    config = parser.parse_args()
+    if config.addrs and not (config.kill_cmd and config.restore_cmd):
+        parser.error('--addrs requires --kill-cmd and --restore-cmd')
+
+    if config.addrs:
+        config.fault = ['command']
+        cluster = CommandCluster([parse_uri(uri) for uri in config.addrs],
+                                 config.kill_cmd, config.restore_cmd)
+    else:
+        cluster = StandinCluster(config.nodes, config.space)
+    warnings.simplefilter('ignore', NetworkWarning)
+    try:
+        results = run(config, cluster)
+    finally:
+        cluster.close()
+    if config.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
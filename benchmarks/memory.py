@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Memory footprint of large result sets, long-lived responses, connections
+and replication streams, measured with tracemalloc (Python 3.4+).
+
+    python benchmarks/memory.py
+    python benchmarks/memory.py --sizes 1000 10000000 --json
+    python benchmarks/memory.py --save benchmarks/memory_baseline.json
+    python benchmarks/memory.py --baseline benchmarks/memory_baseline.json
+
+For every case the peak of the memory allocated while it runs, the
+memory retained by its result and the memory left after the result is
+dropped are reported:
+
+    select.N            SELECT of N tuples read from a socket
+    response.retained   a single tuple response kept after the connection
+                        is dropped, it keeps the connection and its schema
+    response.data       the data of the same response kept alone
+    connection          a connection with a loaded schema, per connection
+    connection.schema   reloading the schema of a connection, the new
+                        schema is retained by the connection
+    join.N, subscribe.N N rows of a replication stream decoded one by one
+
+Connections are opened to a stand-in server (see `tarantool.standin`)
+running in a child process, so its allocations aren't counted. A select
+of 1e7 tuples needs several gigabytes and is only run if asked for.
+
+The baseline is recorded at every release by `make benchmark-baseline`
+and checked by `make benchmark`. The comparison exits with status 1 if
+the peak or the retained memory of a case grows by more than the
+tolerance.
+'''
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import struct
+import sys
+
+import msgpack
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tarantool
+from tarantool.connection import Connection
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_DATA,
+    IPROTO_ERROR,
+    IPROTO_LSN,
+    IPROTO_SCHEMA_ID,
+    IPROTO_SERVER_ID,
+    IPROTO_SPACE_ID,
+    IPROTO_SYNC,
+    IPROTO_TUPLE,
+    REQUEST_TYPE_ERROR,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_OK
+)
+from tarantool.error import DatabaseError
+from tarantool.replication import Row
+from tarantool.request import RequestSelect
+from tarantool.schema import (
+    SchemaIndex,
+    SchemaSpace
+)
+from tarantool.standin import StandinServer
+from tarantool.utils import version_id
+
+TUPLE = [1, 'name', 2.5, 'x' * 32, 100500]
+UUID = '00000000-0000-0000-0000-000000000001'
+# Changes smaller than this are never regressions
+SLACK = 16384
+METRICS = ('peak', 'retained')
+
+
+class StreamSocket(object):
+    '''
+    Socket returning the given packets in chunks of at most `recv_size`
+    bytes, without copying the whole buffer.
+    '''
+
+    def __init__(self, buf, recv_size):
+        self.view = memoryview(buf)
+        self.pos = 0
+        self.recv_size = recv_size
+
+    def sendall(self, data):
+        pass
+
+    def recv(self, size):
+        size = min(size, self.recv_size)
+        data = self.view[self.pos:self.pos + size].tobytes()
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def packet(header, body=None, buf=None):
+    '''
+    Append a response packet to the buffer.
+    '''
+    if buf is None:
+        buf = bytearray()
+    payload = msgpack.packb(header)
+    if body is not None:
+        payload += msgpack.packb(body)
+    buf += b'\xce' + struct.pack('>I', len(payload)) + payload
+    return buf
+
+
+def select_packet(count):
+    '''
+    :return: a response of `count` tuples, packed tuple by tuple so
+        the tuples themselves are never held in memory
+    '''
+    buf = bytearray(b'\xce\x00\x00\x00\x00')
+    buf += msgpack.packb({IPROTO_CODE: 0, IPROTO_SYNC: 0,
+                          IPROTO_SCHEMA_ID: 1})
+    buf += b'\x81' + msgpack.packb(IPROTO_DATA)
+    buf += b'\xdd' + struct.pack('>I', count)
+    packer = msgpack.Packer()
+    for num in range(count):
+        buf += packer.pack([num] + TUPLE[1:])
+    buf[1:5] = struct.pack('>I', len(buf) - 5)
+    return buf
+
+
+def stream_packet(rows, join):
+    '''
+    :return: a JOIN stream (rows between the initial and the final OK)
+        or a SUBSCRIBE stream ended by an error
+    '''
+    buf = bytearray()
+    if join:
+        packet({IPROTO_CODE: REQUEST_TYPE_OK, IPROTO_SYNC: 0}, {}, buf)
+    for lsn in range(1, rows + 1):
+        packet({IPROTO_CODE: REQUEST_TYPE_INSERT, IPROTO_SERVER_ID: 1,
+                IPROTO_LSN: lsn},
+               {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: [lsn] + TUPLE[1:]}, buf)
+    if join:
+        packet({IPROTO_CODE: REQUEST_TYPE_OK, IPROTO_SYNC: 0}, {}, buf)
+        packet({IPROTO_CODE: REQUEST_TYPE_OK, IPROTO_SYNC: 0}, {}, buf)
+    else:
+        packet({IPROTO_CODE: REQUEST_TYPE_ERROR | 1, IPROTO_SYNC: 0},
+               {IPROTO_ERROR: 'stream is over'}, buf)
+    return buf
+
+
+def offline_connection(spaces):
+    '''
+    :return: an unconnected connection with `spaces` spaces of two
+        indexes in its schema
+    '''
+    conn = Connection('localhost', 3301, connect_now=False)
+    conn.version_id = version_id(2, 2, 1)
+    for num in range(spaces):
+        space = SchemaSpace([512 + num, 1, 'space%d' % num, 'memtx', 0, {},
+                             [{'name': 'id', 'type': 'unsigned'},
+                              {'name': 'name', 'type': 'string'}]],
+                            conn.schema.schema)
+        SchemaIndex([512 + num, 0, 'primary', 'tree', {'unique': True},
+                     [[0, 'unsigned']]], space)
+        SchemaIndex([512 + num, 1, 'name', 'tree', {'unique': False},
+                     [[1, 'string']]], space)
+    return conn
+
+
+def measure(func):
+    '''
+    :return: the peak of memory allocated by the function, the memory
+        retained by its result (and the objects it changed) and left
+        after the result is dropped
+    :rtype: dict
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        # Connections and their schemas reference each other
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        del result
+        gc.collect()
+        leaked = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {'peak': peak, 'retained': retained, 'leaked': leaked}
+
+
+def select_case(count, recv_size):
+    buf = select_packet(count)
+    conn = offline_connection(1)
+
+    def select():
+        conn._socket = StreamSocket(buf, recv_size)
+        return conn._send_request_wo_reconnect(
+            RequestSelect(conn, 512, 0, [], 0, 0xffffffff, 0))
+    result = measure(select)
+    result['per_tuple'] = round(float(result['retained']) / count, 1)
+    return result
+
+
+def response_cases(spaces, recv_size):
+    buf = packet({IPROTO_CODE: 0, IPROTO_SYNC: 0, IPROTO_SCHEMA_ID: 1},
+                 {IPROTO_DATA: [TUPLE]})
+
+    def select():
+        conn = offline_connection(spaces)
+        conn._socket = StreamSocket(buf, recv_size)
+        return conn._send_request_wo_reconnect(
+            RequestSelect(conn, 512, 0, [1], 0, 1, 0))
+    return {
+        'response.retained': measure(select),
+        'response.data': measure(lambda: select().data)
+    }
+
+
+def stream_case(rows, join, recv_size):
+    buf = stream_packet(rows, join)
+    conn = offline_connection(1)
+
+    def consume():
+        conn._socket = StreamSocket(buf, recv_size)
+        if join:
+            stream = conn._join_v17(UUID)
+        else:
+            stream = conn.subscribe(UUID, UUID)
+        try:
+            for response in stream:
+                Row.from_response(response)
+        except DatabaseError:
+            pass
+    return measure(consume)
+
+
+def serve(pipe, spaces):
+    '''
+    Run a stand-in server with `spaces` spaces until the pipe is closed.
+    '''
+    server = StandinServer().start()
+    for num in range(spaces):
+        server.create_space('space%d' % num, format=[
+            {'name': 'id', 'type': 'unsigned'},
+            {'name': 'name', 'type': 'string'}])
+        server.create_index('space%d' % num, 'name', [[1, 'string']], False)
+    pipe.send(server.port)
+    try:
+        pipe.recv()
+    except EOFError:
+        pass
+    server.stop()
+
+
+def connection_cases(connections, spaces):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(child, spaces))
+    process.daemon = True
+    process.start()
+    try:
+        port = parent.recv()
+        result = measure(lambda: [Connection('127.0.0.1', port)
+                                  for _ in range(connections)])
+        for key in list(result):
+            result[key] //= connections
+        conn = Connection('127.0.0.1', port)
+        try:
+            schema = measure(conn.flush_schema)
+        finally:
+            conn.close()
+    finally:
+        parent.send(None)
+        process.join()
+    return {'connection': result, 'connection.schema': schema}
+
+
+def run(config, selected):
+    '''
+    :param selected: function telling if a case is to be run by its name
+    '''
+    results = {}
+    for count in config.sizes:
+        name = 'select.%d' % count
+        if selected(name):
+            results[name] = select_case(count, config.recv_size)
+    if selected('response.'):
+        results.update(response_cases(config.spaces, config.recv_size))
+    if selected('connection'):
+        results.update(connection_cases(config.connections, config.spaces))
+    for join in (True, False):
+        name = '%s.%d' % ('join' if join else 'subscribe', config.stream_rows)
+        if selected(name):
+            results[name] = stream_case(config.stream_rows, join,
+                                        config.recv_size)
+    return {
+        'version': 1,
+        'tarantool': tarantool.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'msgpack': '.'.join(map(str, msgpack.version)),
+        'results': results
+    }
+
+
+def regressed(result, baseline, tolerance):
+    '''
+    :return: names of the metrics grown by more than the tolerance
+    '''
+    return [metric for metric in METRICS
+            if result[metric] > baseline[metric] * (1 + tolerance) + SLACK]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', action='append', default=[],
+                        help='run the cases whose names contain this')
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1000, 10000, 100000, 1000000],
+                        help='numbers of tuples of selects')
+    parser.add_argument('--recv-size', type=int, default=1 << 20,
+                        help='maximum bytes returned by a socket read')
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--spaces', type=int, default=100,
+                        help='spaces in the schema of a connection')
+    parser.add_argument('--stream-rows', type=int, default=100000)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with this file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed growth relative to the baseline')
+    config = parser.parse_args()
+    if tracemalloc is None:
+        parser.error('tracemalloc is not available')
+
+    filters = config.filter or ['']
+    report = run(config, lambda name: any(part in name for part in filters))
+    if config.save:
+        with open(config.save, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+    if config.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    baseline = {}
+    if config.baseline:
+        with open(config.baseline) as fp:
+            baseline = json.load(fp)
+        for field in ('implementation', 'python', 'msgpack'):
+            if baseline.get(field) != report[field]:
+                print('Warning: the baseline was recorded with %s %s, this '
+                      'is %s' % (field, baseline.get(field), report[field]),
+                      file=sys.stderr)
+    out = sys.stderr if config.json else sys.stdout
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        line = '%-20s peak %12d retained %12d leaked %10d' % (
+            name, result['peak'], result['retained'], result['leaked'])
+        previous = baseline.get('results', {}).get(name)
+        if previous is not None:
+            grown = regressed(result, previous, config.tolerance)
+            line += ' %+7.1f%% %+7.1f%%' % tuple(
+                (result[metric] - previous[metric]) * 100.0 /
+                max(previous[metric], 1) for metric in METRICS)
+            if grown:
+                line += ' REGRESSION'
+                regressions.append(name)
+        elif config.baseline:
+            line += ' new'
+        print(line, file=out)
+    if regressions:
+        print('%d of %d cases use more than %d%% more memory: %s' % (
+            len(regressions), len(report['results']), config.tolerance * 100,
+            ', '.join(regressions)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Overhead of client metrics: SELECT requests are sent to an in-memory
+socket answering instantly, with and without a Metrics instance.
+
+    python benchmarks/metrics.py --requests 200000
+'''
+
+from __future__ import print_function
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+import msgpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tarantool.connection import Connection
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_DATA,
+    IPROTO_SCHEMA_ID,
+    IPROTO_SYNC
+)
+from tarantool.metrics import Metrics
+from tarantool.request import RequestSelect
+
+
+class LoopbackSocket(object):
+    '''
+    Socket answering every request with the same response.
+    '''
+
+    def __init__(self, response):
+        body = msgpack.packb({IPROTO_CODE: 0, IPROTO_SYNC: 0,
+                              IPROTO_SCHEMA_ID: 1}) + response
+        self.packet = b'\xce' + struct.pack('>I', len(body)) + body
+        self.buf = b''
+
+    def sendall(self, data):
+        self.buf += self.packet
+
+    def recv(self, size):
+        data, self.buf = self.buf[:size], self.buf[size:]
+        return data
+
+
+def measure(title, conn, requests):
+    request = RequestSelect(conn, 512, 0, [1], 0, 1, 0)
+    started = time.time()
+    for _ in range(requests):
+        conn._send_request_wo_reconnect(request)
+    elapsed = time.time() - started
+    print('%-24s %10d requests %8.2fs %10.2f us/request' % (
+        title, requests, elapsed, elapsed / requests * 1e6))
+    return elapsed / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--tuple-size', type=int, default=100)
+    args = parser.parse_args()
+
+    response = msgpack.packb({IPROTO_DATA: [[1, 'x' * args.tuple_size]]})
+    conn = Connection('localhost', 3301, connect_now=False)
+    conn._socket = LoopbackSocket(response)
+    disabled = measure('metrics disabled', conn, args.requests)
+    conn.metrics = Metrics()
+    enabled = measure('metrics enabled', conn, args.requests)
+    print('%-24s %30.2f us/request (%.1f%%)' % (
+        'overhead', (enabled - disabled) * 1e6,
+        (enabled - disabled) / disabled * 100))
+    started = time.time()
+    conn.metrics.prometheus()
+    print('%-24s %30.2f ms' % ('prometheus export',
+                               (time.time() - started) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
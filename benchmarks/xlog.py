@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the offline snapshot writer and reader on a large
+synthetic file.
+
+    python benchmarks/xlog.py --rows 1000000 --workers 4
+'''
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tarantool.xlog import (
+    XlogWriter,
+    read_xlogs
+)
+
+
+def generate(path, rows, tuple_size, block_size):
+    payload = 'x' * tuple_size
+    started = time.time()
+    with XlogWriter(path, vclock={1: rows}, block_size=block_size) as writer:
+        for i in range(rows):
+            writer.insert(512 + i % 4, [i, payload])
+    elapsed = time.time() - started
+    print('%-32s %10d rows %8.2fs %12.0f rows/s %8.1f MB/s' % (
+        'write', rows, elapsed, rows / elapsed,
+        os.path.getsize(path) / elapsed / 2 ** 20))
+
+
+def measure(title, path, **kwargs):
+    size = os.path.getsize(path)
+    started = time.time()
+    count = 0
+    for _ in read_xlogs([path], **kwargs):
+        count += 1
+    elapsed = time.time() - started
+    print('%-32s %10d rows %8.2fs %12.0f rows/s %8.1f MB/s' % (
+        title, count, elapsed, count / elapsed, size / elapsed / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--tuple-size', type=int, default=100)
+    parser.add_argument('--block-size', type=int, default=128 * 1024)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--segment-size', type=int, default=2 ** 20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, '00000000000000000000.snap')
+        generate(path, args.rows, args.tuple_size, args.block_size)
+        measure('sequential', path)
+        measure('sequential, no checksums', path, verify=False)
+        measure('one space', path, spaces=[512])
+        measure('%d workers' % args.workers, path, workers=args.workers,
+                segment_size=args.segment_size)
+        measure('%d workers, no checksums' % args.workers, path,
+                workers=args.workers, segment_size=args.segment_size,
+                verify=False)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -83,5 +83,10 @@ setup(
     command_options=command_options,
     install_requires=[
         'msgpack-python>=0.4',
-    ]
+    ],
+    entry_points={
+        'console_scripts': [
+            'tarantool-bench = tarantool.bench:main',
+        ],
+    }
 )
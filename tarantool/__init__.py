@@ -3,6 +3,7 @@
 
 from tarantool.connection import Connection
 from tarantool.mesh_connection import MeshConnection
+from tarantool.sharded_connection import ShardedConnection
 from tarantool.const import (
     SOCKET_TIMEOUT,
     RECONNECT_MAX_ATTEMPTS,
@@ -73,6 +74,6 @@ def connectmesh(addrs=({'host': 'localhost', 'port': 3301},), user=None,
                           encoding=encoding)
 
 
-__all__ = ['connect', 'Connection', 'connectmesh', 'MeshConnection', 'Schema',
-           'Error', 'DatabaseError', 'NetworkError', 'NetworkWarning',
+__all__ = ['connect', 'Connection', 'connectmesh', 'MeshConnection',
+           'ShardedConnection', 'Schema', 'Error', 'DatabaseError', 'NetworkError', 'NetworkWarning',
            'SchemaError']
@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+'''
+Load generator for Tarantool, installed as the `tarantool-bench` command::
+
+    tarantool-bench --host 127.0.0.1 --port 3301 --setup \\
+        --read-ratio 0.9 --distribution zipf --keys 1000000 \\
+        --connections 8 --processes 2 --pipeline 16 --duration 60
+
+Every connection is driven by its own thread (in `--processes` processes)
+and keeps up to `--pipeline` requests in flight: SELECTs by the primary
+key and REPLACEs of `--tuple-size` byte tuples into `--space`, mixed by
+`--read-ratio`. Keys are drawn uniformly, by a Zipf distribution or
+sequentially. `--rate` sends the requests on a fixed schedule of the
+total number of requests per second, and their latency is counted from
+the time they were due rather than sent.
+Throughput and latency percentiles are printed every `--interval`
+seconds and for the whole run.
+
+`--standin` runs the load against an in-process
+:class:`~tarantool.standin.StandinServer` to measure the client alone.
+'''
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from tarantool.connection import Connection
+from tarantool.error import DatabaseError
+from tarantool.metrics import Histogram
+from tarantool.request import (
+    RequestReplace,
+    RequestSelect
+)
+from tarantool.response import Response
+from tarantool.utils import perf_counter
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'sequential')
+
+SETUP_LUA = '''
+local name = ...
+local space = box.schema.space.create(name, {if_not_exists = true})
+space:create_index('primary', {if_not_exists = true,
+                               parts = {1, 'unsigned'}})
+return space.id
+'''
+
+
+class BenchConnection(Connection):
+    '''
+    Connection sending requests without waiting for responses, which are
+    matched to the requests by sync.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self._syncs = itertools.count(1)
+        super(BenchConnection, self).__init__(*args, **kwargs)
+
+    def load_schema(self):
+        pass
+
+    def generate_sync(self):
+        return next(self._syncs)
+
+
+class ZipfKeys(object):
+    '''
+    Draws ranks from 0 to `keys` - 1 with probability proportional to
+    1 / (rank + 1) ** s by bisecting a precomputed distribution function
+    (8 bytes per key).
+    '''
+
+    def __init__(self, keys, s=0.99):
+        total = 0.0
+        self.cdf = []
+        for rank in range(keys):
+            total += 1.0 / (rank + 1) ** s
+            self.cdf.append(total)
+        self.total = total
+
+    def __call__(self, rng):
+        return bisect.bisect_left(self.cdf, rng.random() * self.total)
+
+
+class Workload(object):
+    '''
+    Mix of requests of a connection.
+    '''
+
+    def __init__(self, space, read_ratio=0.9, keys=100000,
+                 distribution='uniform', zipf_s=0.99, tuple_size=100,
+                 worker=0, workers=1, seed=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError('Unknown key distribution %r' % distribution)
+        self.space = space
+        self.read_ratio = read_ratio
+        self.keys = keys
+        self.distribution = distribution
+        self.payload = 'x' * tuple_size
+        self.rng = random.Random(None if seed is None else seed + worker)
+        self._zipf = ZipfKeys(keys, zipf_s) \
+            if distribution == 'zipf' else None
+        # Sequential workers start at different keys
+        self._next = keys * worker // workers
+
+    def key(self):
+        if self.distribution == 'uniform':
+            return self.rng.randrange(self.keys)
+        if self.distribution == 'zipf':
+            return self._zipf(self.rng)
+        key = self._next
+        self._next = (self._next + 1) % self.keys
+        return key
+
+    def request(self, conn):
+        '''
+        :return: a new request and True if it's a read
+        '''
+        key = self.key()
+        if self.rng.random() < self.read_ratio:
+            return RequestSelect(conn, self.space, 0, [key], 0, 1, 0), True
+        return RequestReplace(conn, self.space, [key, self.payload]), False
+
+
+class Interval(object):
+    '''
+    Statistics of the requests of a worker completed in an interval.
+    '''
+
+    def __init__(self, number):
+        self.number = number
+        self.latency = Histogram()
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.reads += other.reads
+        self.writes += other.writes
+        self.errors += other.errors
+
+
+def run_worker(config, worker, workers, started, reports):
+    '''
+    Send requests of a connection until the end of the run, putting
+    ('interval', worker, :class:`Interval`) to `reports` at the end of
+    every interval, ('error', worker, message) if the worker fails and
+    ('done', worker, None) when it stops.
+    '''
+    try:
+        _run_worker(config, worker, workers, started, reports)
+    except Exception as e:
+        reports.put(('error', worker, 'worker %d: %s: %s' % (
+            worker, type(e).__name__, e)))
+    finally:
+        reports.put(('done', worker, None))
+
+
+def _run_worker(config, worker, workers, started, reports):
+    workload = Workload(config['space'], config['read_ratio'],
+                        config['keys'], config['distribution'],
+                        config['zipf_s'], config['tuple_size'], worker,
+                        workers, config['seed'])
+    conn = BenchConnection(config['host'], config['port'],
+                           user=config['user'], password=config['password'],
+                           socket_timeout=config['timeout'])
+    conn.error = False
+    # Don't let the server check the schema version
+    conn.schema_version = 0
+    # Requests per second of the worker
+    rate = config['rate'] / float(workers) if config['rate'] else None
+    finish = started + config['duration']
+    interval = config['interval']
+    last = _last(config)
+    current = Interval(0)
+    inflight = {}
+    next_send = started
+    # With a rate, latency is counted from the time a request was due,
+    # so a stalled server delays the schedule instead of hiding in it
+    clock_offset = perf_counter() - time.time()
+    time.sleep(max(started - time.time(), 0))
+    try:
+        while True:
+            now = time.time()
+            sending = now < finish
+            while sending and len(inflight) < config['pipeline'] and \
+                    (rate is None or now >= next_send):
+                request, read = workload.request(conn)
+                packet = bytes(request)
+                if rate is None:
+                    inflight[request.sync] = (perf_counter(), read)
+                else:
+                    inflight[request.sync] = (next_send + clock_offset, read)
+                    next_send += 1 / rate
+                conn._socket.sendall(packet)
+            if not inflight:
+                if not sending:
+                    break
+                time.sleep(max(min(next_send, finish) - now, 0))
+                continue
+            response = Response(conn, conn._read_response())
+            sent, read = inflight.pop(response.sync)
+            latency = perf_counter() - sent
+            # Responses to requests sent before the end of the run are
+            # accounted in the last interval
+            number = min(int((time.time() - started) // interval), last)
+            if number != current.number:
+                reports.put(('interval', worker, current))
+                current = Interval(number)
+            if response.return_code:
+                current.errors += 1
+                continue
+            current.latency.record(latency)
+            if read:
+                current.reads += 1
+            else:
+                current.writes += 1
+    finally:
+        conn.close()
+    reports.put(('interval', worker, current))
+
+
+def _last(config):
+    '''
+    :return: number of the last interval of the run
+    '''
+    return max(int(math.ceil(config['duration'] / config['interval'])) - 1,
+               0)
+
+
+def _process_main(config, first, count, workers, started, reports):
+    '''
+    Run `count` workers in threads of a process.
+    '''
+    threads = [threading.Thread(target=run_worker, args=(
+        config, worker, workers, started, reports))
+        for worker in range(first, first + count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def setup(config):
+    '''
+    Create the space of the benchmark if asked and resolve its id.
+    '''
+    conn = Connection(config['host'], config['port'], user=config['user'],
+                      password=config['password'])
+    try:
+        if config['setup']:
+            conn.eval(SETUP_LUA, [config['space']])
+            conn.flush_schema()
+        space = config['space']
+        if not isinstance(space, int):
+            space = conn.schema.get_space(space).sid
+        if config['fill']:
+            payload = 'x' * config['tuple_size']
+            for key in range(config['keys']):
+                conn.replace(space, [key, payload])
+        return space
+    finally:
+        conn.close()
+
+
+def run(config, report_interval=None):
+    '''
+    Run the benchmark.
+
+    :param dict config: options of the command line, see
+        :func:`parse_args`
+    :param report_interval: callable receiving the summary of every
+        interval as it completes
+
+    :return: {'total': summary, 'intervals': [summary, ...],
+        'errors': [...]}; a summary has 'time', 'requests', 'reads',
+        'writes', 'errors', 'throughput' and 'latency'
+    :rtype: dict
+    '''
+    config = dict(config)
+    config['space'] = setup(config)
+    processes = config['processes']
+    per_process = config['connections']
+    workers = processes * per_process
+    started = time.time() + 0.1 + 0.2 * (processes > 1)
+    if processes > 1:
+        reports = multiprocessing.Queue()
+        runners = [multiprocessing.Process(target=_process_main, args=(
+            config, num * per_process, per_process, workers, started,
+            reports)) for num in range(processes)]
+    else:
+        reports = queue.Queue()
+        runners = [threading.Thread(target=_process_main, args=(
+            config, 0, per_process, workers, started, reports))]
+    for runner in runners:
+        runner.daemon = True
+        runner.start()
+
+    intervals = {}
+    failures = []
+    total = Interval(None)
+    # Number of the last interval sent by every running worker
+    progress = dict((worker, -1) for worker in range(workers))
+    reported = 0
+    while progress:
+        try:
+            kind, worker, item = reports.get(
+                timeout=config['interval'] / 4.0)
+        except queue.Empty:
+            kind = None
+        if kind == 'interval':
+            intervals.setdefault(item.number, Interval(item.number)).merge(
+                item)
+            total.merge(item)
+            progress[worker] = item.number
+        elif kind == 'error':
+            failures.append(item)
+        elif kind == 'done':
+            del progress[worker]
+        # An interval is complete once every worker has sent it, or
+        # an interval later if a worker completed nothing in it
+        late = int((time.time() - started) // config['interval']) - 2
+        complete = max(min(progress.values() or [late]), late)
+        while report_interval is not None and progress and \
+                reported <= min(complete, _last(config)):
+            report_interval(_summary(intervals.get(reported,
+                                                   Interval(reported)),
+                                     config['interval'], reported))
+            reported += 1
+    for runner in runners:
+        runner.join()
+    numbers = sorted(intervals)
+    if report_interval is not None:
+        for number in numbers:
+            if number >= reported:
+                report_interval(_summary(intervals[number],
+                                         config['interval'], number))
+    return {
+        'total': _summary(total, config['duration']),
+        'intervals': [_summary(intervals[number], config['interval'],
+                               number) for number in numbers],
+        'errors': failures
+    }
+
+
+def _summary(interval, duration, number=None):
+    count = interval.reads + interval.writes
+    return {
+        'time': None if number is None else (number + 1) * duration,
+        'requests': count,
+        'reads': interval.reads,
+        'writes': interval.writes,
+        'errors': interval.errors,
+        'throughput': count / duration if duration else 0.0,
+        'latency': interval.latency.to_dict()
+    }
+
+
+def format_summary(summary):
+    latency = summary['latency']
+    return '%s %10.1f req/s  p50 %8.3f  p90 %8.3f  p99 %8.3f  ' \
+        'max %8.3f ms  errors %d' % (
+            'total' if summary['time'] is None
+            else '%7.1fs' % summary['time'],
+            summary['throughput'], latency['p50'] * 1000,
+            latency['p90'] * 1000, latency['p99'] * 1000,
+            latency['max'] * 1000, summary['errors'])
+
+
+def space_arg(value):
+    '''
+    :return: id of a space if the value is a number, else its name
+    '''
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def parse_args(argv=None):
+    '''
+    :return: options of the command line as a dict accepted by :func:`run`
+    '''
+    parser = argparse.ArgumentParser(
+        description='Load generator for Tarantool')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=3301,
+                        help='port or path of a unix socket')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='socket timeout, seconds')
+    parser.add_argument('--standin', action='store_true',
+                        help='run against an in-process stand-in server')
+    parser.add_argument('--space', type=space_arg, default='bench',
+                        help='name or id of a space with an unsigned '
+                        'primary key in the first field')
+    parser.add_argument('--setup', action='store_true',
+                        help='create the space if it does not exist')
+    parser.add_argument('--fill', action='store_true',
+                        help='insert all keys before the run')
+    parser.add_argument('--read-ratio', type=float, default=0.9)
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS,
+                        default='uniform')
+    parser.add_argument('--zipf-s', type=float, default=0.99,
+                        help='exponent of the Zipf distribution')
+    parser.add_argument('--tuple-size', type=int, default=100)
+    parser.add_argument('--connections', type=int, default=1,
+                        help='connections (and threads) per process')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--pipeline', type=int, default=1,
+                        help='requests in flight per connection')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='requests per second of all connections, '
+                        '0 for no limit')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between reports')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    return vars(parser.parse_args(argv))
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    server = None
+    if config['standin']:
+        from tarantool.standin import StandinServer
+        server = StandinServer().start()
+        if isinstance(config['space'], int):
+            server.create_space('bench', sid=config['space'])
+        else:
+            server.create_space(config['space'])
+        config.update(host=server.host, port=server.port, setup=False)
+    try:
+        report = run(config, None if config['json'] else
+                     lambda summary: print(format_summary(summary)))
+    except DatabaseError as e:
+        print('Failed to prepare the benchmark: %s' % (e,), file=sys.stderr)
+        return 1
+    finally:
+        if server is not None:
+            server.stop()
+    for error in report['errors']:
+        print('Worker failed: %s' % error, file=sys.stderr)
+    if config['json']:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_summary(report['total']))
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
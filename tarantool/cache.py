@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.cache.SubscribeCache` class.
+It is a client-side cache of tuples kept coherent by the replication
+(SUBSCRIBE) stream of the server.
+'''
+
+import threading
+from collections import OrderedDict
+
+from tarantool.const import (
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_DELETE
+)
+from tarantool.error import NetworkError
+from tarantool.replication import (
+    Row,
+    key_parts,
+    fetch_vclock
+)
+from tarantool.utils import check_key
+
+
+class SubscribeCache(object):
+    '''
+    Cache of tuples looked up by primary key.
+
+    A background thread consumes the SUBSCRIBE stream of the server and
+    evicts (or updates in place) cached entries touched by every DML row,
+    so hot keys can be cached without a TTL.
+
+    Two connections are required: `conn` is used to fill the cache on
+    misses and `subscriber` is taken over by the SUBSCRIBE stream.
+    `server_uuid` must be registered in the cluster (see
+    :meth:`~tarantool.connection.Connection.join`) and the user of
+    `subscriber` must have the 'replication' role.
+    '''
+
+    def __init__(self, conn, subscriber, cluster_uuid, server_uuid,
+                 vclock=None, maxsize=None, update=True):
+        '''
+        :param conn: connection used to fetch tuples on cache misses
+        :type conn: :class:`~tarantool.connection.Connection`
+        :param subscriber: connection dedicated to the SUBSCRIBE stream
+        :type subscriber: :class:`~tarantool.connection.Connection`
+        :param str cluster_uuid: UUID of the replica set
+        :param str server_uuid: UUID of the registered replica
+        :param dict vclock: position to subscribe from; the current vclock
+            of the server is used by default
+        :param int maxsize: maximum number of cached keys (unbounded if None)
+        :param bool update: if True, cached entries are replaced by
+            the new tuple on INSERT/REPLACE/DELETE instead of being evicted
+        '''
+        self.conn = conn
+        self.subscriber = subscriber
+        self.cluster_uuid = cluster_uuid
+        self.server_uuid = server_uuid
+        self.vclock = vclock
+        self.maxsize = maxsize
+        self.update = update
+        self.error = None
+        self.hits = 0
+        self.misses = 0
+        self._parts = {}
+        self._data = OrderedDict()
+        self._space_seq = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        '''
+        :type: bool
+
+        True while the SUBSCRIBE stream is consumed. The cache is
+        bypassed when it isn't.
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        '''
+        Subscribe and start consuming the replication stream
+        in a background thread.
+        '''
+        if self.running:
+            return
+        if self.vclock is None:
+            self.vclock = fetch_vclock(self.conn)
+        self.error = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop consuming the replication stream and drop cached entries.
+        '''
+        self._stopping = True
+        self.subscriber.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.subscriber.close()
+        self.clear()
+
+    def _run(self):
+        stream = self.subscriber.subscribe(self.cluster_uuid,
+                                           self.server_uuid,
+                                           dict(self.vclock))
+        try:
+            for response in stream:
+                self.apply(Row.from_response(response))
+        except NetworkError as e:
+            if not self._stopping:
+                self.error = e
+        except Exception as e:
+            self.error = e
+        finally:
+            # Without the stream the cached entries can't be trusted
+            self.clear()
+
+    def apply(self, row):
+        '''
+        Apply a row of the replication stream to the cache.
+
+        :param row: decoded row
+        :type row: :class:`~tarantool.replication.Row`
+        '''
+        if row.lsn is not None and row.server_id is not None:
+            self.vclock[row.server_id] = row.lsn
+        if not row.is_dml:
+            return
+        parts = self._parts.get(row.space_no)
+        if parts is None:
+            return
+        key = row.primary_key(parts)
+        with self._lock:
+            self._space_seq[row.space_no] += 1
+            if key is None:
+                # The row was applied through a secondary index,
+                # so any cached key of the space could be affected
+                for cached in [k for k in self._data if k[0] == row.space_no]:
+                    del self._data[cached]
+                return
+            cached = (row.space_no, key)
+            if cached not in self._data:
+                return
+            if self.update and row.code in (REQUEST_TYPE_INSERT,
+                                            REQUEST_TYPE_REPLACE):
+                self._data[cached] = [row.tuple]
+            elif self.update and row.code == REQUEST_TYPE_DELETE:
+                self._data[cached] = []
+            else:
+                del self._data[cached]
+
+    def get(self, space_name, key):
+        '''
+        Return tuples matching the primary `key`, fetching them with
+        SELECT on a cache miss.
+
+        :param space_name: space number or name
+        :type space_name: int or str
+        :param key: full primary key
+        :type key: int, str or list
+
+        :rtype: list of tuples
+        '''
+        space_no = self.conn.schema.get_space(space_name).sid
+        key = tuple(check_key(key))
+        if space_no not in self._parts:
+            parts = key_parts(self.conn.schema, space_no)
+            with self._lock:
+                self._parts.setdefault(space_no, parts)
+                self._space_seq.setdefault(space_no, 0)
+        cached = (space_no, key)
+
+        with self._lock:
+            if self.running and cached in self._data:
+                self.hits += 1
+                # Keep the least recently used entries at the head
+                data = self._data.pop(cached)
+                self._data[cached] = data
+                return list(data)
+            self.misses += 1
+            seq = self._space_seq[space_no]
+
+        data = self.conn.select(space_no, list(key)).data
+        with self._lock:
+            # Don't store the result if a row of the space has been
+            # applied while SELECT was in flight: it may be stale
+            if self.running and self._space_seq[space_no] == seq:
+                self._data[cached] = data
+                if self.maxsize is not None and len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return list(data)
+
+    def invalidate(self, space_name, key):
+        '''
+        Drop a cached entry.
+        '''
+        space_no = self.conn.schema.get_space(space_name).sid
+        with self._lock:
+            self._data.pop((space_no, tuple(check_key(key))), None)
+
+    def clear(self):
+        '''
+        Drop all cached entries.
+        '''
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.capture.Capture` class recording
+requests sent by connections with their response times to a file, to be
+sent again by :mod:`tarantool.replay`.
+
+A capture file starts with :data:`MAGIC` followed by records of a
+:data:`RECORD` header (time since the start of the capture and latency in
+seconds, response size, request size, flags) and the request packet as
+it was sent.
+'''
+
+import collections
+import struct
+import threading
+
+from tarantool.const import REQUEST_TYPE_AUTHENTICATE
+from tarantool.error import InterfaceError
+from tarantool.utils import perf_counter
+
+MAGIC = b'TNTCAP\x00\x01'
+RECORD = struct.Struct('<dfIIB')
+FLAG_ERROR = 1
+
+CapturedRequest = collections.namedtuple(
+    'CapturedRequest', 'offset latency response_bytes error packet')
+
+
+class Capture(object):
+    '''
+    Records requests of connections it is passed to as `capture`::
+
+        with Capture('traffic.cap') as capture:
+            con = tarantool.Connection(host, port, capture=capture)
+            ...
+
+    Authentication requests aren't recorded, replayed connections
+    authenticate themselves.
+    '''
+
+    def __init__(self, target):
+        '''
+        :param target: path of the file or a binary file object
+        '''
+        if hasattr(target, 'write'):
+            self._file = target
+            self._own = False
+        else:
+            self._file = open(target, 'wb')
+            self._own = True
+        self._file.write(MAGIC)
+        self.count = 0
+        self._started = perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, request, packet, latency, response_bytes, error=None):
+        '''
+        Append a completed request.
+
+        :param bytes packet: the request as sent
+        '''
+        if request.request_type == REQUEST_TYPE_AUTHENTICATE:
+            return
+        offset = perf_counter() - latency - self._started
+        header = RECORD.pack(offset, latency, response_bytes, len(packet),
+                             FLAG_ERROR if error is not None else 0)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(header + packet)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self._own:
+                self._file.close()
+            else:
+                self._file.flush()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
+def read_capture(source):
+    '''
+    Read records of a capture.
+
+    :param source: path of the file or a binary file object
+    :return: iterator over :class:`CapturedRequest` in the order they were
+        recorded
+
+    :raise: `InterfaceError` if it isn't a capture file or it's truncated
+    '''
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as stream:
+            for item in read_capture(stream):
+                yield item
+        return
+    if source.read(len(MAGIC)) != MAGIC:
+        raise InterfaceError('Not a capture file')
+    while True:
+        header = source.read(RECORD.size)
+        if not header:
+            return
+        if len(header) < RECORD.size:
+            raise InterfaceError('Truncated capture file')
+        offset, latency, response_bytes, size, flags = RECORD.unpack(header)
+        packet = source.read(size)
+        if len(packet) < size:
+            raise InterfaceError('Truncated capture file')
+        yield CapturedRequest(offset, latency, response_bytes,
+                              bool(flags & FLAG_ERROR), packet)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.cdc.ChangeConsumer` class.
+It turns the SUBSCRIBE stream into batches of typed change events for
+change-data-capture pipelines.
+'''
+
+import collections
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from tarantool.error import NetworkError
+from tarantool.request import RequestSubscribe
+from tarantool.replication import (
+    decode_frame,
+    key_parts
+)
+from tarantool.utils import integer_types
+
+ChangeEvent = collections.namedtuple('ChangeEvent', (
+    'op', 'space', 'index', 'key', 'tuple', 'ops', 'lsn', 'server_id',
+    'timestamp'))
+ChangeEvent.__doc__ = '''
+A single data change: `op` is 'insert', 'replace', 'update', 'delete' or
+'upsert', `key` is the key of the touched tuple in `index` (the primary
+key for INSERT, REPLACE and UPSERT), `tuple` is the new tuple (None for
+UPDATE and DELETE) and `ops` are operations of UPDATE and UPSERT.
+'''
+
+
+def decode_events(frames, encoding, parts, spaces=None):
+    '''
+    Decode raw packets of the replication stream into change events.
+    It is executed by worker processes of the consumer, so arguments
+    and results are plain picklable values.
+
+    :param frames: raw packets without the length prefix
+    :type frames: list of bytes
+    :param str encoding: encoding of strings in tuples
+    :param dict parts: primary key field numbers by space number
+    :param spaces: space numbers to keep (all spaces if None)
+    :type spaces: set
+
+    :return: change events and the vclock reached by the packets
+    :rtype: tuple of (list of `ChangeEvent`, dict)
+    '''
+    events = []
+    vclock = {}
+    for frame in frames:
+        row = decode_frame(frame, encoding)
+        if row.lsn is not None and row.server_id is not None:
+            vclock[row.server_id] = row.lsn
+        if not row.is_dml:
+            continue
+        if spaces is not None and row.space_no not in spaces:
+            continue
+        key = row.key
+        if row.tuple is not None and row.space_no in parts:
+            key = list(row.primary_key(parts[row.space_no]))
+        events.append(ChangeEvent(row.op, row.space_no, row.index_no, key,
+                                  row.tuple, row.ops, row.lsn, row.server_id,
+                                  row.timestamp))
+    return events, vclock
+
+
+class FileCheckpoint(object):
+    '''
+    Stores the vclock of the last delivered batch in a JSON file.
+    The file is replaced atomically, so a crash leaves either the old or
+    the new position.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        '''
+        :return: the saved vclock or None if there's no checkpoint yet
+        :rtype: dict
+        '''
+        try:
+            with open(self.path) as fp:
+                return dict((int(k), v) for k, v in json.load(fp).items())
+        except IOError:
+            return None
+
+    def save(self, vclock):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(vclock, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        getattr(os, 'replace', os.rename)(tmp, self.path)
+
+
+class ChangeConsumer(object):
+    '''
+    Change-data-capture consumer of the SUBSCRIBE stream.
+
+    :meth:`consume` passes lists of :class:`ChangeEvent` to a sink and
+    saves the vclock after every delivered batch, so a restarted consumer
+    resumes right after the last batch the sink has accepted.
+
+    The replication protocol can't filter rows on the server, so
+    `spaces` are filtered by the decoder. With `workers` > 0 packets are
+    decoded by a pool of processes while the calling thread keeps reading
+    the socket.
+
+    The connection is taken over by the stream, so it must be dedicated
+    to the consumer. Its user must have the 'replication' role and
+    `server_uuid` must be registered in the cluster.
+    '''
+
+    def __init__(self, conn, cluster_uuid, server_uuid, checkpoint=None,
+                 spaces=None, batch_size=1000, batch_timeout=1.0,
+                 workers=0, vclock=None):
+        '''
+        :param conn: connection dedicated to the stream
+        :type conn: :class:`~tarantool.connection.Connection`
+        :param str cluster_uuid: UUID of the replica set
+        :param str server_uuid: UUID of the registered replica
+        :param checkpoint: object with load() and save(vclock) methods,
+            e.g. :class:`FileCheckpoint`
+        :param spaces: space numbers or names to capture (all if None)
+        :type spaces: list
+        :param int batch_size: maximum number of packets in a batch
+        :param float batch_timeout: seconds to wait before a partial batch
+            is delivered; it is checked on every packet, including
+            heartbeats of the master
+        :param int workers: number of decoding processes
+        :param dict vclock: position to start from if there's no checkpoint
+        '''
+        self.conn = conn
+        self.cluster_uuid = cluster_uuid
+        self.server_uuid = server_uuid
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.workers = workers
+        self.vclock = None
+        if checkpoint is not None:
+            self.vclock = checkpoint.load()
+        if self.vclock is None:
+            self.vclock = dict(vclock or {})
+        self.spaces = None
+        self.parts = {}
+        if spaces is not None:
+            self.spaces = set(conn.schema.get_space(space).sid
+                              for space in spaces)
+        for space in self.spaces or self._user_spaces():
+            self.parts[space] = key_parts(conn.schema, space)
+        self.events = 0
+        self.batches = 0
+        self.error = None
+        self._stopping = False
+
+    def _user_spaces(self):
+        return [sid for sid in self.conn.schema.schema
+                if isinstance(sid, integer_types) and sid >= 512 and
+                0 in self.conn.schema.schema[sid].indexes]
+
+    def stop(self):
+        '''
+        Stop :meth:`consume` from another thread or from the sink.
+        '''
+        self._stopping = True
+        self.conn.shutdown()
+
+    def _frames(self):
+        request = RequestSubscribe(self.conn, self.cluster_uuid,
+                                   self.server_uuid, dict(self.vclock))
+        self.conn._socket.sendall(bytes(request))
+        while True:
+            yield self.conn._read_response()
+
+    def _deliver(self, sink, result):
+        events, vclock = result
+        if events:
+            sink(events)
+            self.events += len(events)
+            self.batches += 1
+        if vclock:
+            self.vclock.update(vclock)
+            if self.checkpoint is not None:
+                self.checkpoint.save(self.vclock)
+
+    def _deliver_results(self, sink, results):
+        # Delivers batches decoded by the pool in the order of packets
+        while True:
+            result = results.get()
+            if result is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._deliver(sink, result.get())
+            except Exception as e:
+                self.error = e
+                self.stop()
+
+    def consume(self, sink):
+        '''
+        Read the stream and pass batches of events to `sink` until
+        :meth:`stop` is called.
+
+        :param sink: callable accepting a list of `ChangeEvent`; an
+            exception raised by the sink stops the consumer without
+            advancing the checkpoint and is re-raised
+
+        Delivery is at-least-once: packets read but not delivered before
+        the stop are read again after a restart from the checkpoint.
+        '''
+        self._stopping = False
+        self.error = None
+        encoding = self.conn.encoding
+        pool = None
+        if self.workers > 0:
+            pool = multiprocessing.Pool(self.workers)
+            # Bound the number of batches in flight
+            results = queue.Queue(self.workers * 2)
+            deliverer = threading.Thread(target=self._deliver_results,
+                                         args=(sink, results))
+            deliverer.start()
+
+        def submit(frames):
+            args = (frames, encoding, self.parts, self.spaces)
+            if pool is None:
+                self._deliver(sink, decode_events(*args))
+            else:
+                results.put(pool.apply_async(decode_events, args))
+
+        frames = []
+        deadline = time.time() + self.batch_timeout
+        try:
+            for frame in self._frames():
+                frames.append(frame)
+                if (len(frames) >= self.batch_size or
+                        time.time() >= deadline):
+                    submit(frames)
+                    frames = []
+                    deadline = time.time() + self.batch_timeout
+        except NetworkError:
+            if not self._stopping:
+                raise
+        finally:
+            if pool is not None:
+                results.put(None)
+                deliverer.join()
+                pool.terminate()
+        if self.error is not None:
+            raise self.error
@@ -61,6 +61,7 @@ from tarantool.schema import Schema
 from tarantool.utils import (
     check_key,
     greeting_decode,
+    perf_counter,
     version_id,
     string_types,
     ENCODING_DEFAULT,
@@ -91,7 +92,12 @@ class Connection(object):
                  connect_now=True,
                  encoding=ENCODING_DEFAULT,
                  call_16=False,
-                 connection_timeout=CONNECTION_TIMEOUT):
+                 connection_timeout=CONNECTION_TIMEOUT,
+                 metrics=None,
+                 tracer=None,
+                 slow_log=None,
+                 hot_keys=None,
+                 capture=None):
         '''
         Initialize a connection to the server.
 
@@ -100,6 +106,16 @@ class Connection(object):
         :param bool connect_now: if True (default) than __init__() actually
         creates network connection.
                              if False than you have to call connect() manualy.
+        :param metrics: :class:`~tarantool.metrics.Metrics` to account
+            requests in
+        :param tracer: :class:`~tarantool.tracing.Tracer` timing phases
+            of sampled requests
+        :param slow_log: :class:`~tarantool.slowlog.SlowRequestLog` of
+            slow requests
+        :param hot_keys: :class:`~tarantool.hotkeys.HotKeyProfiler`
+            sampling keys of requests
+        :param capture: :class:`~tarantool.capture.Capture` recording
+            requests for :mod:`tarantool.replay`
         '''
         if os.name == 'nt':
             libc = ctypes.WinDLL(
@@ -126,6 +142,11 @@ class Connection(object):
         self.encoding = encoding
         self.call_16 = call_16
         self.connection_timeout = connection_timeout
+        self.metrics = metrics
+        self.tracer = tracer
+        self.slow_log = slow_log
+        self.hot_keys = hot_keys
+        self.capture = capture
         if connect_now:
             self.connect()
 
@@ -136,6 +157,18 @@ class Connection(object):
         self._socket.close()
         self._socket = None
 
+    def shutdown(self):
+        '''
+        Shut the connection down without closing the socket.
+        A request or a replication stream blocked on the socket in another
+        thread fails with `NetworkError`. Call `close()` afterwards.
+        '''
+        if self._socket:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
     def connect_basic(self):
         if self.host == None:
             self.connect_unix()
@@ -236,17 +269,25 @@ class Connection(object):
                 buf += tmp
         return buf
 
-    def _read_response(self):
+    def _read_response(self, span=None):
         '''
         Read response from the transport (socket)
 
+        :param span: :class:`~tarantool.tracing.Span` to mark the wait
+            and receive phases in
+
         :return: tuple of the form (header, body)
         :rtype: tuple of two byte arrays
         '''
         # Read packet length
         length = msgpack.unpackb(self._recv(5))
+        if span is not None:
+            span.mark('wait')
         # Read the packet
-        return self._recv(length)
+        data = self._recv(length)
+        if span is not None:
+            span.mark('receive')
+        return data
 
     def _send_request_wo_reconnect(self, request):
         '''
@@ -256,6 +297,11 @@ class Connection(object):
         '''
         assert isinstance(request, Request)
 
+        span = request.span
+        if self.metrics is not None or self.slow_log is not None or \
+                self.capture is not None or span is not None:
+            return self._send_instrumented(request, span)
+
         response = None
         while True:
             try:
@@ -268,6 +314,115 @@ class Connection(object):
 
         return response
 
+    def _send_instrumented(self, request, span):
+        '''
+        :meth:`_send_request_wo_reconnect` accounting the request in
+        :attr:`metrics`, :attr:`slow_log`, :attr:`capture` and the span of
+        the request
+        '''
+        error = None
+        try:
+            while True:
+                packet = data = b''
+                started = perf_counter()
+                try:
+                    packet = bytes(request)
+                    if span is not None:
+                        span.mark('encode')
+                        span.request_bytes = len(packet)
+                    self._socket.sendall(packet)
+                    if span is not None:
+                        span.mark('send')
+                    data = self._read_response(span)
+                    try:
+                        response = Response(self, data)
+                    finally:
+                        if span is not None:
+                            span.mark('decode')
+                            span.response_bytes = len(data) + 5
+                except SchemaReloadException as e:
+                    if self.metrics is not None:
+                        self.metrics.schema_reload(self.address)
+                    self.update_schema(e.schema_version)
+                    continue
+                except DatabaseError as e:
+                    self._account(request, self.address,
+                                  perf_counter() - started, packet,
+                                  len(data) + 5 if data else 0, e)
+                    raise
+                self._account(request, self.address, perf_counter() - started,
+                              packet, len(data) + 5)
+                return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if span is not None:
+                self.tracer.finish(span, request, self.address, error)
+
+    def _account(self, request, node, latency, packet, received,
+                 error=None):
+        '''
+        Pass a completed request to :attr:`metrics`, :attr:`slow_log` and
+        :attr:`capture`.
+        '''
+        if self.metrics is not None:
+            self.metrics.observe(request, node, latency, len(packet),
+                                 received, error)
+        if self.slow_log is not None:
+            self.slow_log.observe(self, request, node, latency, received,
+                                  error)
+        if self.capture is not None:
+            self.capture.record(request, packet, latency, received, error)
+
+    @property
+    def address(self):
+        '''
+        'host:port' of the server or the path of its unix socket
+
+        :type: str
+        '''
+        if self.host is None:
+            return str(self.port)
+        return '%s:%s' % (self.host, self.port)
+
+    def _check_connection(self):
+        '''
+        Check that connection is alive using low-level recv from libc(ctypes)
+
+        :return: errno.EAGAIN if the connection is alive
+        '''
+        buf = ctypes.create_string_buffer(2)
+        try:
+            sock_fd = self._socket.fileno()
+        except socket.error as e:
+            if e.errno == errno.EBADF:
+                return errno.ECONNRESET
+        else:
+            if os.name == 'nt':
+                flag = socket.MSG_PEEK
+                self._socket.setblocking(False)
+            else:
+                flag = socket.MSG_DONTWAIT | socket.MSG_PEEK
+            retbytes = self._sys_recv(sock_fd, buf, 1, flag)
+
+            err = 0
+            if os.name!= 'nt':
+                err = ctypes.get_errno()
+            else:
+                err = ctypes.get_last_error()
+                self._socket.setblocking(True)
+
+
+            WWSAEWOULDBLOCK = 10035
+            if (retbytes < 0) and (err == errno.EAGAIN or
+                                   err == errno.EWOULDBLOCK or
+                                   err == WWSAEWOULDBLOCK):
+                ctypes.set_errno(0)
+                return errno.EAGAIN
+            else:
+                return errno.ECONNRESET
+
     def _opt_reconnect(self):
         '''
         Check that connection is alive using low-level recv from libc(ctypes)
@@ -276,39 +431,7 @@ class Connection(object):
         if not self._socket:
             return self.connect()
 
-        def check():  # Check that connection is alive
-            buf = ctypes.create_string_buffer(2)
-            try:
-                sock_fd = self._socket.fileno()
-            except socket.error as e:
-                if e.errno == errno.EBADF:
-                    return errno.ECONNRESET
-            else:
-                if os.name == 'nt':
-                    flag = socket.MSG_PEEK
-                    self._socket.setblocking(False)
-                else:
-                    flag = socket.MSG_DONTWAIT | socket.MSG_PEEK
-                retbytes = self._sys_recv(sock_fd, buf, 1, flag)
-
-                err = 0
-                if os.name!= 'nt':
-                    err = ctypes.get_errno()
-                else:
-                    err = ctypes.get_last_error()
-                    self._socket.setblocking(True)
-
-
-                WWSAEWOULDBLOCK = 10035
-                if (retbytes < 0) and (err == errno.EAGAIN or
-                                       err == errno.EWOULDBLOCK or
-                                       err == WWSAEWOULDBLOCK):
-                    ctypes.set_errno(0)
-                    return errno.EAGAIN
-                else:
-                    return errno.ECONNRESET
-
-        last_errno = check()
+        last_errno = self._check_connection()
         if self.connected and last_errno == errno.EAGAIN:
             return
 
@@ -330,6 +453,8 @@ class Connection(object):
                     socket.error(last_errno, errno.errorcode[last_errno]))
             attempt += 1
         self.handshake()
+        if self.metrics is not None:
+            self.metrics.reconnect(self.address)
 
     def _send_request(self, request):
         '''
@@ -343,8 +468,20 @@ class Connection(object):
         '''
         assert isinstance(request, Request)
 
-        self._opt_reconnect()
+        if self.hot_keys is not None:
+            self.hot_keys.observe(request)
+        span = request.span
+        if span is None:
+            self._opt_reconnect()
+            return self._send_request_wo_reconnect(request)
 
+        span.mark('encode')
+        try:
+            self._opt_reconnect()
+        except Exception as e:
+            self.tracer.finish(span, request, self.address, e)
+            raise
+        span.skip()
         return self._send_request_wo_reconnect(request)
 
     def load_schema(self):
@@ -44,11 +44,18 @@ REQUEST_TYPE_AUTHENTICATE = 7
 REQUEST_TYPE_EVAL = 8
 REQUEST_TYPE_UPSERT = 9
 REQUEST_TYPE_CALL = 10
+REQUEST_TYPE_NOP = 12
 REQUEST_TYPE_PING = 64
 REQUEST_TYPE_JOIN = 65
 REQUEST_TYPE_SUBSCRIBE = 66
 REQUEST_TYPE_ERROR = 1 << 15
 
+# snapshot and xlog files
+XLOG_FIXHEADER_SIZE = 19
+XLOG_ROW_MARKER = b'\xd5\xba\x0b\xab'
+XLOG_ZROW_MARKER = b'\xd5\xba\x0b\xba'
+XLOG_EOF_MARKER = b'\xd5\x10\xad\xed'
+
 SPACE_SCHEMA = 272
 SPACE_SPACE = 280
 SPACE_INDEX = 288
@@ -86,3 +93,7 @@ SOCKET_TIMEOUT = None
 RECONNECT_MAX_ATTEMPTS = 10
 # Default delay between attempts to reconnect (seconds)
 RECONNECT_DELAY = 0.1
+# Default delay between cluster discovery requests (seconds)
+CLUSTER_DISCOVERY_DELAY = 60
+# Default delay between parallel connection attempts of a mesh (seconds)
+CONNECT_STAGGER = 0.25
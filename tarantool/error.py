@@ -128,6 +128,10 @@ class SchemaReloadException(DatabaseError):
         return str(self.message)
 
 
+class XlogError(Error):
+    '''Error related to the format of snapshot and xlog files'''
+
+
 class NetworkError(DatabaseError):
     '''Error related to network'''
 
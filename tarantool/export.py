@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.export.JoinExporter` class.
+It copies data of a server with JOIN into per-space msgpack files.
+'''
+
+import collections
+import multiprocessing
+import os
+import time
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    REQUEST_TYPE_OK,
+    REQUEST_TYPE_ERROR,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE
+)
+from tarantool.request import RequestJoin
+from tarantool.replication import (
+    decode_frame,
+    unpacker
+)
+from tarantool.utils import version_id
+
+
+def encode_batch(frames, encoding, spaces=None, final=False):
+    '''
+    Decode raw JOIN packets and pack their tuples per space.
+    It is executed by worker processes of the exporter.
+
+    Rows of the initial phase are packed as plain tuples. Rows of the
+    final phase may also update or delete tuples, so they are packed as
+    records [op, key, tuple, ops].
+
+    :return: packed data by space number and the number of rows
+    :rtype: tuple of (dict, int)
+    '''
+    chunks = collections.defaultdict(list)
+    rows = 0
+    for frame in frames:
+        row = decode_frame(frame, encoding)
+        if not row.is_dml:
+            continue
+        if spaces is not None and row.space_no not in spaces:
+            continue
+        rows += 1
+        if not final and row.code in (REQUEST_TYPE_INSERT,
+                                      REQUEST_TYPE_REPLACE):
+            chunks[row.space_no].append(msgpack.packb(row.tuple))
+        else:
+            chunks[row.space_no].append(msgpack.packb(
+                [row.op, row.key, row.tuple, row.ops]))
+    return dict((space, b''.join(chunk))
+                for space, chunk in chunks.items()), rows
+
+
+class ExportStats(object):
+    '''
+    Progress of an export.
+    '''
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / max(self.elapsed, 1e-9)
+
+    @property
+    def bytes_per_sec(self):
+        return self.bytes / max(self.elapsed, 1e-9)
+
+    def __str__(self):
+        return '%d rows, %d bytes in %.2fs (%.0f rows/s, %.0f bytes/s)' % (
+            self.rows, self.bytes, self.elapsed, self.rows_per_sec,
+            self.bytes_per_sec)
+
+
+class JoinExporter(object):
+    '''
+    Exports a snapshot of the server received with JOIN.
+
+    Tuples of the initial phase (the last checkpoint) are written to
+    `<directory>/<space_no>.msgpack` as a stream of msgpack arrays.
+    Rows of the final phase (changes made after the checkpoint, Tarantool
+    1.7+) are written to `<directory>/<space_no>.final.msgpack` as
+    records [op, key, tuple, ops].
+
+    Packets are decoded in batches of `batch_size`. With `workers` > 0
+    batches are decoded by a pool of processes, and at most
+    `workers * 2` batches are kept in memory.
+
+    The connection is taken over by JOIN. Its user must have the
+    'replication' role and `server_uuid` gets registered in the cluster.
+    '''
+
+    def __init__(self, conn, server_uuid, directory, spaces=None,
+                 workers=0, batch_size=1000, progress=None):
+        '''
+        :param conn: connection dedicated to JOIN
+        :type conn: :class:`~tarantool.connection.Connection`
+        :param str server_uuid: UUID to join the cluster with
+        :param str directory: directory to write files into
+        :param spaces: space numbers or names to export (all if None)
+        :type spaces: list
+        :param int workers: number of decoding processes
+        :param int batch_size: number of packets in a batch
+        :param progress: callable receiving `ExportStats` after every
+            written batch
+        '''
+        self.conn = conn
+        self.server_uuid = server_uuid
+        self.directory = directory
+        self.spaces = None
+        if spaces is not None:
+            self.spaces = set(conn.schema.get_space(space).sid
+                              for space in spaces)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.progress = progress
+        self.stats = None
+        self._files = {}
+
+    def _file(self, space_no, final):
+        name = '%d.final.msgpack' % space_no if final else \
+            '%d.msgpack' % space_no
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self.directory, name), 'wb')
+        return self._files[name]
+
+    def _write(self, result, final):
+        chunks, rows = result
+        for space_no, data in chunks.items():
+            self._file(space_no, final).write(data)
+        self.stats.rows += rows
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def _frames(self):
+        self.conn._opt_reconnect()
+        request = RequestJoin(self.conn, self.server_uuid)
+        self.conn._socket.sendall(bytes(request))
+        while True:
+            frame = self.conn._read_response()
+            self.stats.bytes += len(frame)
+            yield frame
+
+    def run(self):
+        '''
+        Run the export. Blocks until JOIN is complete.
+
+        :rtype: `ExportStats`
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.stats = ExportStats()
+        encoding = self.conn.encoding
+        # JOIN of 1.6 has a single phase, 1.7+ sends an OK packet after
+        # the vclock, the initial and the final phases
+        oks_left = 1 if self.conn.version_id < version_id(1, 7, 0) else 3
+        phases = 0
+        pool = None
+        pending = collections.deque()
+        if self.workers > 0:
+            pool = multiprocessing.Pool(self.workers)
+
+        def submit(frames, final):
+            args = (frames, encoding, self.spaces, final)
+            if pool is None:
+                self._write(encode_batch(*args), final)
+                return
+            pending.append((pool.apply_async(encode_batch, args), final))
+            while len(pending) > self.workers * 2:
+                result, final = pending.popleft()
+                self._write(result.get(), final)
+
+        frames = []
+        try:
+            for frame in self._frames():
+                decoder = unpacker(encoding)
+                decoder.feed(frame)
+                code = decoder.unpack()[IPROTO_CODE]
+                if code >= REQUEST_TYPE_ERROR:
+                    # Raises DatabaseError
+                    decode_frame(frame, encoding)
+                if code != REQUEST_TYPE_OK:
+                    frames.append(frame)
+                    if len(frames) >= self.batch_size:
+                        submit(frames, phases > 1)
+                        frames = []
+                    continue
+                if frames:
+                    submit(frames, phases > 1)
+                    frames = []
+                phases += 1
+                oks_left -= 1
+                if oks_left == 0:
+                    break
+            while pending:
+                result, final = pending.popleft()
+                self._write(result.get(), final)
+        finally:
+            if pool is not None:
+                pool.terminate()
+            for fp in self._files.values():
+                fp.close()
+            self._files = {}
+        self.stats.finished = time.time()
+        return self.stats
+
+
+def read_export(path, encoding='utf-8'):
+    '''
+    Iterate over tuples (or final phase records) of an exported file.
+    '''
+    decoder = unpacker(encoding)
+    with open(path, 'rb') as fp:
+        while True:
+            data = fp.read(65536)
+            if not data:
+                return
+            decoder.feed(data)
+            for obj in decoder:
+                yield obj
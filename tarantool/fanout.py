@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.fanout.FanOut` class. It sends the
+same request to many connections (shards or instances) concurrently and
+gathers or merges the results, so a fan-out takes about as long as the
+slowest connection rather than the sum of all of them.
+'''
+
+import heapq
+import socket
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from tarantool.error import NetworkError
+from tarantool.utils import integer_types
+
+
+def field_key(fields):
+    '''
+    Return a function extracting a sort key from a tuple.
+
+    :param fields: field number or list of field numbers (the parts of
+        the index the tuples are ordered by)
+    '''
+    if isinstance(fields, integer_types):
+        fields = [fields]
+    fields = list(fields)
+    return lambda tpl: [tpl[field] for field in fields]
+
+
+def merge_sorted(sequences, key=None, limit=None, reverse=False):
+    '''
+    K-way merge of sorted sequences, yielding at most `limit` items.
+
+    :param key: function returning the sort key of an item (the item
+        itself by default)
+    :param bool reverse: sequences are sorted in descending order
+    '''
+    if key is None:
+        key = lambda item: item
+    heap = []
+    iterators = [iter(seq) for seq in sequences]
+
+    def push(num):
+        for item in iterators[num]:
+            value = key(item)
+            if reverse:
+                value = _Reversed(value)
+            heapq.heappush(heap, (value, num, item))
+            return
+    for num in range(len(iterators)):
+        push(num)
+    count = 0
+    while heap and (limit is None or count < limit):
+        _, num, item = heapq.heappop(heap)
+        yield item
+        count += 1
+        push(num)
+
+
+class _Reversed(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class FanOut(object):
+    '''
+    Executor running functions (usually requests to different
+    connections) in a pool of threads under a global timeout.
+
+    Example::
+
+        fanout = FanOut(timeout=1.0)
+        rows = fanout.merge(dict(
+            (name, lambda conn=conn: conn.select('users', [], index='age',
+                                                 limit=10))
+            for name, conn in shards.items()), key=field_key(2), limit=10)
+
+    A function still running when the timeout expires is left to finish
+    in background and its result is dropped. Its connection may still be
+    waiting for the response then, and a connection isn't thread-safe, so
+    pass the connections of the functions as `connections`: the ones of
+    the functions that haven't completed are shut down on timeout (the
+    next request reconnects) and the late response can't be read by
+    another request.
+    '''
+
+    def __init__(self, workers=16, timeout=None):
+        '''
+        :param int workers: maximum number of threads
+        :param float timeout: default global timeout of a fan-out in
+            seconds (None for no timeout)
+        '''
+        self.workers = workers
+        self.timeout = timeout
+        self._tasks = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            key, func, results = task
+            try:
+                results.put((key, func(), None))
+            except Exception:
+                results.put((key, None, sys.exc_info()[1]))
+
+    def _start(self, count):
+        with self._lock:
+            while len(self._threads) < min(count, self.workers):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def close(self):
+        '''
+        Stop the threads once they finish queued functions.
+        '''
+        with self._lock:
+            for _ in self._threads:
+                self._tasks.put(None)
+            self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def as_completed(self, tasks, timeout=None, connections=None):
+        '''
+        Run functions of `tasks` concurrently and yield their results in
+        the order of completion.
+
+        :param dict tasks: functions without arguments by keys
+        :param float timeout: global timeout, :attr:`timeout` by default
+        :param dict connections: connections used by the functions by the
+            same keys, shut down if their functions time out
+
+        :return: iterator over (key, result) pairs
+        :raise: `NetworkError` if not all functions complete in time, an
+            exception raised by a function
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.time() + timeout
+        results = queue.Queue()
+        self._start(len(tasks))
+        for key, func in tasks.items():
+            self._tasks.put((key, func, results))
+        pending = set(tasks)
+        while pending:
+            try:
+                if deadline is None:
+                    key, result, error = results.get()
+                else:
+                    key, result, error = results.get(
+                        timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                self._abandon(pending, connections)
+                raise NetworkError(socket.timeout())
+            pending.discard(key)
+            if error is not None:
+                raise error
+            yield key, result
+
+    def _abandon(self, keys, connections):
+        if not connections:
+            return
+        for key in keys:
+            conn = connections.get(key)
+            if conn is not None:
+                conn.shutdown()
+
+    def gather(self, tasks, timeout=None, connections=None):
+        '''
+        Run functions of `tasks` concurrently, see :meth:`as_completed`.
+
+        :return: results by keys of `tasks`
+        :rtype: dict
+        '''
+        return dict(self.as_completed(tasks, timeout, connections))
+
+    def merge(self, tasks, key=None, limit=None, reverse=False,
+              timeout=None, connections=None):
+        '''
+        Run functions of `tasks` concurrently and merge the returned
+        sorted sequences (e.g. responses of the same SELECT by an index
+        sent to all shards) into one.
+
+        The merge starts once all functions complete, so all the
+        sequences are buffered in memory: the first item can't be known
+        before the heads of all of them are, and each function returns
+        its whole sequence at once. Bound the memory with a `limit` sent
+        with the requests as well.
+
+        :param key: function returning the sort key of an item, see
+            :func:`field_key`
+        :param int limit: maximum number of items to return
+        :param bool reverse: sequences are sorted in descending order
+
+        :rtype: list
+        '''
+        results = self.gather(tasks, timeout, connections)
+        return list(merge_sorted(results.values(), key, limit, reverse))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.hotkeys.HotKeyProfiler` class. It
+samples requests of connections and reports the most requested keys and
+spaces over a sliding window, to find keys worth caching or resharding.
+'''
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from tarantool.const import (
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPSERT
+)
+
+WRITE_REQUESTS = (REQUEST_TYPE_INSERT, REQUEST_TYPE_REPLACE,
+                  REQUEST_TYPE_UPDATE, REQUEST_TYPE_DELETE,
+                  REQUEST_TYPE_UPSERT)
+
+
+def freeze(value):
+    '''
+    :return: hashable version of a key (lists become tuples)
+    '''
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return repr(sorted(value.items()))
+    return value
+
+
+class SpaceSaving(object):
+    '''
+    Space-Saving summary of the most frequent items of a stream kept in
+    `capacity` counters. When all counters are taken, a new item replaces
+    the least counted one and inherits its count as the possible
+    overestimation (`error`), so an item seen more than 1/capacity of
+    the times is always kept.
+
+    The least counted item is found with a min-heap of (count, item)
+    entries that aren't updated when an item is counted: a stale entry
+    on the top is pushed back with the current count, so an addition
+    takes O(log capacity) amortized time.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+        self._heap = []
+        self._order = itertools.count()
+
+    def add(self, item, count=1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, next(self._order), item))
+            return
+        while True:
+            least, _, victim = self._heap[0]
+            current = self.counters[victim][0]
+            if current == least:
+                break
+            heapq.heapreplace(self._heap,
+                              (current, next(self._order), victim))
+        del self.counters[victim]
+        self.counters[item] = [least + count, least]
+        heapq.heapreplace(self._heap,
+                          (least + count, next(self._order), item))
+
+    def items(self):
+        '''
+        :return: (item, count, error) triples
+        '''
+        return [(item, counter[0], counter[1])
+                for item, counter in self.counters.items()]
+
+
+class _Slice(object):
+    def __init__(self, started, capacity):
+        self.started = started
+        self.keys = SpaceSaving(capacity)
+        self.spaces = {}
+        self.requests = 0
+
+
+class HotKeyProfiler(object):
+    '''
+    Samples `sample_rate` of requests of connections it is passed to as
+    `hot_keys` and keeps a :class:`SpaceSaving` summary of (space, index,
+    key) of reads and writes for every slice of a sliding `window` of
+    seconds::
+
+        profiler = HotKeyProfiler(sample_rate=0.01)
+        con = tarantool.Connection(host, port, hot_keys=profiler)
+        ...
+        for item in profiler.top(10):
+            print(item['space'], item['key'], item['estimate'])
+
+    Writes are keyed by their primary key: INSERT, REPLACE and UPSERT by
+    the fields of the primary index from the schema cache of the
+    connection (the first field if the space isn't cached).
+    '''
+
+    def __init__(self, sample_rate=0.01, capacity=1000, window=60.0,
+                 slices=6):
+        '''
+        :param float sample_rate: share of requests to account
+        :param int capacity: number of keys tracked in a slice
+        :param float window: seconds
+        :param int slices: number of parts the window is split into; the
+            oldest one is dropped when a new one starts
+        '''
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.window = window
+        self.slices = slices
+        self._slices = []
+        self._lock = threading.Lock()
+
+    def _slice(self, now):
+        duration = float(self.window) / self.slices
+        if not self._slices or now - self._slices[-1].started >= duration:
+            self._slices.append(_Slice(now, self.capacity))
+        while now - self._slices[0].started >= self.window + duration:
+            self._slices.pop(0)
+        return self._slices[-1]
+
+    def _key(self, request):
+        if request.key is not None:
+            return request.index_no, freeze(request.key)
+        tpl = request.tuple_value
+        if not tpl:
+            return None, None
+        parts = [0]
+        space = request.conn.schema.schema.get(request.space_no)
+        if space is not None and 0 in space.indexes:
+            parts = [part[0] for part in space.indexes[0].parts]
+        try:
+            return 0, freeze([tpl[field] for field in parts])
+        except (IndexError, KeyError, TypeError):
+            return 0, None
+
+    def observe(self, request):
+        '''
+        Account a request if it is sampled.
+        '''
+        if request.space_no is None:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        kind = 'write' if request.request_type in WRITE_REQUESTS else 'read'
+        index_no, key = self._key(request)
+        now = time.time()
+        with self._lock:
+            current = self._slice(now)
+            current.requests += 1
+            counts = current.spaces.setdefault(request.space_no,
+                                               {'read': 0, 'write': 0})
+            counts[kind] += 1
+            if key is not None:
+                current.keys.add((request.space_no, index_no, key, kind))
+
+    def _live(self):
+        now = time.time()
+        return [item for item in self._slices
+                if now - item.started < self.window]
+
+    def top(self, count=10):
+        '''
+        Most requested keys of the window.
+
+        :return: dicts with 'space', 'index', 'key', 'op' ('read' or
+            'write'), 'count' (sampled requests, might be overestimated by
+            up to 'error'), 'estimate' (count scaled by the sample rate)
+            and 'share' of sampled requests
+        :rtype: list
+        '''
+        with self._lock:
+            live = self._live()
+            totals = {}
+            errors = {}
+            requests = 0
+            for item in live:
+                requests += item.requests
+                for key, hits, error in item.keys.items():
+                    totals[key] = totals.get(key, 0) + hits
+                    errors[key] = errors.get(key, 0) + error
+        result = []
+        for key in sorted(totals, key=lambda key: -totals[key])[:count]:
+            space, index, value, kind = key
+            result.append({
+                'space': space,
+                'index': index,
+                'key': value,
+                'op': kind,
+                'count': totals[key],
+                'error': errors[key],
+                'estimate': totals[key] / self.sample_rate,
+                'share': float(totals[key]) / requests
+            })
+        return result
+
+    def top_spaces(self, count=10):
+        '''
+        Most requested spaces of the window.
+
+        :return: dicts with 'space', 'reads', 'writes' (sampled requests),
+            'estimate' (all requests scaled by the sample rate) and 'share'
+        :rtype: list
+        '''
+        with self._lock:
+            live = self._live()
+            totals = {}
+            requests = 0
+            for item in live:
+                requests += item.requests
+                for space, counts in item.spaces.items():
+                    total = totals.setdefault(space, {'read': 0, 'write': 0})
+                    total['read'] += counts['read']
+                    total['write'] += counts['write']
+        result = []
+        for space in sorted(totals, key=lambda space: -sum(
+                totals[space].values()))[:count]:
+            total = totals[space]['read'] + totals[space]['write']
+            result.append({
+                'space': space,
+                'reads': totals[space]['read'],
+                'writes': totals[space]['write'],
+                'estimate': total / self.sample_rate,
+                'share': float(total) / requests
+            })
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._slices = []
@@ -2,17 +2,172 @@
 '''
 This module provides MeshConnection class with automatic switch
 between tarantool instances and basic Round-Robin strategy.
+
+Strategies derived from :class:`BaseStrategy` spread requests over
+connections to all instances and choose an instance for every request
+using its latency and the number of requests in flight.
+:class:`HealthChecker` ejects failed and slow instances from them.
+:class:`Discovery` keeps the list of instances up to date.
+With `read_write_split` data changes are sent to the writable instance
+and reads to read-only replicas which don't lag behind it.
+Instances are connected in parallel by :func:`race_connect`.
+:class:`HedgingPolicy` resends slow reads to a second instance.
 '''
 
+import collections
+import errno
+import random
+import socket
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 from tarantool.connection import Connection
-from tarantool.error import NetworkError
-from tarantool.utils import ENCODING_DEFAULT
+from tarantool.response import Response
+from tarantool.error import (
+    DatabaseError,
+    NetworkError,
+    SchemaReloadException
+)
+from tarantool.request import (
+    RequestCall,
+    RequestEval,
+    RequestPing
+)
+from tarantool.replication import (
+    decode_vclock,
+    vclock_ge
+)
+from tarantool.utils import (
+    ENCODING_DEFAULT,
+    perf_counter,
+    string_types
+)
 from tarantool.const import (
     SOCKET_TIMEOUT,
     RECONNECT_MAX_ATTEMPTS,
-    RECONNECT_DELAY
+    RECONNECT_DELAY,
+    CONNECTION_TIMEOUT,
+    CLUSTER_DISCOVERY_DELAY,
+    CONNECT_STAGGER,
+    REQUEST_TYPE_SELECT,
+    REQUEST_TYPE_PING
 )
 
+ER_READONLY = 7
+# Longest time an instance which can't be connected is skipped for
+MAX_RETRY_DELAY = 60.0
+
+# Read-only status, replication lag and vclock of an instance,
+# box.info.ro appeared in 1.9
+STATUS_EXPR = '''
+local info = box.info
+local ro = info.ro
+if ro == nil then
+    ro = box.cfg.read_only
+end
+local lag = nil
+for _, replica in pairs(info.replication or {}) do
+    if replica.upstream ~= nil and replica.upstream.lag ~= nil then
+        lag = math.max(lag or 0, replica.upstream.lag)
+    end
+end
+return ro, lag, info.vclock
+'''
+
+
+def addr_key(addr):
+    return (addr['host'], addr['port'])
+
+
+def parse_uri(uri, default_host='localhost'):
+    '''
+    Parse an address of an instance: a map {'host': HOST, 'port': PORT}
+    or an URI 'host:port', 'user:password@host:port' or 'port' as used by
+    `box.cfg.listen` and `box.cfg.replication`.
+
+    :return: the address or None for URIs without a TCP port
+        (e.g. unix sockets)
+    :rtype: dict
+    '''
+    if isinstance(uri, dict):
+        return uri
+    if not isinstance(uri, string_types):
+        uri = str(uri)
+    uri = uri.rpartition('@')[2]
+    host, _, port = uri.rpartition(':')
+    if not port.isdigit():
+        return None
+    return {'host': host or default_host, 'port': int(port)}
+
+
+def discover_replication(conn):
+    '''
+    Discovery function returning URIs of `box.cfg.replication` of
+    an instance of the replica set.
+    '''
+    return conn.eval('return box.cfg.replication').data[0]
+
+
+def race_connect(nodes, stagger=CONNECT_STAGGER):
+    '''
+    Connect to instances in parallel ("happy eyeballs"): an attempt is
+    started `stagger` seconds after the previous one, or as soon as it
+    fails, and the first instance to complete the handshake wins.
+    Instances connected after the winner are closed.
+
+    :param list nodes: unconnected connections in the order of preference
+    :return: the connected node
+    :raise: `NetworkError` of the last attempt if all of them fail
+    '''
+    cond = threading.Condition()
+    state = {'winner': None, 'failed': 0, 'error': None}
+
+    def attempt(node):
+        try:
+            node._opt_reconnect()
+        except NetworkError as e:
+            with cond:
+                state['failed'] += 1
+                state['error'] = e
+                cond.notify_all()
+            return
+        with cond:
+            if state['winner'] is None:
+                state['winner'] = node
+                cond.notify_all()
+                return
+        if node._socket:
+            node.close()
+        node.connected = False
+
+    with cond:
+        for started, node in enumerate(nodes, 1):
+            thread = threading.Thread(target=attempt, args=(node,))
+            thread.daemon = True
+            thread.start()
+            last = started == len(nodes)
+            failed = state['failed']
+            deadline = time.time() + stagger
+            while state['winner'] is None:
+                if last:
+                    if state['failed'] == len(nodes):
+                        break
+                    cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if state['failed'] != failed or remaining <= 0:
+                        break
+                    cond.wait(remaining)
+            if state['winner'] is not None:
+                return state['winner']
+    raise state['error'] or NetworkError(socket.error(
+        errno.ECONNREFUSED, 'No instance of the mesh is available'))
+
 
 class RoundRobinStrategy(object):
     def __init__(self, addrs):
@@ -24,8 +179,686 @@ class RoundRobinStrategy(object):
         self.pos = (self.pos + 1) % len(self.addrs)
         return self.addrs[tmp]
 
+    def update(self, addrs):
+        self.addrs = list(addrs)
+        self.pos = self.pos % len(self.addrs)
+
+
+class NodeStats(object):
+    '''
+    Load statistics of an instance kept by a strategy.
+
+    :attr:`latency` is an exponentially weighted moving average of
+    response times in seconds (None until the first response),
+    :attr:`inflight` is the number of requests sent or waiting to be
+    sent to the instance. Requests aren't sent to an instance while
+    :attr:`healthy` is False or, after :attr:`failures` failed attempts
+    to connect in a row, until :attr:`retry_at`. :attr:`ro` is the
+    read-only status of the
+    instance (None until it's known), :attr:`lag` is the maximum lag of
+    its replication upstreams in seconds (None if it has no upstreams)
+    and :attr:`vclock` is its last known vclock.
+    '''
+
+    def __init__(self, addr, weight=1, alpha=0.3):
+        '''
+        :param dict addr: {'host': HOST, 'port': PORT}
+        :param weight: relative capacity of the instance
+        :param float alpha: smoothing factor of the moving average
+        '''
+        self.addr = addr
+        self.weight = weight
+        self.alpha = alpha
+        self.latency = None
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.healthy = True
+        self.failures = 0
+        self.retry_at = 0
+        self.ejections = 0
+        self.ejected_until = 0
+        self.healthy_since = time.time()
+        self.ro = None
+        self.lag = None
+        self.vclock = {}
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return addr_key(self.addr)
+
+    def observe(self, latency):
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+    def begin(self):
+        with self._lock:
+            self.inflight += 1
+
+    def end(self, latency=None, error=False):
+        with self._lock:
+            self.inflight -= 1
+            self.requests += 1
+            if error:
+                self.errors += 1
+            else:
+                self.failures = 0
+                self.retry_at = 0
+        if latency is not None:
+            self.observe(latency)
+
+    def failure(self, retry_delay=0.0):
+        '''
+        Account a failed attempt to connect. The instance is skipped for
+        `retry_delay` seconds, doubled with every failure in a row up to
+        `MAX_RETRY_DELAY`.
+        '''
+        with self._lock:
+            self.failures += 1
+            self.retry_at = time.time() + min(
+                retry_delay * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+
+    @property
+    def available(self):
+        return self.healthy and time.time() >= self.retry_at
+
+    def to_dict(self):
+        return {
+            'host': self.addr['host'],
+            'port': self.addr['port'],
+            'weight': self.weight,
+            'latency': self.latency,
+            'inflight': self.inflight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'healthy': self.healthy,
+            'failures': self.failures,
+            'retry_at': self.retry_at,
+            'ejections': self.ejections,
+            'ro': self.ro,
+            'lag': self.lag,
+            'vclock': self.vclock,
+        }
+
+
+class BaseStrategy(object):
+    '''
+    Base class of load balancing strategies.
+
+    A mesh connection with such a strategy keeps a connection to every
+    instance and asks :meth:`choose` for an instance on every request.
+    The weight of an instance is taken from the 'weight' key of its
+    address (1 by default).
+    '''
+
+    def __init__(self, addrs):
+        self.addrs = list(addrs)
+        self.pos = 0
+        self.stats = {}
+        for addr in self.addrs:
+            self.stats[addr_key(addr)] = NodeStats(addr,
+                                                   addr.get('weight', 1))
+        self._lock = threading.Lock()
+
+    def getnext(self):
+        with self._lock:
+            tmp = self.pos % len(self.addrs)
+            self.pos = (tmp + 1) % len(self.addrs)
+            return self.addrs[tmp]
+
+    def update(self, addrs):
+        '''
+        Replace the list of instances keeping statistics of the known ones.
+        '''
+        stats = {}
+        for addr in addrs:
+            key = addr_key(addr)
+            stats[key] = self.stats.get(key) or NodeStats(
+                addr, addr.get('weight', 1))
+        with self._lock:
+            self.addrs = list(addrs)
+            self.stats = stats
+            self.pos = self.pos % len(self.addrs)
+
+    def candidates(self, mode=None):
+        '''
+        :param str mode: 'rw' to choose from writable instances (or ones
+            with unknown status), 'ro' to choose from read-only replicas;
+            all instances are candidates if there are none of such
+        :return: statistics of instances requests may be sent to: healthy
+            ones which aren't waiting to be connected again, all
+            healthy or all instances if there are none
+        :rtype: list of `NodeStats`
+        '''
+        with self._lock:
+            stats = [self.stats[addr_key(addr)] for addr in self.addrs]
+        stats = [node for node in stats if node.available] or \
+            [node for node in stats if node.healthy] or stats
+        if mode == 'rw':
+            return [node for node in stats if node.ro is False] or \
+                [node for node in stats if node.ro is None] or stats
+        if mode == 'ro':
+            return [node for node in stats if node.ro] or stats
+        return stats
+
+    def score(self, stats):
+        '''
+        Expected cost of a request to the instance, lower is better.
+        Instances without measured latency are tried first.
+        '''
+        return (stats.latency or 0.0) * (stats.inflight + 1) / stats.weight
+
+    def choose(self, candidates):
+        '''
+        :param candidates: statistics of available instances
+        :type candidates: list of `NodeStats`
+        :rtype: `NodeStats`
+        '''
+        raise NotImplementedError
+
+
+class LeastOutstandingStrategy(BaseStrategy):
+    '''
+    Sends a request to the instance with the fewest requests in flight
+    relative to its weight, the fastest one of such instances wins.
+    '''
+
+    def choose(self, candidates):
+        # Rotate the start to break ties between idle instances
+        self.pos = (self.pos + 1) % len(candidates)
+        candidates = candidates[self.pos:] + candidates[:self.pos]
+        return min(candidates, key=lambda stats: (
+            float(stats.inflight + 1) / stats.weight, stats.latency or 0.0))
+
+
+class LatencyStrategy(BaseStrategy):
+    '''
+    Sends a request to the instance with the lowest latency multiplied
+    by the number of requests in flight relative to its weight.
+    '''
+
+    def choose(self, candidates):
+        self.pos = (self.pos + 1) % len(candidates)
+        candidates = candidates[self.pos:] + candidates[:self.pos]
+        return min(candidates, key=self.score)
+
+
+class PowerOfTwoStrategy(BaseStrategy):
+    '''
+    Picks two random instances (proportionally to their weights) and sends
+    a request to the one with the lower score. It is nearly as good as
+    comparing all instances and avoids herding onto a single one.
+    '''
+
+    def _pick(self, candidates):
+        total = sum(stats.weight for stats in candidates)
+        point = random.uniform(0, total)
+        for stats in candidates:
+            point -= stats.weight
+            if point <= 0:
+                return stats
+        return candidates[-1]
+
+    def choose(self, candidates):
+        if len(candidates) == 1:
+            return candidates[0]
+        first = self._pick(candidates)
+        second = self._pick([stats for stats in candidates
+                             if stats is not first])
+        return min((first, second), key=self.score)
+
+
+class HealthChecker(object):
+    '''
+    Pings instances of a mesh connection with a load balancing strategy
+    in a background thread.
+
+    An instance is ejected after `max_failures` failed pings or requests
+    in a row, at once if a request fails to connect to it, or when its latency exceeds `outlier_factor` times the
+    median latency of healthy instances. It is pinged again after
+    `ejection_time` seconds and re-admitted if it responds; the time
+    doubles with every ejection up to `max_ejection_time` and is reset
+    after the instance stays healthy that long. At most `max_ejected`
+    of instances are ejected for latency at once.
+    '''
+
+    def __init__(self, mesh, interval=1.0, max_failures=3, outlier_factor=5.0,
+                 outlier_min_latency=0.01, ejection_time=1.0,
+                 max_ejection_time=60.0, max_ejected=0.5):
+        self.mesh = mesh
+        self.interval = interval
+        self.max_failures = max_failures
+        self.outlier_factor = outlier_factor
+        self.outlier_min_latency = outlier_min_latency
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejected = max_ejected
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        '''
+        Ping instances which are healthy or whose ejection time is over
+        and eject latency outliers.
+        '''
+        for stats in list(self.mesh.strategy.stats.values()):
+            if not stats.healthy and time.time() < stats.ejected_until:
+                continue
+            latency = self.mesh._ping_node(stats)
+            if latency is None:
+                self.failure(stats)
+            else:
+                self.success(stats, latency)
+        self._eject_outliers()
+
+    def failure(self, stats):
+        with self._lock:
+            stats.failures += 1
+            if not stats.healthy or stats.failures >= self.max_failures:
+                self._eject(stats)
+
+    def eject(self, stats):
+        '''
+        Eject the instance at once, e.g. when it can't be connected on
+        the request path.
+        '''
+        with self._lock:
+            stats.failures += 1
+            self._eject(stats)
+
+    def success(self, stats, latency=None):
+        now = time.time()
+        with self._lock:
+            stats.failures = 0
+            if not stats.healthy:
+                # Forget the latency the instance was ejected for
+                if latency is not None:
+                    stats.latency = latency
+                stats.healthy = True
+                stats.healthy_since = now
+            elif now - stats.healthy_since >= self.max_ejection_time:
+                stats.ejections = 0
+
+    def _eject(self, stats):
+        stats.healthy = False
+        stats.ejections += 1
+        stats.ejected_until = time.time() + min(
+            self.ejection_time * 2 ** (stats.ejections - 1),
+            self.max_ejection_time)
+
+    def _eject_outliers(self):
+        with self._lock:
+            stats = list(self.mesh.strategy.stats.values())
+            healthy = [node for node in stats
+                       if node.healthy and node.latency is not None]
+            if len(healthy) < 3:
+                return
+            latencies = sorted(node.latency for node in healthy)
+            median = latencies[len(latencies) // 2]
+            ejected = len(stats) - len(healthy)
+            for node in sorted(healthy, key=lambda node: -node.latency):
+                if ejected + 1 > self.max_ejected * len(stats):
+                    return
+                if (node.latency > self.outlier_factor * median and
+                        node.latency > self.outlier_min_latency):
+                    self._eject(node)
+                    ejected += 1
+
+
+class HedgingPolicy(object):
+    '''
+    Hedging of idempotent reads (SELECT, pings and read-only calls) of a
+    mesh connection with a load balancing strategy: if an instance
+    doesn't answer a read within :meth:`delay`, the read is sent to a
+    second instance and the first response is used.
+
+    The delay is the `percentile` of the latency of recent reads, bounded
+    by `min_delay` and `max_delay` (`max_delay` is used until
+    `min_samples` reads are observed). Every read earns `budget` tokens
+    and a hedge spends one, so at most about `budget` of reads are
+    hedged, with bursts of up to `burst` hedges.
+
+    Reads and hedges are sent by a pool of up to `workers` reusable
+    threads of the mesh connection; a read is sent by the calling thread
+    without a hedge when all of them are busy. At most `max_outstanding`
+    hedges are in flight at once.
+
+    Counters: `requests` (reads eligible for hedging), `fired` (hedges
+    sent), `won` (hedges answered first) and `throttled` (hedges skipped
+    by the budget or the limit of outstanding hedges).
+    '''
+
+    def __init__(self, percentile=95.0, min_delay=0.001, max_delay=1.0,
+                 budget=0.05, burst=10, window=1000, min_samples=20,
+                 workers=16, max_outstanding=4):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.workers = workers
+        self.max_outstanding = max_outstanding
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.throttled = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._observed = 0
+        self._delay = max_delay
+        self._tokens = float(burst)
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency, won=False):
+        '''
+        Account the latency of a read (until the first response) and
+        whether the hedge has answered it. The delay is recomputed every
+        `min_samples` reads.
+        '''
+        with self._lock:
+            if won:
+                self.won += 1
+            self._latencies.append(latency)
+            self._observed += 1
+            if len(self._latencies) < self.min_samples or \
+                    self._observed % self.min_samples:
+                return
+            latencies = sorted(self._latencies)
+        pos = int(round(self.percentile / 100.0 * (len(latencies) - 1)))
+        self._delay = min(max(latencies[pos], self.min_delay),
+                          self.max_delay)
+
+    def delay(self):
+        '''
+        :return: seconds to wait before a hedge
+        :rtype: float
+        '''
+        return self._delay
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+
+    def acquire(self):
+        '''
+        Take a token for a hedge.
+
+        :rtype: bool
+        '''
+        with self._lock:
+            if self._tokens < 1 or \
+                    self._outstanding >= self.max_outstanding:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            self._outstanding += 1
+            self.fired += 1
+            return True
+
+    def release(self):
+        '''
+        Account the end of a hedge taken by :meth:`acquire`.
+        '''
+        with self._lock:
+            self._outstanding -= 1
+
+    def cancel(self):
+        '''
+        Return the token of a hedge that couldn't be sent.
+        '''
+        with self._lock:
+            self._outstanding -= 1
+            self._tokens += 1
+            self.fired -= 1
+            self.throttled += 1
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'fired': self.fired,
+            'won': self.won,
+            'throttled': self.throttled,
+            'outstanding': self._outstanding,
+            'delay': self._delay
+        }
+
+
+class _Workers(object):
+    '''
+    Reusable daemon threads. A function is accepted only if a thread is
+    idle or can be started, it never waits in a queue.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self._threads = 0
+        self._idle = 0
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, func):
+        '''
+        :rtype: bool
+        '''
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif self._threads < self.size:
+                self._threads += 1
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+            else:
+                return False
+        self._tasks.put(func)
+        return True
+
+    def _run(self):
+        while True:
+            func = self._tasks.get()
+            if func is None:
+                return
+            func()
+            with self._lock:
+                self._idle += 1
+
+    def close(self):
+        with self._lock:
+            for _ in range(self._threads):
+                self._tasks.put(None)
+            self._threads = self._idle = 0
+
+
+class Discovery(object):
+    '''
+    Periodically fetches addresses of instances of the replica set and
+    updates the strategy of a mesh connection in place.
+
+    The discovery function is the name of a stored function or a
+    callable receiving the mesh connection (e.g.
+    :func:`discover_replication`), it returns a list of addresses
+    accepted by :func:`parse_uri`.
+
+    With a load balancing strategy the list is refreshed by a background
+    thread: new instances are connected before they receive requests and
+    connections to removed instances are closed. A single connection
+    isn't thread safe, so with :class:`RoundRobinStrategy` the list is
+    refreshed on the request path by :meth:`maybe_refresh`.
+    '''
+
+    def __init__(self, mesh, function, delay=CLUSTER_DISCOVERY_DELAY):
+        self.mesh = mesh
+        self.function = function
+        self.delay = delay
+        self.error = None
+        self.last_refresh = time.time()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.delay):
+            self.maybe_refresh()
+
+    def maybe_refresh(self):
+        '''
+        Refresh the list if `delay` seconds have passed since the last
+        refresh. Errors are saved to :attr:`error` and the known instances
+        are kept until the next attempt.
+        '''
+        if time.time() - self.last_refresh < self.delay:
+            return
+        # Requests of the discovery function don't trigger it again
+        self.last_refresh = time.time()
+        try:
+            self.refresh()
+            self.error = None
+        except Exception as e:
+            self.error = e
+
+    def fetch(self):
+        '''
+        :return: addresses returned by the discovery function
+        :rtype: list of dict
+        '''
+        if callable(self.function):
+            uris = self.function(self.mesh)
+        else:
+            data = self.mesh.call(self.function).data
+            uris = data[0] if data and isinstance(data[0], list) else data
+        addrs = []
+        for uri in uris or []:
+            addr = parse_uri(uri, self.mesh.host or 'localhost')
+            if addr is not None and addr_key(addr) not in \
+                    set(addr_key(known) for known in addrs):
+                addrs.append(addr)
+        return addrs
+
+    def refresh(self):
+        '''
+        Fetch addresses and update the strategy.
+
+        :return: True if the list of instances has changed
+        '''
+        addrs = self.fetch()
+        if not addrs:
+            return False
+        mesh = self.mesh
+        known = set(addr_key(addr) for addr in mesh.strategy.addrs)
+        if mesh._balancing:
+            warm = mesh._warm_nodes([addr for addr in addrs
+                                     if addr_key(addr) not in known])
+            for key, connected in warm.items():
+                if not connected:
+                    mesh._drop_node(key)
+            addrs = [addr for addr in addrs
+                     if addr_key(addr) in known or warm[addr_key(addr)]]
+        keys = set(addr_key(addr) for addr in addrs)
+        if not addrs or keys == known:
+            return False
+        mesh.strategy.update(addrs)
+        for key in known - keys:
+            mesh._drop_node(key)
+        if not mesh._balancing and (mesh.host, mesh.port) not in keys:
+            # Switch to an instance from the new list
+            addr = mesh.strategy.getnext()
+            mesh.host = addr['host']
+            mesh.port = addr['port']
+            if mesh._socket:
+                Connection.close(mesh)
+        return True
+
+
+class NodeConnection(Connection):
+    '''
+    Connection to an instance of a mesh with a load balancing strategy.
+    Requests are built and responses are decoded by the mesh connection,
+    which shares its schema with all instances.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.Lock()
+        super(NodeConnection, self).__init__(*args, **kwargs)
+
+    def load_schema(self):
+        pass
+
+    def _opt_reconnect(self):
+        '''
+        Make a single attempt to restore the connection without waiting:
+        the mesh connection sends the request to another instance instead.
+        '''
+        if self._socket and self.connected and \
+                self._check_connection() == errno.EAGAIN:
+            return
+        reconnect = self._socket is not None
+        try:
+            self.connect_basic()
+            self.handshake()
+        except NetworkError:
+            self.connected = False
+            raise
+        except Exception as e:
+            self.connected = False
+            raise NetworkError(e)
+        if reconnect and self.metrics is not None:
+            self.metrics.reconnect(self.address)
+
+    def send_raw(self, data, span=None):
+        '''
+        Send a packed request and return the packed response.
+        The caller holds :attr:`lock`.
+
+        :param span: :class:`~tarantool.tracing.Span` to mark the send,
+            wait and receive phases in
+        '''
+        self._socket.sendall(data)
+        if span is not None:
+            span.mark('send')
+        return self._read_response(span)
+
 
 class MeshConnection(Connection):
+    node_class = NodeConnection
+
     def __init__(self, addrs,
                  user=None,
                  password=None,
@@ -34,9 +867,102 @@ class MeshConnection(Connection):
                  reconnect_delay=RECONNECT_DELAY,
                  connect_now=True,
                  encoding=ENCODING_DEFAULT,
-                 strategy_class=RoundRobinStrategy):
-        self.nattempts = 2 * len(addrs) + 1
+                 strategy_class=RoundRobinStrategy,
+                 call_16=False,
+                 connection_timeout=CONNECTION_TIMEOUT,
+                 health_check_interval=None,
+                 cluster_discovery_function=None,
+                 cluster_discovery_delay=CLUSTER_DISCOVERY_DELAY,
+                 read_write_split=False,
+                 ro_functions=(),
+                 max_lag=None,
+                 read_your_writes=False,
+                 read_your_writes_timeout=1.0,
+                 connect_stagger=CONNECT_STAGGER,
+                 hedging=None,
+                 metrics=None,
+                 tracer=None,
+                 slow_log=None,
+                 hot_keys=None,
+                 capture=None):
+        '''
+        :param list addrs: A list of maps: {'host':(HOSTNAME|IP_ADDR),
+            'port':PORT} with an optional 'weight' for load balancing.
+        :param strategy_class: :class:`RoundRobinStrategy` keeps a single
+            connection and switches to the next instance when it fails;
+            subclasses of :class:`BaseStrategy` spread requests over all
+            instances.
+        :param float health_check_interval: if set, instances of a load
+            balancing strategy are pinged in the background with this
+            interval by :attr:`health_checker`
+        :param cluster_discovery_function: name of a stored function or a
+            callable returning addresses of instances, see
+            :class:`Discovery`; the list is refreshed every
+            `cluster_discovery_delay` seconds by :attr:`discovery`
+        :param bool read_write_split: with a load balancing strategy,
+            send insert, replace, update, upsert, delete, eval and calls
+            to the writable instance and select and read-only calls to
+            read-only replicas; statuses of instances are refreshed by
+            the health checker and when a write is rejected by a replica
+        :param ro_functions: names of stored functions called as
+            read-only, see also :meth:`call`
+        :param float max_lag: with `read_write_split`, replicas whose
+            replication lag exceeds `max_lag` seconds aren't read from
+        :param bool read_your_writes: with `read_write_split`, a read
+            after a write is served only by a replica whose vclock has
+            reached the vclock of the writable instance after the write
+            (it is fetched once by the first read); the read waits for
+            such a replica up to `read_your_writes_timeout` seconds and
+            is sent to the writable instance if there's none
+        :param float connect_stagger: instances are connected in
+            parallel, see :func:`race_connect`; an attempt is started
+            `connect_stagger` seconds after the previous one unless it
+            fails earlier. :class:`RoundRobinStrategy` switches to the
+            first instance to connect, load balancing strategies connect
+            all instances at once
+        :param hedging: :class:`HedgingPolicy` of reads for load
+            balancing strategies, reads aren't hedged by default
+        :param metrics: :class:`~tarantool.metrics.Metrics` to account
+            requests to all instances in
+        :param tracer: :class:`~tarantool.tracing.Tracer` timing phases
+            of sampled requests
+        :param slow_log: :class:`~tarantool.slowlog.SlowRequestLog` of
+            slow requests to all instances
+        :param hot_keys: :class:`~tarantool.hotkeys.HotKeyProfiler`
+            sampling keys of requests to all instances
+        :param capture: :class:`~tarantool.capture.Capture` recording
+            requests to all instances
+
+        :raise: `ValueError` if `health_check_interval` or
+            `read_write_split` is given with :class:`RoundRobinStrategy`
+        '''
+        self.hedging = hedging
+        self._hedge_workers = None
+        if hedging is not None:
+            self._hedge_workers = _Workers(hedging.workers)
+        self.connect_stagger = connect_stagger
         self.strategy = strategy_class(addrs)
+        self._balancing = isinstance(self.strategy, BaseStrategy)
+        if not self._balancing and (health_check_interval is not None or
+                                    read_write_split):
+            raise ValueError('health_check_interval and read_write_split '
+                             'require a load balancing strategy')
+        self._nodes = {}
+        self._nodes_lock = threading.Lock()
+        self.read_write_split = read_write_split
+        self.ro_functions = set(ro_functions)
+        self.max_lag = max_lag
+        self.read_your_writes = read_your_writes
+        self.read_your_writes_timeout = read_your_writes_timeout
+        self._written = None
+        self._written_vclock = None
+        self.health_checker = None
+        if self._balancing and health_check_interval is not None:
+            self.health_checker = HealthChecker(self, health_check_interval)
+        self.discovery = None
+        if cluster_discovery_function is not None:
+            self.discovery = Discovery(self, cluster_discovery_function,
+                                       cluster_discovery_delay)
         addr = self.strategy.getnext()
         host = addr['host']
         port = addr['port']
@@ -48,18 +974,453 @@ class MeshConnection(Connection):
                                              reconnect_max_attempts=reconnect_max_attempts,
                                              reconnect_delay=reconnect_delay,
                                              connect_now=connect_now,
-                                             encoding=encoding)
+                                             encoding=encoding,
+                                             call_16=call_16,
+                                             connection_timeout=connection_timeout,
+                                             metrics=metrics,
+                                             tracer=tracer,
+                                             slow_log=slow_log,
+                                             hot_keys=hot_keys,
+                                             capture=capture)
+        if self.health_checker is not None:
+            self.health_checker.start()
+        if self.discovery is not None and self._balancing:
+            self.discovery.start()
 
-    def _opt_reconnect(self):
-        nattempts = self.nattempts
-        while nattempts > 0:
+    def connect(self):
+        if not self._balancing:
             try:
-                super(MeshConnection, self)._opt_reconnect()
-                break
+                self._race()
+                self.load_schema()
+            except Exception as e:
+                self.connected = False
+                raise NetworkError(e)
+            return
+        try:
+            warm = self._warm_nodes(self.strategy.addrs)
+            for stats in list(self.strategy.stats.values()):
+                if not warm.get(stats.key):
+                    self._node_failed(stats)
+            if self.read_write_split:
+                self.refresh_roles()
+            self.load_schema()
+            self.connected = True
+        except Exception as e:
+            self.connected = False
+            raise NetworkError(e)
+
+    def close(self):
+        '''
+        Close connections to all instances
+        '''
+        if self.health_checker is not None:
+            self.health_checker.stop()
+        if self.discovery is not None:
+            self.discovery.stop()
+        if self._hedge_workers is not None:
+            self._hedge_workers.close()
+        if self._socket:
+            super(MeshConnection, self).close()
+        with self._nodes_lock:
+            nodes = list(self._nodes.values())
+        for node in nodes:
+            if node._socket:
+                node.close()
+
+    def _new_node(self, addr):
+        return self.node_class(
+            addr['host'], addr['port'],
+            user=self.user,
+            password=self.password,
+            socket_timeout=self.socket_timeout,
+            reconnect_max_attempts=self.reconnect_max_attempts,
+            reconnect_delay=self.reconnect_delay,
+            connect_now=False,
+            encoding=self.encoding,
+            call_16=self.call_16,
+            connection_timeout=self.connection_timeout,
+            metrics=self.metrics)
+
+    def _node(self, addr):
+        key = addr_key(addr)
+        with self._nodes_lock:
+            node = self._nodes.get(key)
+            if node is None:
+                node = self._new_node(addr)
+                self._nodes[key] = node
+        return node
+
+    def _warm_node(self, addr):
+        node = self._node(addr)
+        with node.lock:
+            try:
+                node._opt_reconnect()
+                return True
+            except NetworkError:
+                return False
+
+    def _warm_nodes(self, addrs):
+        '''
+        Connect to instances in parallel.
+
+        :return: True for connected instances by (host, port)
+        :rtype: dict
+        '''
+        result = {}
+
+        def warm(addr):
+            result[addr_key(addr)] = self._warm_node(addr)
+        threads = [threading.Thread(target=warm, args=(addr,))
+                   for addr in addrs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def _race(self, current_first=True):
+        '''
+        Connect to the instance which completes the handshake first (see
+        :func:`race_connect`) and take over its socket. The current
+        instance is tried first or, after a failure, last.
+        '''
+        addrs = [self.strategy.getnext() for _ in self.strategy.addrs]
+        current = [addr for addr in addrs
+                   if addr_key(addr) == (self.host, self.port)]
+        others = [addr for addr in addrs if addr not in current]
+        addrs = current + others if current_first else others + current
+        node = race_connect([self._new_node(addr) for addr in addrs],
+                            self.connect_stagger)
+        if self._socket:
+            Connection.close(self)
+        self._socket, node._socket = node._socket, None
+        self.host = node.host
+        self.port = node.port
+        self.version_id = node.version_id
+        self.uuid = node.uuid
+        self._salt = node._salt
+        self.connected = True
+        if not current_first and self.metrics is not None:
+            self.metrics.reconnect(self.address)
+        keys = [addr_key(addr) for addr in self.strategy.addrs]
+        self.strategy.pos = (keys.index((self.host, self.port)) + 1) % \
+            len(keys)
+
+    def _drop_node(self, key):
+        with self._nodes_lock:
+            node = self._nodes.pop(key, None)
+        if node is not None:
+            # Wait for the request in flight
+            with node.lock:
+                if node._socket:
+                    node.close()
+
+    def _execute(self, stats, request, span=None):
+        '''
+        Send the request to the instance and account its statistics and
+        phases of the span.
+
+        :raise: `NetworkError` if the instance can't be connected (nothing
+            is sent in this case); errors of an established connection
+            and `SchemaReloadException` are passed through
+        '''
+        node = self._node(stats.addr)
+        stats.begin()
+        started = latency = None
+        error = True
+        packet = data = b''
+        try:
+            with node.lock:
+                node._opt_reconnect()
+                if span is not None:
+                    span.skip()
+                    span.node = node.address
+                started = perf_counter()
+                packet = bytes(request)
+                if span is not None:
+                    span.mark('encode')
+                    span.request_bytes = len(packet)
+                data = node.send_raw(packet, span)
+                latency = perf_counter() - started
+            error = False
+            try:
+                response = Response(self, data)
+            finally:
+                if span is not None:
+                    span.mark('decode')
+                    span.response_bytes = len(data) + 5
+        except SchemaReloadException:
+            if self.metrics is not None:
+                self.metrics.schema_reload(node.address)
+            raise
+        except DatabaseError as e:
+            if started is not None:
+                self._account(request, node.address,
+                              perf_counter() - started, packet,
+                              len(data) + 5 if data else 0, e)
+            raise
+        finally:
+            stats.end(latency, error)
+        self._account(request, node.address, perf_counter() - started,
+                      packet, len(data) + 5)
+        return response
+
+    def _request_mode(self, request):
+        if not self.read_write_split:
+            return None
+        mode = getattr(request, 'mode', None)
+        if mode is not None:
+            return mode
+        if request.request_type in (REQUEST_TYPE_SELECT, REQUEST_TYPE_PING):
+            return 'ro'
+        return 'rw'
+
+    def _read_candidates(self, tried):
+        '''
+        Read-only replicas fresh enough to serve a read or writable
+        instances if there are none.
+        '''
+        candidates = [stats for stats in self.strategy.candidates('ro')
+                      if stats.key not in tried]
+        if self.max_lag is not None:
+            candidates = [stats for stats in candidates if
+                          stats.lag is None or stats.lag <= self.max_lag]
+        if self.read_your_writes:
+            if self._written is not None:
+                self._ping_node(self._written)
+                self._written_vclock = self._written.vclock
+                self._written = None
+            if self._written_vclock:
+                candidates = self._wait_vclock(candidates,
+                                               self._written_vclock)
+        if candidates:
+            return candidates
+        return [stats for stats in self.strategy.candidates('rw')
+                if stats.key not in tried]
+
+    def _wait_vclock(self, candidates, vclock):
+        deadline = time.time() + self.read_your_writes_timeout
+        while True:
+            ready = [stats for stats in candidates
+                     if vclock_ge(stats.vclock, vclock)]
+            if ready or not candidates or time.time() >= deadline:
+                return ready
+            time.sleep(min(0.01, max(deadline - time.time(), 0)))
+            for stats in candidates:
+                self._ping_node(stats)
+
+    def _idempotent(self, request):
+        return request.request_type in (REQUEST_TYPE_SELECT,
+                                        REQUEST_TYPE_PING) or \
+            getattr(request, 'mode', None) == 'ro'
+
+    def _execute_hedged(self, stats, candidates, request, span=None):
+        '''
+        Send the read to the instance and, if it doesn't answer within
+        the hedging delay, to another candidate as well. Both are sent by
+        the reusable workers; the read is sent by the calling thread
+        without a hedge if none is free. The span times the request to
+        the instance.
+
+        :return: the first successful response
+        :raise: the error of the instance if no instance succeeds
+        '''
+        policy = self.hedging
+        policy.begin()
+        results = queue.Queue()
+
+        def execute(target):
+            try:
+                results.put((target, self._execute(
+                    target, request, span if target is stats else None),
+                    None))
+            except Exception as e:
+                results.put((target, None, e))
+
+        def hedge(target):
+            try:
+                execute(target)
+            finally:
+                policy.release()
+        started = time.time()
+        if not self._hedge_workers.submit(lambda: execute(stats)):
+            return self._execute(stats, request, span)
+        hedged = False
+        try:
+            result = results.get(timeout=policy.delay())
+        except queue.Empty:
+            others = [other for other in candidates if other is not stats]
+            if others and policy.acquire():
+                target = self.strategy.choose(others)
+                hedged = self._hedge_workers.submit(lambda: hedge(target))
+                if not hedged:
+                    policy.cancel()
+            result = results.get()
+        if result[2] is not None and hedged:
+            # Wait for the other one, the error of the instance wins
+            other = results.get()
+            if other[2] is None or result[0] is not stats:
+                result, other = other, result
+        winner, response, error = result
+        if error is not None:
+            raise error
+        policy.observe(time.time() - started, winner is not stats)
+        return response
+
+    def _send_request(self, request):
+        if not self._balancing:
+            return super(MeshConnection, self)._send_request(request)
+        if self.hot_keys is not None:
+            self.hot_keys.observe(request)
+        span = request.span
+        if span is None:
+            return self._route_request(request, None)
+        span.mark('encode')
+        error = None
+        try:
+            return self._route_request(request, span)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.finish(span, request, span.node, error)
+
+    def _route_request(self, request, span):
+        '''
+        Choose an instance for the request and send it, retrying on
+        other instances if nothing has been sent.
+        '''
+        mode = self._request_mode(request)
+        tried = set()
+        rejected = False
+        while True:
+            if mode == 'ro':
+                candidates = self._read_candidates(tried)
+            else:
+                candidates = [stats for stats in
+                              self.strategy.candidates(mode)
+                              if stats.key not in tried]
+            if not candidates:
+                raise NetworkError(socket.error(
+                    errno.ECONNREFUSED, 'No instance of the mesh is available'))
+            stats = self.strategy.choose(candidates)
+            try:
+                if self.hedging is not None and self._idempotent(request):
+                    response = self._execute_hedged(stats, candidates,
+                                                    request, span)
+                else:
+                    response = self._execute(stats, request, span)
+                if mode == 'rw' and self.read_your_writes:
+                    self._written = stats
+                return response
+            except SchemaReloadException as e:
+                self.update_schema(e.schema_version)
             except NetworkError:
-                nattempts -= 1
-                addr = self.strategy.getnext()
-                self.host = addr['host']
-                self.port = addr['port']
+                node = self._node(stats.addr)
+                if node.connected:
+                    # The request may have reached the instance
+                    raise
+                self._node_failed(stats)
+                tried.add(stats.key)
+            except DatabaseError as e:
+                if mode != 'rw' or e.args[0] != ER_READONLY or rejected:
+                    raise
+                # The leader has changed, the write wasn't applied
+                rejected = True
+                stats.ro = True
+                self.refresh_roles()
+
+    def _node_failed(self, stats):
+        '''
+        Account a failed attempt to connect to the instance on the request
+        path. The health checker ejects the instance at once and pings it
+        in the background. Without a health checker the instance is
+        skipped for `reconnect_delay` seconds doubled with every failure
+        in a row.
+        '''
+        if self.health_checker is not None:
+            self.health_checker.eject(stats)
         else:
-            raise NetworkError
+            stats.failure(self.reconnect_delay)
+
+    def _ping_node(self, stats):
+        '''
+        Ping the instance or, with `read_write_split`, fetch its
+        read-only status, replication lag and vclock.
+
+        :return: latency in seconds or None if the instance is unreachable
+        '''
+        try:
+            started = time.time()
+            if self.read_write_split:
+                response = self._execute(stats,
+                                         RequestEval(self, STATUS_EXPR, []))
+                data = list(response.data) + [None] * 3
+                stats.ro = bool(data[0])
+                stats.lag = data[1]
+                stats.vclock = decode_vclock(data[2])
+            else:
+                self._execute(stats, RequestPing(self))
+            return time.time() - started
+        except NetworkError:
+            return None
+
+    def refresh_roles(self):
+        '''
+        Fetch read-only statuses of all instances.
+        '''
+        for stats in list(self.strategy.stats.values()):
+            self._ping_node(stats)
+
+    def call(self, func_name, *args, **kwargs):
+        '''
+        Execute CALL request. Call stored Lua function.
+
+        :param func_name: stored Lua function name
+        :type func_name: str
+        :param args: list of function arguments
+        :type args: list or tuple
+        :param str mode: 'ro' to send the call to a read-only replica
+            with `read_write_split`; functions of `ro_functions` are
+            always called as read-only
+
+        :rtype: `Response` instance
+        '''
+        assert isinstance(func_name, str)
+
+        # This allows to use a tuple or list as an argument
+        if len(args) == 1 and isinstance(args[0], (list, tuple)):
+            args = args[0]
+
+        request = RequestCall(self, func_name, args, self.call_16)
+        if kwargs.get('mode') == 'ro' or func_name in self.ro_functions:
+            request.mode = 'ro'
+        return self._send_request(request)
+
+    def ping_nodes(self):
+        '''
+        Ping every instance and update its latency statistics.
+
+        :return: latency in seconds by (host, port), None for instances
+            which can't be reached
+        :rtype: dict
+        '''
+        return dict((stats.key, self._ping_node(stats))
+                    for stats in list(self.strategy.stats.values()))
+
+    def node_stats(self):
+        '''
+        Load statistics of instances.
+
+        :rtype: list of dict
+        '''
+        return [stats.to_dict() for stats in self.strategy.stats.values()]
+
+    def _opt_reconnect(self):
+        if self.discovery is not None:
+            self.discovery.maybe_refresh()
+        if not self._socket:
+            return self.connect()
+        if self.connected and self._check_connection() == errno.EAGAIN:
+            return
+        self._race(current_first=False)
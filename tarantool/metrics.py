@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.metrics.Metrics` class collecting
+client-side metrics of connections: latency histograms, byte counts and
+errors of requests by request type, space and instance, reconnects and
+schema reloads. They are exported as a dict or in Prometheus text format.
+'''
+
+import threading
+
+from tarantool.const import (
+    REQUEST_TYPE_SELECT,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_CALL16,
+    REQUEST_TYPE_AUTHENTICATE,
+    REQUEST_TYPE_EVAL,
+    REQUEST_TYPE_UPSERT,
+    REQUEST_TYPE_CALL,
+    REQUEST_TYPE_PING,
+    REQUEST_TYPE_JOIN,
+    REQUEST_TYPE_SUBSCRIBE
+)
+from tarantool.error import (
+    DatabaseError,
+    tnt_strerror
+)
+
+REQUEST_NAMES = {
+    REQUEST_TYPE_SELECT: 'select',
+    REQUEST_TYPE_INSERT: 'insert',
+    REQUEST_TYPE_REPLACE: 'replace',
+    REQUEST_TYPE_UPDATE: 'update',
+    REQUEST_TYPE_DELETE: 'delete',
+    REQUEST_TYPE_CALL16: 'call_16',
+    REQUEST_TYPE_AUTHENTICATE: 'auth',
+    REQUEST_TYPE_EVAL: 'eval',
+    REQUEST_TYPE_UPSERT: 'upsert',
+    REQUEST_TYPE_CALL: 'call',
+    REQUEST_TYPE_PING: 'ping',
+    REQUEST_TYPE_JOIN: 'join',
+    REQUEST_TYPE_SUBSCRIBE: 'subscribe'
+}
+
+# Upper bounds of Prometheus histogram buckets (seconds)
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                      0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def error_name(error):
+    '''
+    :return: name of the Tarantool error code of a `DatabaseError`
+        (e.g. 'ER_TUPLE_FOUND') or the name of the exception class
+    '''
+    if type(error) is DatabaseError and error.args:
+        name = tnt_strerror(error.args[0])
+        if isinstance(name, tuple):
+            return name[0]
+        return 'ER_%s' % error.args[0]
+    return type(error).__name__
+
+
+class Histogram(object):
+    '''
+    Log-linear histogram of durations in the spirit of HdrHistogram.
+
+    Durations are rounded to microseconds. Below 2 ** (precision + 1)
+    microseconds every value has its own bucket, above that each power of
+    two is split into 2 ** precision buckets, so a percentile is off by
+    at most 1 / 2 ** precision of its value (12.5% by default).
+    Recording a value is a few integer operations and a dict update.
+    '''
+
+    def __init__(self, precision=3):
+        self.precision = precision
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _bucket(self, usec):
+        shift = usec.bit_length() - self.precision - 1
+        if shift <= 0:
+            return usec
+        return (shift << self.precision) + (usec >> shift)
+
+    def _bounds(self, bucket):
+        '''
+        :return: lowest and highest microseconds counted in the bucket
+        '''
+        shift = (bucket >> self.precision) - 1
+        if shift <= 0:
+            return bucket, bucket
+        lower = (bucket - (shift << self.precision)) << shift
+        return lower, lower + (1 << shift) - 1
+
+    def record(self, value):
+        '''
+        :param float value: duration in seconds
+        '''
+        bucket = self._bucket(int(value * 1000000 + 0.5))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        '''
+        Add durations recorded by another histogram of the same precision.
+        '''
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        '''
+        :return: the highest duration (seconds) of the bucket holding the
+            percentile, not exceeding the maximum recorded value
+        '''
+        if not self.count:
+            return 0.0
+        rank = max(percent / 100.0 * self.count, 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                break
+        return min(self._bounds(bucket)[1] / 1000000.0, self.max)
+
+    def cumulative(self, bounds=PROMETHEUS_BUCKETS):
+        '''
+        :return: numbers of durations not exceeding each of the bounds
+            (seconds); a bucket counts towards a bound if its highest
+            duration doesn't exceed it
+        :rtype: list
+        '''
+        result = [0] * len(bounds)
+        for bucket, count in self.counts.items():
+            highest = self._bounds(bucket)[1] / 1000000.0
+            for pos, bound in enumerate(bounds):
+                if highest <= bound:
+                    result[pos] += count
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9)
+        }
+
+
+class RequestMetrics(object):
+    '''
+    Metrics of requests of a type to a space of an instance.
+    '''
+
+    def __init__(self, precision):
+        self.latency = Histogram(precision)
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Metrics(object):
+    '''
+    Client metrics shared by connections, pass it as `metrics` to
+    :class:`~tarantool.connection.Connection` or
+    :class:`~tarantool.mesh_connection.MeshConnection`::
+
+        metrics = Metrics()
+        con = tarantool.Connection(host, port, metrics=metrics)
+        ...
+        print(metrics.prometheus())
+
+    The latency of a request is measured from sending the request until
+    the response is decoded, retries after a schema reload are accounted
+    as separate requests.
+    '''
+
+    def __init__(self, precision=3):
+        self.precision = precision
+        self._requests = {}
+        self._errors = {}
+        self._reconnects = {}
+        self._schema_reloads = {}
+        self._lock = threading.Lock()
+
+    def observe(self, request, node, latency, sent, received, error=None):
+        '''
+        Account a request.
+
+        :param request: `Request` instance
+        :param str node: address of the instance
+        :param float latency: seconds
+        :param int sent: size of the request in bytes
+        :param int received: size of the response in bytes
+        :param error: exception raised by the request, if any
+        '''
+        key = (request.request_type, request.space_no, node)
+        with self._lock:
+            metrics = self._requests.get(key)
+            if metrics is None:
+                metrics = self._requests[key] = RequestMetrics(
+                    self.precision)
+            metrics.latency.record(latency)
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+            if error is not None:
+                metrics.errors += 1
+                key += (error_name(error),)
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def reconnect(self, node):
+        with self._lock:
+            self._reconnects[node] = self._reconnects.get(node, 0) + 1
+
+    def schema_reload(self, node):
+        with self._lock:
+            self._schema_reloads[node] = \
+                self._schema_reloads.get(node, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._errors = {}
+            self._reconnects = {}
+            self._schema_reloads = {}
+
+    def snapshot(self):
+        '''
+        :return: {'requests': [...], 'errors': [...], 'reconnects': {node:
+            count}, 'schema_reloads': {node: count}}; requests and errors
+            are dicts with 'op', 'space' and 'node' keys
+        :rtype: dict
+        '''
+        with self._lock:
+            requests = []
+            for (code, space, node), metrics in sorted(
+                    self._requests.items(), key=lambda item: str(item[0])):
+                requests.append({
+                    'op': _request_name(code), 'space': space, 'node': node,
+                    'count': metrics.latency.count,
+                    'errors': metrics.errors,
+                    'bytes_sent': metrics.bytes_sent,
+                    'bytes_received': metrics.bytes_received,
+                    'latency': metrics.latency.to_dict()
+                })
+            errors = [{'op': _request_name(code), 'space': space,
+                       'node': node, 'error': error, 'count': count}
+                      for (code, space, node, error), count in sorted(
+                          self._errors.items(), key=lambda item: str(item[0]))]
+            return {
+                'requests': requests,
+                'errors': errors,
+                'reconnects': dict(self._reconnects),
+                'schema_reloads': dict(self._schema_reloads)
+            }
+
+    def prometheus(self, prefix='tarantool_client'):
+        '''
+        :return: metrics in Prometheus text exposition format
+        :rtype: str
+        '''
+        snapshot = self.snapshot()
+        with self._lock:
+            histograms = [(key, metrics.latency) for key, metrics
+                          in self._requests.items()]
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        def sample(name, labels, value):
+            lines.append('%s_%s{%s} %s' % (prefix, name, ','.join(
+                '%s="%s"' % (label, _escape(value))
+                for label, value in labels), _number(value)))
+
+        def request_labels(item):
+            return [('op', item['op']),
+                    ('space', '' if item['space'] is None
+                     else item['space']),
+                    ('node', item['node'])]
+
+        header('request_duration_seconds', 'histogram',
+               'Latency of requests')
+        for (code, space, node), histogram in sorted(
+                histograms, key=lambda item: str(item[0])):
+            labels = request_labels({'op': _request_name(code),
+                                     'space': space, 'node': node})
+            for bound, count in zip(PROMETHEUS_BUCKETS,
+                                    histogram.cumulative()):
+                sample('request_duration_seconds_bucket',
+                       labels + [('le', bound)], count)
+            sample('request_duration_seconds_bucket',
+                   labels + [('le', '+Inf')], histogram.count)
+            sample('request_duration_seconds_sum', labels, histogram.total)
+            sample('request_duration_seconds_count', labels,
+                   histogram.count)
+        for name, field, text in (
+                ('request_sent_bytes_total', 'bytes_sent',
+                 'Size of requests'),
+                ('response_received_bytes_total', 'bytes_received',
+                 'Size of responses')):
+            header(name, 'counter', text)
+            for item in snapshot['requests']:
+                sample(name, request_labels(item), item[field])
+        header('errors_total', 'counter', 'Failed requests by error')
+        for item in snapshot['errors']:
+            sample('errors_total', request_labels(item) +
+                   [('error', item['error'])], item['count'])
+        for name, field, text in (
+                ('reconnects_total', 'reconnects', 'Reconnects'),
+                ('schema_reloads_total', 'schema_reloads',
+                 'Schema reloads caused by requests')):
+            header(name, 'counter', text)
+            for node, count in sorted(snapshot[field].items()):
+                sample(name, [('node', node)], count)
+        return '\n'.join(lines) + '\n'
+
+
+def _request_name(code):
+    return REQUEST_NAMES.get(code, str(code))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.mirror.Mirror` class.
+It is an in-process read replica of selected spaces, bootstrapped with
+JOIN and kept up to date with SUBSCRIBE.
+'''
+
+import bisect
+import threading
+import time
+
+from tarantool.const import (
+    IPROTO_VCLOCK,
+    REQUEST_TYPE_OK,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPSERT,
+    ITERATOR_EQ,
+    ITERATOR_REQ,
+    ITERATOR_ALL,
+    ITERATOR_LT,
+    ITERATOR_LE,
+    ITERATOR_GE,
+    ITERATOR_GT
+)
+from tarantool.error import (
+    InterfaceError,
+    NetworkError,
+    SchemaError
+)
+from tarantool.replication import (
+    Row,
+    apply_ops,
+    fetch_vclock
+)
+from tarantool.utils import (
+    check_key,
+    string_types
+)
+
+
+class MirrorIndex(object):
+    '''
+    Sorted index over the tuples of a mirrored space.
+    Entries are pairs (key, primary key) kept in a sorted list.
+    '''
+
+    def __init__(self, schema_index):
+        self.iid = schema_index.iid
+        self.name = schema_index.name
+        self.parts = [part[0] for part in schema_index.parts]
+        self.entries = []
+
+    def key(self, tpl):
+        return tuple(tpl[part] for part in self.parts)
+
+    def insert(self, tpl, pk):
+        bisect.insort(self.entries, (self.key(tpl), pk))
+
+    def delete(self, tpl, pk):
+        entry = (self.key(tpl), pk)
+        pos = bisect.bisect_left(self.entries, entry)
+        if pos < len(self.entries) and self.entries[pos] == entry:
+            del self.entries[pos]
+
+    def _prefix_end(self, key):
+        # First position after the entries whose key starts with `key`
+        pos = bisect.bisect_left(self.entries, (key,))
+        while (pos < len(self.entries) and
+               self.entries[pos][0][:len(key)] == key):
+            pos += 1
+        return pos
+
+    def iterate(self, key, iterator):
+        '''
+        Yield primary keys of tuples matching `key` in `iterator` order.
+        '''
+        entries = self.entries
+        if iterator == ITERATOR_ALL or (not key and iterator in (
+                ITERATOR_EQ, ITERATOR_GE, ITERATOR_GT)):
+            positions = range(len(entries))
+        elif not key and iterator in (ITERATOR_REQ, ITERATOR_LE,
+                                      ITERATOR_LT):
+            positions = range(len(entries) - 1, -1, -1)
+        elif iterator == ITERATOR_EQ:
+            positions = range(bisect.bisect_left(entries, (key,)),
+                              self._prefix_end(key))
+        elif iterator == ITERATOR_REQ:
+            positions = range(self._prefix_end(key) - 1,
+                              bisect.bisect_left(entries, (key,)) - 1, -1)
+        elif iterator == ITERATOR_GE:
+            positions = range(bisect.bisect_left(entries, (key,)),
+                              len(entries))
+        elif iterator == ITERATOR_GT:
+            positions = range(self._prefix_end(key), len(entries))
+        elif iterator == ITERATOR_LE:
+            positions = range(self._prefix_end(key) - 1, -1, -1)
+        elif iterator == ITERATOR_LT:
+            positions = range(bisect.bisect_left(entries, (key,)) - 1,
+                              -1, -1)
+        else:
+            raise InterfaceError("Iterator %r isn't supported by the mirror"
+                                 % (iterator,))
+        for pos in positions:
+            yield entries[pos][1]
+
+
+class MirrorSpace(object):
+    '''
+    Tuples of a mirrored space hashed by the primary key.
+    '''
+
+    def __init__(self, schema_space, indexes=()):
+        self.sid = schema_space.sid
+        self.name = schema_space.name
+        self.parts = [part[0] for part in schema_space.indexes[0].parts]
+        self.primary_name = schema_space.indexes[0].name
+        self.index_parts = dict(
+            (iid, [part[0] for part in index.parts])
+            for iid, index in schema_space.indexes.items()
+            if not isinstance(iid, string_types))
+        self.tuples = {}
+        self.indexes = {}
+        for index in indexes:
+            mirror_index = MirrorIndex(schema_space.indexes[index])
+            self.indexes[mirror_index.iid] = mirror_index
+            if mirror_index.name:
+                self.indexes[mirror_index.name] = mirror_index
+
+    def primary_key(self, tpl):
+        return tuple(tpl[part] for part in self.parts)
+
+    def sorted_indexes(self):
+        return [index for name, index in self.indexes.items()
+                if not isinstance(name, string_types)]
+
+    def replace(self, tpl):
+        pk = self.primary_key(tpl)
+        self.delete(pk)
+        self.tuples[pk] = tpl
+        for index in self.sorted_indexes():
+            index.insert(tpl, pk)
+
+    def delete(self, pk):
+        old = self.tuples.pop(pk, None)
+        if old is not None:
+            for index in self.sorted_indexes():
+                index.delete(old, pk)
+        return old
+
+    def apply(self, row):
+        if row.code in (REQUEST_TYPE_INSERT, REQUEST_TYPE_REPLACE):
+            self.replace(row.tuple)
+            return
+        if row.code == REQUEST_TYPE_UPSERT:
+            old = self.tuples.get(self.primary_key(row.tuple))
+            if old is None:
+                self.replace(row.tuple)
+                return
+            try:
+                self.replace(apply_ops(old, row.ops, row.index_base))
+            except (IndexError, TypeError, ValueError):
+                # The server skips UPSERT operations that can't be applied
+                pass
+            return
+        key = tuple(row.key)
+        if row.index_no == 0:
+            pk = key
+        elif row.index_no in self.indexes:
+            pk = next(self.indexes[row.index_no].iterate(key, ITERATOR_EQ),
+                      None)
+        else:
+            # The index isn't mirrored, look the tuple up by a full scan
+            parts = self.index_parts[row.index_no]
+            pk = next((pk for pk, tpl in self.tuples.items()
+                       if tuple(tpl[part] for part in parts) == key), None)
+        if pk is None:
+            return
+        if row.code == REQUEST_TYPE_DELETE:
+            self.delete(pk)
+        elif row.code == REQUEST_TYPE_UPDATE and pk in self.tuples:
+            self.replace(apply_ops(self.tuples[pk], row.ops, row.index_base))
+
+
+class Mirror(object):
+    '''
+    In-process read replica of a set of spaces.
+
+    :meth:`start` copies the spaces with JOIN and then follows SUBSCRIBE
+    in a background thread, so :meth:`select` is served from memory.
+
+    The connection is taken over by the replication streams, so it must
+    be dedicated to the mirror. Its user must have the 'replication' role
+    and `server_uuid` is registered in the cluster by JOIN.
+    '''
+
+    def __init__(self, conn, server_uuid, spaces, indexes=None):
+        '''
+        :param conn: connection dedicated to the replication streams
+        :type conn: :class:`~tarantool.connection.Connection`
+        :param str server_uuid: UUID the mirror joins the cluster with
+        :param spaces: space numbers or names to mirror
+        :type spaces: list
+        :param indexes: secondary indexes to build for each space,
+            e.g. {'users': ['email']}; the primary index is a hash
+            unless it is listed here too
+        :type indexes: dict
+        '''
+        self.conn = conn
+        self.server_uuid = server_uuid
+        self.cluster_uuid = None
+        self.vclock = {}
+        self.timestamp = None
+        self.error = None
+        self._space_names = spaces
+        self._index_names = indexes or {}
+        self._spaces = {}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        '''
+        :type: bool
+
+        True while the mirror follows the SUBSCRIBE stream.
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def lag(self, conn):
+        '''
+        Return the number of rows the mirror is behind the server,
+        comparing the mirror vclock with `box.info.vclock` of the server.
+
+        :param conn: connection to the server the mirror follows; the
+            mirror's own connection is taken over by SUBSCRIBE
+        :type conn: :class:`~tarantool.connection.Connection`
+
+        :rtype: int
+        '''
+        server_vclock = fetch_vclock(conn)
+        with self._lock:
+            return sum(max(lsn - self.vclock.get(server_id, 0), 0)
+                       for server_id, lsn in server_vclock.items())
+
+    @property
+    def timestamp_lag(self):
+        '''
+        :type: float
+
+        Seconds since the creation of the last row received from the
+        server, or None if no row has been received yet. It depends on
+        clocks of the hosts being in sync.
+        '''
+        if self.timestamp is None:
+            return None
+        return max(time.time() - self.timestamp, 0.0)
+
+    def start(self):
+        '''
+        Copy the spaces with JOIN and start following SUBSCRIBE.
+        Blocks until the initial copy is complete.
+        '''
+        schema = self.conn.schema
+        for space_name in self._space_names:
+            schema_space = schema.get_space(space_name)
+            indexes = [schema.get_index(schema_space.sid, index).iid
+                       for index in self._index_names.get(space_name, ())]
+            space = MirrorSpace(schema_space, indexes)
+            self._spaces[space.sid] = space
+            if space.name:
+                self._spaces[space.name] = space
+        self.cluster_uuid = self.conn.eval('return box.info.cluster.uuid')[0]
+
+        for response in self.conn.join(self.server_uuid):
+            if response.code == REQUEST_TYPE_OK:
+                vclock = response.body.get(IPROTO_VCLOCK)
+                if vclock:
+                    self.vclock.update(vclock)
+                continue
+            self.apply(Row.from_response(response))
+
+        # SUBSCRIBE has to be sent over a fresh connection
+        self.conn.connect()
+        self.error = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop following the SUBSCRIBE stream. Mirrored data is kept but
+        isn't updated anymore.
+        '''
+        self._stopping = True
+        self.conn.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.conn.close()
+
+    def _run(self):
+        stream = self.conn.subscribe(self.cluster_uuid, self.server_uuid,
+                                     dict(self.vclock))
+        try:
+            for response in stream:
+                self.apply(Row.from_response(response))
+        except NetworkError as e:
+            if not self._stopping:
+                self.error = e
+        except Exception as e:
+            # A row that can't be applied leaves the mirror inconsistent
+            self.error = e
+
+    def apply(self, row):
+        '''
+        Apply a row of the replication stream to the mirrored spaces.
+
+        :param row: decoded row
+        :type row: :class:`~tarantool.replication.Row`
+        '''
+        with self._lock:
+            if row.timestamp is not None:
+                self.timestamp = row.timestamp
+            if row.lsn is not None and row.server_id is not None:
+                self.vclock[row.server_id] = row.lsn
+            space = self._spaces.get(row.space_no)
+            if space is not None and row.is_dml:
+                space.apply(row)
+
+    def space(self, space_name):
+        '''
+        :rtype: :class:`~tarantool.mirror.MirrorSpace`
+        '''
+        try:
+            return self._spaces[space_name]
+        except KeyError:
+            temp_name = 'name' if isinstance(space_name, string_types) else 'id'
+            raise SchemaError("There's no mirrored space with {1} '{0}'".format(
+                space_name, temp_name))
+
+    def select(self, space_name, key=None, **kwargs):
+        '''
+        Select tuples from the mirror. Accepts the same arguments as
+        :meth:`~tarantool.connection.Connection.select`. The tuples are
+        copies of the mirrored ones.
+
+        The primary index only supports lookups by the full key and
+        full scans unless it is listed among the sorted `indexes`.
+
+        :rtype: list of tuples
+
+        :raise: `InterfaceError` if the mirror doesn't follow the
+            replication stream, so its data may be stale
+        '''
+        if not self.running:
+            raise InterfaceError("The mirror doesn't follow the replication "
+                                 "stream: %r" % (self.error,))
+
+        offset = kwargs.get("offset", 0)
+        limit = kwargs.get("limit", 0xffffffff)
+        index_name = kwargs.get("index", 0)
+        iterator_type = kwargs.get("iterator")
+
+        if iterator_type is None:
+            iterator_type = ITERATOR_EQ
+            if key is None or (isinstance(key, (list, tuple)) and
+                               len(key) == 0):
+                iterator_type = ITERATOR_ALL
+        key = tuple(check_key(key, select=True))
+
+        with self._lock:
+            space = self.space(space_name)
+            if index_name in space.indexes:
+                index = space.indexes[index_name]
+                tuples = (space.tuples[pk]
+                          for pk in index.iterate(key, iterator_type))
+            elif index_name not in (0, space.primary_name):
+                raise SchemaError("Index '{0}' isn't mirrored in space '{1}'"
+                                  .format(index_name, space.name))
+            elif iterator_type == ITERATOR_ALL or not key:
+                tuples = iter(space.tuples.values())
+            elif (iterator_type == ITERATOR_EQ and
+                  len(key) == len(space.parts)):
+                tpl = space.tuples.get(key)
+                tuples = iter([tpl] if tpl is not None else [])
+            else:
+                raise InterfaceError("Hash primary index of the mirror "
+                                     "supports only full key lookups")
+            result = []
+            for tpl in tuples:
+                if len(result) >= limit:
+                    break
+                if offset > 0:
+                    offset -= 1
+                    continue
+                # Callers mustn't be able to change the stored tuples
+                # and the order of the indexes
+                result.append(list(tpl))
+            return result
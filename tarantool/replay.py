@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+Replay of requests recorded by :class:`~tarantool.capture.Capture`
+against a Tarantool instance, reporting the throughput and latency
+percentiles::
+
+    python -m tarantool.replay traffic.cap --host staging --port 3301 \\
+        --connections 8 --speed 2
+
+Requests are sent at the pace they were captured (`--speed` scales it,
+`--max-speed` sends them as fast as the connections allow) by
+`--connections` connections, each having at most one request in flight.
+'''
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import msgpack
+
+from tarantool.capture import read_capture
+from tarantool.const import (
+    IPROTO_SCHEMA_ID,
+    SOCKET_TIMEOUT
+)
+from tarantool.error import DatabaseError
+from tarantool.mesh_connection import NodeConnection
+from tarantool.metrics import Histogram
+from tarantool.response import Response
+from tarantool.utils import perf_counter
+
+
+def strip_schema_id(packet):
+    '''
+    Remove the schema version from the header of a packed request, so
+    the target doesn't reject it if its schema version differs.
+    '''
+    kwargs = {'use_list': True}
+    if msgpack.version >= (1, 0, 0):
+        kwargs['strict_map_key'] = False
+    unpacker = msgpack.Unpacker(**kwargs)
+    unpacker.feed(packet)
+    length = unpacker.unpack()
+    header = unpacker.unpack()
+    body = packet[len(msgpack.dumps(length)) + len(msgpack.dumps(header)):]
+    header.pop(IPROTO_SCHEMA_ID, None)
+    header = msgpack.dumps(header)
+    return msgpack.dumps(len(header) + len(body)) + header + body
+
+
+class Replayer(object):
+    '''
+    Sends captured requests through a number of connections.
+    '''
+
+    def __init__(self, records, connect, connections=1, speed=1.0):
+        '''
+        :param records: :class:`~tarantool.capture.CapturedRequest`
+            instances
+        :param connect: callable returning a connected
+            :class:`~tarantool.mesh_connection.NodeConnection`
+        :param float speed: pace relative to the capture, None to send
+            requests as fast as possible
+        '''
+        self.records = sorted(records, key=lambda record: record.offset)
+        self.packets = [strip_schema_id(record.packet)
+                        for record in self.records]
+        self.connect = connect
+        self.connections = connections
+        self.speed = speed
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        with self._lock:
+            pos = self._next
+            if pos >= len(self.packets):
+                return None
+            self._next += 1
+            return pos
+
+    def _run(self, conn, started, stats):
+        first = self.records[0].offset if self.records else 0.0
+        while True:
+            pos = self._take()
+            if pos is None:
+                return
+            if self.speed:
+                due = started + (self.records[pos].offset - first) / \
+                    self.speed
+                wait = due - perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    stats['max_lag'] = max(stats['max_lag'], -wait)
+            sent = perf_counter()
+            try:
+                conn._opt_reconnect()
+                data = conn.send_raw(self.packets[pos])
+                latency = perf_counter() - sent
+                Response(conn, data)
+            except DatabaseError:
+                stats['errors'] += 1
+                continue
+            stats['latency'].record(latency)
+
+    def run(self):
+        '''
+        :return: report with 'requests', 'errors', 'duration' (seconds),
+            'throughput' (requests per second), 'max_lag' (how late a
+            request was sent, seconds), 'latency' and 'captured_latency'
+            (see :meth:`~tarantool.metrics.Histogram.to_dict`)
+        :rtype: dict
+        '''
+        self._next = 0
+        conns = [self.connect() for _ in range(self.connections)]
+        stats = [{'errors': 0, 'max_lag': 0.0,
+                  'latency': Histogram()} for _ in conns]
+        started = perf_counter()
+        threads = [threading.Thread(target=self._run,
+                                    args=(conn, started, item))
+                   for conn, item in zip(conns, stats)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = perf_counter() - started
+        for conn in conns:
+            conn.close()
+        latency = Histogram()
+        for item in stats:
+            latency.merge(item['latency'])
+        captured = Histogram()
+        for record in self.records:
+            captured.record(record.latency)
+        return {
+            'requests': len(self.records),
+            'errors': sum(item['errors'] for item in stats),
+            'connections': self.connections,
+            'duration': duration,
+            'throughput': len(self.records) / duration if duration else 0.0,
+            'max_lag': max([item['max_lag'] for item in stats] or [0.0]),
+            'latency': latency.to_dict(),
+            'captured_latency': captured.to_dict()
+        }
+
+
+def format_report(report):
+    def percentiles(latency):
+        return ' '.join('%s=%.3f' % (name, latency[name] * 1000)
+                        for name in ('p50', 'p90', 'p99', 'p999', 'max'))
+
+    return '\n'.join([
+        'Replayed %d requests (%d errors) in %.3f s over %d connections: '
+        '%.1f requests/s' % (report['requests'], report['errors'],
+                             report['duration'], report['connections'],
+                             report['throughput']),
+        'latency, ms:  %s' % percentiles(report['latency']),
+        'captured, ms: %s' % percentiles(report['captured_latency']),
+        'max lag: %.3f s' % report['max_lag']
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay captured Tarantool requests')
+    parser.add_argument('capture', help='capture file')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default=3301,
+                        help='port or path of a unix socket')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--connections', type=int, default=1)
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='pace relative to the capture')
+    parser.add_argument('--max-speed', action='store_true',
+                        help="don't wait between requests")
+    parser.add_argument('--timeout', type=float, default=SOCKET_TIMEOUT)
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    def connect():
+        return NodeConnection(args.host, args.port, user=args.user,
+                              password=args.password,
+                              socket_timeout=args.timeout)
+
+    replayer = Replayer(read_capture(args.capture), connect,
+                        args.connections,
+                        None if args.max_speed else args.speed)
+    report = replayer.run()
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.replication.Row` class.
+It decodes DML rows of the JOIN and SUBSCRIBE replication streams.
+'''
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_SERVER_ID,
+    IPROTO_LSN,
+    IPROTO_TIMESTAMP,
+    IPROTO_SPACE_ID,
+    IPROTO_INDEX_ID,
+    IPROTO_INDEX_BASE,
+    IPROTO_KEY,
+    IPROTO_TUPLE,
+    IPROTO_OPS,
+    IPROTO_ERROR,
+    REQUEST_TYPE_ERROR,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPSERT
+)
+from tarantool.error import DatabaseError
+from tarantool.response import unpacker_kwargs
+
+ROW_OPS = {
+    REQUEST_TYPE_INSERT: 'insert',
+    REQUEST_TYPE_REPLACE: 'replace',
+    REQUEST_TYPE_UPDATE: 'update',
+    REQUEST_TYPE_DELETE: 'delete',
+    REQUEST_TYPE_UPSERT: 'upsert',
+}
+
+
+class Row(object):
+    '''
+    Represents a single row of the replication stream.
+
+    Rows that do not change data (heartbeats, vclock acknowledgements)
+    are also represented, but :attr:`is_dml` is False for them.
+    '''
+
+    def __init__(self, header, body):
+        '''
+        :param dict header: decoded row header
+        :param dict body: decoded row body
+        '''
+        body = body or {}
+        self.code = header[IPROTO_CODE]
+        self.lsn = header.get(IPROTO_LSN)
+        self.server_id = header.get(IPROTO_SERVER_ID)
+        self.timestamp = header.get(IPROTO_TIMESTAMP)
+        self.space_no = body.get(IPROTO_SPACE_ID)
+        self.index_no = body.get(IPROTO_INDEX_ID, 0)
+        self.index_base = body.get(IPROTO_INDEX_BASE, 0)
+        self.key = body.get(IPROTO_KEY)
+        self.tuple = body.get(IPROTO_TUPLE)
+        self.ops = body.get(IPROTO_OPS)
+        if self.code == REQUEST_TYPE_UPDATE:
+            # UPDATE carries its operations in IPROTO_TUPLE
+            self.ops = self.tuple
+            self.tuple = None
+
+    @classmethod
+    def from_response(cls, response):
+        '''
+        Create a row from a `Response` yielded by
+        :meth:`~tarantool.connection.Connection.join` or
+        :meth:`~tarantool.connection.Connection.subscribe`.
+        '''
+        return cls(response.header, response.body)
+
+    @property
+    def is_dml(self):
+        '''
+        :type: bool
+
+        True if the row modifies data of a space.
+        '''
+        return self.code in ROW_OPS and self.space_no is not None
+
+    @property
+    def op(self):
+        '''
+        :type: str
+
+        Name of the operation ('insert', 'replace', ...) or None.
+        '''
+        return ROW_OPS.get(self.code)
+
+    def primary_key(self, parts):
+        '''
+        Return the primary key of the tuple touched by the row.
+
+        :param parts: field numbers of the primary index
+        :type parts: list of int
+
+        :return: the key or None if it can't be derived from the row
+            (e.g. DELETE or UPDATE made through a secondary index)
+        :rtype: tuple or None
+        '''
+        if self.code in (REQUEST_TYPE_INSERT, REQUEST_TYPE_REPLACE,
+                         REQUEST_TYPE_UPSERT):
+            try:
+                return tuple(self.tuple[part] for part in parts)
+            except (IndexError, TypeError):
+                return None
+        if self.index_no != 0 or self.key is None:
+            return None
+        return tuple(self.key)
+
+    def __repr__(self):
+        return '<Row %s space=%r lsn=%r server_id=%r>' % (
+            self.op or self.code, self.space_no, self.lsn, self.server_id)
+
+
+def unpacker(encoding):
+    '''
+    Create `msgpack.Unpacker` decoding strings the same way as `Response`.
+    '''
+    return msgpack.Unpacker(**unpacker_kwargs(encoding))
+
+
+def decode_frame(frame, encoding):
+    '''
+    Decode a raw packet of the replication stream (without the length
+    prefix) into a `Row`.
+
+    :raise: `DatabaseError` if the packet is an error response
+    '''
+    decoder = unpacker(encoding)
+    decoder.feed(frame)
+    header = decoder.unpack()
+    try:
+        body = decoder.unpack()
+    except msgpack.OutOfData:
+        body = {}
+    if header[IPROTO_CODE] >= REQUEST_TYPE_ERROR:
+        raise DatabaseError(header[IPROTO_CODE] & (REQUEST_TYPE_ERROR - 1),
+                            body.get(IPROTO_ERROR, ""))
+    return Row(header, body)
+
+
+def key_parts(schema, space):
+    '''
+    Return field numbers of the primary index of `space`.
+
+    :param schema: schema to resolve the space in
+    :type schema: :class:`~tarantool.schema.Schema`
+    :param space: space number or name
+    :type space: int or str
+
+    :rtype: list of int
+    '''
+    return [part[0] for part in schema.get_index(space, 0).parts]
+
+
+def decode_vclock(vclock):
+    '''
+    Convert `box.info.vclock` received from the server into a dict.
+    A dense vclock is encoded as a Lua array, which is 1-based.
+
+    :rtype: dict mapping server id to LSN
+    '''
+    if isinstance(vclock, dict):
+        return dict((int(k), v) for k, v in vclock.items())
+    return dict((i + 1, lsn) for i, lsn in enumerate(vclock or ())
+                if lsn is not None)
+
+
+def vclock_ge(vclock, other):
+    '''
+    Return True if `vclock` includes all changes of `other`.
+    '''
+    return all(vclock.get(server_id, 0) >= lsn
+               for server_id, lsn in other.items())
+
+
+def fetch_vclock(conn):
+    '''
+    Fetch the current vclock of the server.
+
+    :rtype: dict mapping server id to LSN
+    '''
+    return decode_vclock(conn.eval('return box.info.vclock')[0])
+
+
+def _field_no(tpl, field, index_base, insert=False):
+    if field < 0:
+        field += len(tpl) + (1 if insert else 0)
+    else:
+        field -= index_base
+    if field < 0 or field > len(tpl):
+        raise IndexError("Field %d was not found in the tuple" % field)
+    return field
+
+
+def apply_ops(tpl, ops, index_base=0):
+    '''
+    Apply UPDATE operations to a tuple the same way the server does.
+
+    :param tpl: source tuple (it isn't modified)
+    :type tpl: list or tuple
+    :param ops: list of operations of the form (symbol, field, arg, ...)
+    :param int index_base: base of field numbers used by the operations
+
+    :return: the updated tuple
+    :rtype: list
+
+    :raise: `IndexError`, `TypeError` or `ValueError` if an operation
+        can't be applied
+    '''
+    tpl = list(tpl)
+    for op in ops:
+        symbol, field = op[0], op[1]
+        if isinstance(symbol, bytes):
+            symbol = symbol.decode()
+        if symbol == '!':
+            tpl.insert(_field_no(tpl, field, index_base, insert=True), op[2])
+            continue
+        field = _field_no(tpl, field, index_base)
+        if symbol == '=':
+            if field == len(tpl):
+                tpl.append(op[2])
+            else:
+                tpl[field] = op[2]
+            continue
+        if field == len(tpl):
+            raise IndexError("Field %d was not found in the tuple" % field)
+        if symbol == '#':
+            del tpl[field:field + op[2]]
+        elif symbol == '+':
+            tpl[field] += op[2]
+        elif symbol == '-':
+            tpl[field] -= op[2]
+        elif symbol == '&':
+            tpl[field] &= op[2]
+        elif symbol == '|':
+            tpl[field] |= op[2]
+        elif symbol == '^':
+            tpl[field] ^= op[2]
+        elif symbol == ':':
+            value = tpl[field]
+            offset, cut, paste = op[2], op[3], op[4]
+            if offset < 0:
+                offset = max(len(value) + offset + 1, 0)
+            else:
+                offset = min(max(offset - index_base, 0), len(value))
+            if cut < 0:
+                cut = max(len(value) - offset + cut, 0)
+            tpl[field] = value[:offset] + paste + value[offset + cut:]
+        else:
+            raise ValueError("Unknown update operation '%s'" % symbol)
+    return tpl
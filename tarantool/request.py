@@ -58,12 +58,23 @@ class Request(object):
     are implemented by the inherited classes.
     '''
     request_type = None
+    # Arguments of the request, for metrics and logs
+    space_no = None
+    index_no = None
+    key = None
+    tuple_value = None
+    function_name = None
 
     def __init__(self, conn):
         self._bytes = None
         self.conn = conn
         self._sync = None
         self._body = ''
+        # Timings of a request sampled by the tracer of the connection
+        self.span = None
+        tracer = getattr(conn, 'tracer', None)
+        if tracer is not None:
+            self.span = tracer.start(self)
 
     def __bytes__(self):
         return self.header(len(self._body)) + self._body
@@ -100,6 +111,8 @@ class RequestInsert(Request):
         '''
         '''
         super(RequestInsert, self).__init__(conn)
+        self.space_no = space_no
+        self.tuple_value = values
         assert isinstance(values, (tuple, list))
 
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
@@ -147,6 +160,8 @@ class RequestReplace(Request):
         '''
         '''
         super(RequestReplace, self).__init__(conn)
+        self.space_no = space_no
+        self.tuple_value = values
         assert isinstance(values, (tuple, list))
 
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
@@ -166,6 +181,9 @@ class RequestDelete(Request):
         '''
         '''
         super(RequestDelete, self).__init__(conn)
+        self.space_no = space_no
+        self.index_no = index_no
+        self.key = key
 
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
                                       IPROTO_INDEX_ID: index_no,
@@ -183,6 +201,9 @@ class RequestSelect(Request):
     # pylint: disable=W0231
     def __init__(self, conn, space_no, index_no, key, offset, limit, iterator):
         super(RequestSelect, self).__init__(conn)
+        self.space_no = space_no
+        self.index_no = index_no
+        self.key = key
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
                                       IPROTO_INDEX_ID: index_no,
                                       IPROTO_OFFSET: offset,
@@ -203,6 +224,9 @@ class RequestUpdate(Request):
     # pylint: disable=W0231
     def __init__(self, conn, space_no, index_no, key, op_list):
         super(RequestUpdate, self).__init__(conn)
+        self.space_no = space_no
+        self.index_no = index_no
+        self.key = key
 
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
                                       IPROTO_INDEX_ID: index_no,
@@ -224,6 +248,7 @@ class RequestCall(Request):
             self.request_type = REQUEST_TYPE_CALL16
         super(RequestCall, self).__init__(conn)
         assert isinstance(args, (list, tuple))
+        self.function_name = name
 
         request_body = msgpack.dumps({IPROTO_FUNCTION_NAME: name,
                                       IPROTO_TUPLE: args})
@@ -269,6 +294,9 @@ class RequestUpsert(Request):
     # pylint: disable=W0231
     def __init__(self, conn, space_no, index_no, tuple_value, op_list):
         super(RequestUpsert, self).__init__(conn)
+        self.space_no = space_no
+        self.index_no = index_no
+        self.tuple_value = tuple_value
 
         request_body = msgpack.dumps({IPROTO_SPACE_ID: space_no,
                                       IPROTO_INDEX_ID: index_no,
@@ -27,6 +27,26 @@ from tarantool.error import (
 )
 
 
+def unpacker_kwargs(encoding=None):
+    '''
+    Keyword arguments of `msgpack.Unpacker` for IPROTO packets with the
+    installed version of msgpack: lists as arrays, maps with integer keys
+    and strings decoded with `encoding`.
+    '''
+    kwargs = {'use_list': True}
+    if msgpack.version >= (1, 0, 0):
+        # Headers and bodies are maps with integer keys
+        kwargs['strict_map_key'] = False
+    if msgpack.version >= (0, 5, 2) and encoding == 'utf-8':
+        # Get rid of the following warning.
+        # > PendingDeprecationWarning: encoding is deprecated,
+        # > Use raw=False instead.
+        kwargs['raw'] = False
+    elif encoding is not None:
+        kwargs['encoding'] = encoding
+    return kwargs
+
+
 class Response(Sequence):
     '''
     Represents a single response from the server in compliance with the
@@ -50,20 +70,13 @@ class Response(Sequence):
         # created in the __new__().
         # super(Response, self).__init__()
 
-        if msgpack.version >= (0, 5, 2) and conn.encoding == 'utf-8':
-            # Get rid of the following warning.
-            # > PendingDeprecationWarning: encoding is deprecated,
-            # > Use raw=False instead.
-            unpacker = msgpack.Unpacker(use_list=True, raw=False)
-        elif conn.encoding is not None:
-            unpacker = msgpack.Unpacker(use_list=True, encoding=conn.encoding)
-        else:
-            unpacker = msgpack.Unpacker(use_list=True)
+        unpacker = msgpack.Unpacker(**unpacker_kwargs(conn.encoding))
 
         unpacker.feed(response)
         header = unpacker.unpack()
 
         self.conn = conn
+        self._header = header
         self._sync = header.get(IPROTO_SYNC, 0)
         self._code = header[IPROTO_CODE]
         self._body = {}
@@ -150,6 +163,17 @@ class Response(Sequence):
         '''
         return self._body
 
+    @property
+    def header(self):
+        '''
+        :type: dict
+
+        Required field in the server response.
+        Contains raw response header. Rows of JOIN and SUBSCRIBE
+        streams carry LSN, server id and timestamp here.
+        '''
+        return self._header
+
     @property
     def code(self):
         '''
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.sharded_connection.ShardedConnection`
+class. It routes requests to replica sets of a cluster sharded by buckets
+the same way as vshard does.
+'''
+
+import threading
+import time
+
+from tarantool.error import (
+    DatabaseError,
+    InterfaceError
+)
+from tarantool.fanout import (
+    FanOut,
+    field_key
+)
+from tarantool.mesh_connection import MeshConnection
+from tarantool.utils import (
+    check_key,
+    crc32c,
+    binary_types,
+    integer_types,
+    string_types
+)
+
+BUCKET_COUNT = 3000
+
+# vshard error returned by vshard.storage.call() for a bucket stored
+# by another replica set
+VSHARD_WRONG_BUCKET = 1
+
+
+def _lua_tostring(value):
+    if isinstance(value, binary_types):
+        return value
+    if value is True:
+        return b'true'
+    if value is False:
+        return b'false'
+    if isinstance(value, float):
+        if value.is_integer():
+            value = int(value)
+        else:
+            return ('%.14g' % value).encode()
+    return (u'%s' % value).encode('utf-8')
+
+
+def bucket_id_strcrc32(shard_key, bucket_count=BUCKET_COUNT):
+    '''
+    Bucket id of a sharding key as computed by
+    `vshard.router.bucket_id_strcrc32()`: CRC32C of the string
+    representation of the key (of each part of a composite key).
+
+    :param shard_key: scalar or list of scalars
+    :param int bucket_count: total number of buckets of the cluster
+
+    :rtype: int
+    '''
+    crc = 0xFFFFFFFF
+    parts = shard_key if isinstance(shard_key, (list, tuple)) else [shard_key]
+    for part in parts:
+        crc = crc32c(_lua_tostring(part), crc)
+    return crc % bucket_count + 1
+
+
+class ShardedConnection(object):
+    '''
+    Client of a sharded cluster: every request is sent to the replica set
+    storing the bucket of its key.
+
+    The map of buckets to replica sets is fetched with
+    `vshard.storage.buckets_discovery()` from every replica set and
+    cached. Selects are sent directly to spaces of the storages, so they
+    rely on the cached map. Data changes and :meth:`call` go through
+    `vshard.storage.call()`, which rejects buckets that have been moved,
+    and the map is refreshed and the request is retried in this case.
+    '''
+
+    def __init__(self, replicasets, bucket_count=BUCKET_COUNT,
+                 bucket_id_func=bucket_id_strcrc32, fanout_timeout=None,
+                 discovery_delay=1.0, **kwargs):
+        '''
+        :param dict replicasets: connections to replica sets by UUID (or
+            any other name): :class:`~tarantool.mesh_connection.MeshConnection`
+            instances or lists of addresses to create them with `kwargs`
+        :param int bucket_count: total number of buckets of the cluster
+        :param bucket_id_func: function of (shard_key, bucket_count)
+            returning a bucket id
+        :param float fanout_timeout: timeout of requests sent to all
+            replica sets at once; connections of the replica sets that
+            don't respond in time are shut down and reconnect on the next
+            request
+        :param float discovery_delay: unknown buckets trigger discovery
+            at most once per `discovery_delay` seconds
+        '''
+        self.replicasets = {}
+        for name, conn in replicasets.items():
+            if isinstance(conn, (list, tuple)):
+                conn = MeshConnection(conn, **kwargs)
+            self.replicasets[name] = conn
+        self.bucket_count = bucket_count
+        self.bucket_id_func = bucket_id_func
+        self.discovery_delay = discovery_delay
+        self._buckets = {}
+        self._discovered_at = None
+        self._lock = threading.Lock()
+        self._discovery_lock = threading.Lock()
+        self.fanout = FanOut(max(len(self.replicasets), 1), fanout_timeout)
+
+    def close(self):
+        self.fanout.close()
+        for conn in self.replicasets.values():
+            conn.close()
+
+    def bucket_id(self, shard_key):
+        '''
+        :rtype: int
+        '''
+        return self.bucket_id_func(shard_key, self.bucket_count)
+
+    def discover(self):
+        '''
+        Fetch the map of buckets to replica sets from all of them.
+        '''
+        with self._discovery_lock:
+            self._discover()
+
+    def _discover(self):
+        result = self.map_call('vshard.storage.buckets_discovery')
+        buckets = {}
+        for name, response in result.items():
+            data = response.data[0] if response.data else []
+            if isinstance(data, dict):
+                data = data.get('buckets', [])
+            for bucket_id in data:
+                buckets[bucket_id] = name
+        with self._lock:
+            self._buckets = buckets
+            self._discovered_at = time.time()
+
+    def route(self, bucket_id):
+        '''
+        Return the name of the replica set storing the bucket,
+        discovering buckets if it isn't known. Lookups of unknown buckets
+        running at once share a single discovery.
+
+        :raise: `InterfaceError` if no replica set stores the bucket
+        '''
+        name = self._buckets.get(bucket_id)
+        if name is not None:
+            return name
+        with self._discovery_lock:
+            name = self._buckets.get(bucket_id)
+            if name is None and (
+                    self._discovered_at is None or
+                    time.time() - self._discovered_at >= self.discovery_delay):
+                self._discover()
+                name = self._buckets.get(bucket_id)
+        if name is None:
+            raise InterfaceError('Bucket %d is not found' % bucket_id)
+        return name
+
+    def replicaset(self, bucket_id):
+        '''
+        :return: connection to the replica set storing the bucket
+        '''
+        return self.replicasets[self.route(bucket_id)]
+
+    def _bucket(self, bucket_id, key):
+        if bucket_id is None:
+            if key is None:
+                raise InterfaceError('bucket_id or key is required')
+            bucket_id = self.bucket_id(key)
+        assert isinstance(bucket_id, integer_types)
+        return bucket_id
+
+    def select(self, space_name, key=None, bucket_id=None, **kwargs):
+        '''
+        Execute SELECT request on the replica set storing `bucket_id`
+        (the bucket of `key` by default).
+        '''
+        conn = self.replicaset(self._bucket(bucket_id, key))
+        return conn.select(space_name, key, **kwargs)
+
+    def _method(self, space_name, method, index=None):
+        '''
+        Name of a Lua method of the space or of its index, e.g.
+        'box.space.users.index.email:update'.
+        '''
+        conn = next(iter(self.replicasets.values()))
+        if not isinstance(space_name, string_types):
+            space_name = conn.schema.get_space(space_name).name
+        if index is None or index == 0:
+            return 'box.space.%s:%s' % (space_name, method)
+        if not isinstance(index, string_types):
+            index = conn.schema.get_index(space_name, index).name
+        return 'box.space.%s.index.%s:%s' % (space_name, index, method)
+
+    def _lua_ops(self, space_name, op_list):
+        '''
+        Update operations with fields numbered from 1 as Lua expects.
+        '''
+        ops = []
+        for op in op_list:
+            op = list(op)
+            if isinstance(op[1], string_types):
+                conn = next(iter(self.replicasets.values()))
+                op[1] = conn.schema.get_field(space_name, op[1])['id']
+            if op[1] >= 0:
+                op[1] += 1
+            ops.append(op)
+        return ops
+
+    def insert(self, space_name, values, bucket_id):
+        '''
+        Execute INSERT request through `vshard.storage.call()` on the
+        replica set storing the bucket, as other data changes do.
+
+        :return: the response of `vshard.storage.call()`, its data are
+            the values returned by the Lua method
+        '''
+        return self._storage_call(bucket_id, 'write', self._method(
+            space_name, 'insert'), [values])[0]
+
+    def replace(self, space_name, values, bucket_id):
+        return self._storage_call(bucket_id, 'write', self._method(
+            space_name, 'replace'), [values])[0]
+
+    def upsert(self, space_name, tuple_value, op_list, bucket_id, **kwargs):
+        return self._storage_call(bucket_id, 'write', self._method(
+            space_name, 'upsert'), [
+                tuple_value, self._lua_ops(space_name, op_list)])[0]
+
+    def update(self, space_name, key, op_list, bucket_id=None, **kwargs):
+        return self._storage_call(
+            self._bucket(bucket_id, key), 'write',
+            self._method(space_name, 'update', kwargs.get('index')),
+            [check_key(key), self._lua_ops(space_name, op_list)])[0]
+
+    def delete(self, space_name, key, bucket_id=None, **kwargs):
+        return self._storage_call(
+            self._bucket(bucket_id, key), 'write',
+            self._method(space_name, 'delete', kwargs.get('index')),
+            [check_key(key)])[0]
+
+    def call(self, bucket_id, func_name, args=(), mode='write', attempts=3):
+        '''
+        Call a stored function on the replica set storing the bucket
+        through `vshard.storage.call()`.
+
+        :param str mode: 'write' or 'read'; reads are sent to replicas by
+            a mesh connection with `read_write_split`
+        :param int attempts: number of replica sets to try if the bucket
+            is being moved
+
+        :return: values returned by the function
+        :rtype: list
+        :raise: `DatabaseError` with the vshard error
+        '''
+        return self._storage_call(bucket_id, mode, func_name, args,
+                                  attempts)[1]
+
+    def _storage_call(self, bucket_id, mode, func_name, args=(),
+                      attempts=3):
+        '''
+        :return: the response of `vshard.storage.call()` and the values
+            returned by the function
+        '''
+        args = list(args)
+        for _ in range(attempts):
+            name = self.route(bucket_id)
+            kwargs = {'mode': 'ro'} if mode == 'read' else {}
+            conn = self.replicasets[name]
+            if kwargs and not isinstance(conn, MeshConnection):
+                kwargs = {}
+            response = conn.call('vshard.storage.call', [
+                bucket_id, mode, func_name, args], **kwargs)
+            data = list(response.data)
+            error = data[1] if len(data) > 1 and data[0] is None else None
+            if not isinstance(error, dict):
+                return response, data
+            if error.get('code') != VSHARD_WRONG_BUCKET:
+                raise DatabaseError(error.get('code', 0), error.get(
+                    'message', str(error)))
+            destination = error.get('destination')
+            if destination in self.replicasets:
+                with self._lock:
+                    self._buckets[bucket_id] = destination
+            else:
+                self.discover()
+        raise DatabaseError(VSHARD_WRONG_BUCKET,
+                            'Bucket %d is being moved' % bucket_id)
+
+    def map_call(self, func_name, args=()):
+        '''
+        Call a stored function on all replica sets in parallel.
+
+        :return: responses by replica set names
+        :rtype: dict
+        '''
+        args = list(args)
+        return self.fanout.gather(dict(
+            (name, lambda conn=conn: conn.call(func_name, args))
+            for name, conn in self.replicasets.items()),
+            connections=self.replicasets)
+
+    def map_select(self, space_name, key=None, index=0, limit=None,
+                   sort_key=None, reverse=False, **kwargs):
+        '''
+        Execute SELECT request on all replica sets in parallel and merge
+        the responses in the order of the index.
+
+        :param sort_key: field numbers of the index parts (or a function
+            returning the sort key of a tuple); responses are
+            concatenated in no particular order if it isn't set
+        :param int limit: maximum number of tuples to return (and to
+            select from each replica set)
+        :param bool reverse: the iterator returns tuples in descending
+            order (e.g. 'LE')
+
+        :rtype: list of tuples
+        '''
+        if limit is not None:
+            kwargs['limit'] = limit
+        tasks = dict(
+            (name, lambda conn=conn: conn.select(space_name, key,
+                                                 index=index, **kwargs))
+            for name, conn in self.replicasets.items())
+        if sort_key is None:
+            tuples = []
+            for _, response in self.fanout.as_completed(
+                    tasks, connections=self.replicasets):
+                tuples.extend(response)
+            return tuples[:limit]
+        if not callable(sort_key):
+            sort_key = field_key(sort_key)
+        return self.fanout.merge(tasks, sort_key, limit, reverse,
+                                 connections=self.replicasets)
+
+    def select_many(self, space_name, keys, **kwargs):
+        '''
+        Select tuples of several keys. Keys are grouped by replica sets
+        and replica sets are queried in parallel, keys of a replica set
+        one after another.
+
+        :param keys: keys, which are also sharding keys
+        :type keys: list
+
+        :return: responses in the order of keys
+        :rtype: list of `Response`
+        '''
+        groups = {}
+        for pos, key in enumerate(keys):
+            groups.setdefault(self.route(self.bucket_id(key)),
+                              []).append(pos)
+
+        def select(name, positions):
+            conn = self.replicasets[name]
+            return [(pos, conn.select(space_name, keys[pos], **kwargs))
+                    for pos in positions]
+        results = self.fanout.gather(dict(
+            (name, lambda name=name, positions=positions:
+             select(name, positions))
+            for name, positions in groups.items()),
+            connections=self.replicasets)
+        responses = [None] * len(keys)
+        for items in results.values():
+            for pos, response in items:
+                responses[pos] = response
+        return responses
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.slowlog.SlowRequestLog` class. It
+logs requests of connections slower than a threshold with a summary of
+the request, limiting the rate of log entries.
+'''
+
+import logging
+import threading
+import time
+
+from tarantool.metrics import (
+    error_name,
+    REQUEST_NAMES
+)
+
+
+def truncate(value, length):
+    '''
+    :return: repr() of the value cut to `length` characters
+    '''
+    text = repr(value)
+    if len(text) > length:
+        text = text[:max(length - 3, 0)] + '...'
+    return text
+
+
+class SlowRequestLog(object):
+    '''
+    Logs requests which take `threshold` seconds or longer, pass it as
+    `slow_log` to :class:`~tarantool.connection.Connection` or
+    :class:`~tarantool.mesh_connection.MeshConnection`::
+
+        con = tarantool.Connection(host, port,
+                                   slow_log=SlowRequestLog(0.05))
+
+    An entry looks like::
+
+        Slow request: 153.2 ms select space=users(512) index=primary(0)
+        key=[1] response=1024 bytes sync=17 node=localhost:3301
+
+    and the fields are also passed in the `tarantool_request` attribute
+    of the log record. Names of spaces and indexes are taken from the
+    schema cache of the connection, it isn't fetched to log a request.
+
+    At most `rate` entries per second are logged (with bursts of `burst`
+    entries); the number of entries dropped is reported by the next one
+    and counted in :attr:`suppressed`.
+    '''
+
+    def __init__(self, threshold=0.1, logger=None, level=logging.WARNING,
+                 rate=1.0, burst=10, key_length=80):
+        '''
+        :param float threshold: seconds
+        :param logger: `logging.Logger`, 'tarantool.slowlog' by default
+        :param int key_length: keys and tuples are cut to this length
+        '''
+        self.threshold = threshold
+        self.logger = logger or logging.getLogger('tarantool.slowlog')
+        self.level = level
+        self.rate = rate
+        self.burst = burst
+        self.key_length = key_length
+        self.logged = 0
+        self.suppressed = 0
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self._tokens + (now - self._updated) *
+                               self.rate, self.burst)
+            self._updated = now
+            if self._tokens < 1:
+                self._dropped += 1
+                self.suppressed += 1
+                return None
+            self._tokens -= 1
+            self.logged += 1
+            dropped, self._dropped = self._dropped, 0
+            return dropped
+
+    def describe(self, conn, request, node, latency, response_bytes,
+                 error=None):
+        '''
+        :return: summary of the request
+        :rtype: dict
+        '''
+        entry = {
+            'latency': latency,
+            'op': REQUEST_NAMES.get(request.request_type,
+                                    str(request.request_type)),
+            'space': None,
+            'index': None,
+            'key': None,
+            'function': request.function_name,
+            'response_bytes': response_bytes,
+            'sync': request.sync,
+            'node': node,
+            'error': None if error is None else error_name(error)
+        }
+        if request.space_no is not None:
+            space = conn.schema.schema.get(request.space_no)
+            entry['space'] = '%s(%s)' % (space.name, request.space_no) \
+                if space is not None else str(request.space_no)
+            if request.index_no is not None:
+                index = space.indexes.get(request.index_no) \
+                    if space is not None else None
+                entry['index'] = '%s(%s)' % (index.name, request.index_no) \
+                    if index is not None else str(request.index_no)
+        key = request.key if request.key is not None else request.tuple_value
+        if key is not None:
+            entry['key'] = truncate(key, self.key_length)
+        return entry
+
+    def observe(self, conn, request, node, latency, response_bytes,
+                error=None):
+        '''
+        Log the request if it is slow.
+
+        :return: True if the request is logged
+        '''
+        if latency < self.threshold:
+            return False
+        dropped = self._acquire()
+        if dropped is None:
+            return False
+        entry = self.describe(conn, request, node, latency, response_bytes,
+                              error)
+        message = ['Slow request: %.1f ms %s' % (latency * 1000,
+                                                 entry['op'])]
+        for field in ('function', 'space', 'index', 'key'):
+            if entry[field] is not None:
+                message.append('%s=%s' % (field, entry[field]))
+        message.append('response=%d bytes sync=%s node=%s' % (
+            response_bytes, entry['sync'], node))
+        if entry['error'] is not None:
+            message.append('error=%s' % entry['error'])
+        if dropped:
+            message.append('(%d slow requests not logged)' % dropped)
+        self.logger.log(self.level, ' '.join(message),
+                        extra={'tarantool_request': entry})
+        return True
@@ -0,0 +1,800 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.standin.StandinServer` class, an
+in-process server speaking IPROTO in place of a Tarantool instance. It
+keeps spaces in memory and lets tests and benchmarks exercise the network
+path of the client without the `tarantool` binary, injecting latency,
+jitter and disconnects.
+
+It serves what the connector needs: the greeting, authentication, schema
+selects from `_vspace` and `_vindex` (and `_space` and `_index`), SELECT
+with tree iterators, INSERT, REPLACE, UPDATE, UPSERT, DELETE, CALL and
+EVAL of Python functions and PING. Requests of a connection may be
+pipelined, their responses carry the sync of the request and with
+jitter may be sent in another order.
+'''
+
+import base64
+import hashlib
+import heapq
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_SYNC,
+    IPROTO_SCHEMA_ID,
+    IPROTO_SPACE_ID,
+    IPROTO_INDEX_ID,
+    IPROTO_LIMIT,
+    IPROTO_OFFSET,
+    IPROTO_ITERATOR,
+    IPROTO_KEY,
+    IPROTO_TUPLE,
+    IPROTO_FUNCTION_NAME,
+    IPROTO_USER_NAME,
+    IPROTO_EXPR,
+    IPROTO_OPS,
+    IPROTO_DATA,
+    IPROTO_ERROR,
+    REQUEST_TYPE_OK,
+    REQUEST_TYPE_PING,
+    REQUEST_TYPE_SELECT,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_UPSERT,
+    REQUEST_TYPE_CALL16,
+    REQUEST_TYPE_CALL,
+    REQUEST_TYPE_EVAL,
+    REQUEST_TYPE_AUTHENTICATE,
+    REQUEST_TYPE_ERROR,
+    SPACE_SPACE,
+    SPACE_INDEX,
+    SPACE_VSPACE,
+    SPACE_VINDEX,
+    ITERATOR_EQ,
+    ITERATOR_REQ,
+    ITERATOR_ALL,
+    ITERATOR_LT,
+    ITERATOR_LE,
+    ITERATOR_GE,
+    ITERATOR_GT
+)
+from tarantool.error import DatabaseError
+from tarantool.replication import apply_ops
+from tarantool.utils import strxor
+
+# Error codes, see `tarantool.error`
+ER_ILLEGAL_PARAMS = 1
+ER_TUPLE_FOUND = 3
+ER_UNSUPPORTED = 5
+ER_UPDATE_ARG_TYPE = 26
+ER_UNKNOWN_UPDATE_OP = 28
+ER_PROC_LUA = 32
+ER_NO_SUCH_PROC = 33
+ER_NO_SUCH_INDEX = 35
+ER_NO_SUCH_SPACE = 36
+ER_NO_SUCH_FIELD_NO = 37
+ER_NO_SUCH_USER = 45
+ER_PASSWORD_MISMATCH = 47
+ER_UNKNOWN_REQUEST_TYPE = 48
+ER_WRONG_SCHEMA_VERSION = 109
+
+FIRST_USER_SPACE = 512
+
+_UNPACKER_KWARGS = {'use_list': True}
+if msgpack.version >= (1, 0, 0):
+    _UNPACKER_KWARGS['strict_map_key'] = False
+if msgpack.version >= (0, 5, 2):
+    _UNPACKER_KWARGS['raw'] = False
+else:
+    _UNPACKER_KWARGS['encoding'] = 'utf-8'
+_PACKER_KWARGS = {}
+if msgpack.version >= (0, 4, 0):
+    _PACKER_KWARGS['use_bin_type'] = True
+
+
+def _sha1(data):
+    return hashlib.sha1(data).digest()
+
+
+class StandinIndex(object):
+    '''
+    Tree index of a :class:`StandinSpace`.
+    '''
+
+    def __init__(self, space, iid, name, parts, unique=True):
+        '''
+        :param parts: list of [field number, type]
+        '''
+        self.space = space
+        self.iid = iid
+        self.name = name
+        self.parts = [list(part) for part in parts]
+        self.unique = unique
+
+    def key(self, tpl):
+        try:
+            return [tpl[part[0]] for part in self.parts]
+        except IndexError:
+            raise DatabaseError(ER_ILLEGAL_PARAMS, 'Tuple field count %d is '
+                                'less than required by index %s' % (
+                                    len(tpl), self.name))
+
+    def select(self, key, iterator=ITERATOR_EQ, offset=0, limit=None):
+        '''
+        :return: tuples matching the key in the order of the iterator
+        :rtype: list
+        '''
+        if key is None:
+            key = []
+        elif not isinstance(key, (list, tuple)):
+            key = [key]
+        key = list(key)
+        if self.iid == 0 and self.unique and \
+                len(key) == len(self.parts) and \
+                iterator in (ITERATOR_EQ, ITERATOR_REQ):
+            # Lookup by the full primary key
+            found = self.space.tuples.get(_frozen(key))
+            result = [found] if found is not None else []
+        else:
+            result = self._scan(key, iterator)
+        if limit is None:
+            return result[offset:]
+        return result[offset:offset + limit]
+
+    def _scan(self, key, iterator):
+        if iterator not in (ITERATOR_EQ, ITERATOR_REQ, ITERATOR_ALL,
+                            ITERATOR_LT, ITERATOR_LE, ITERATOR_GE,
+                            ITERATOR_GT):
+            raise DatabaseError(ER_UNSUPPORTED, 'Stand-in does not support '
+                                'iterator %s' % iterator)
+        size = len(key)
+        rows = sorted(((self.key(tpl), tpl)
+                       for tpl in self.space.tuples.values()),
+                      key=lambda row: row[0])
+        if iterator in (ITERATOR_REQ, ITERATOR_LT, ITERATOR_LE):
+            rows.reverse()
+        if not size:
+            return [tpl for _, tpl in rows]
+        check = {
+            ITERATOR_EQ: lambda prefix: prefix == key,
+            ITERATOR_REQ: lambda prefix: prefix == key,
+            ITERATOR_ALL: lambda prefix: prefix == key,
+            ITERATOR_LT: lambda prefix: prefix < key,
+            ITERATOR_LE: lambda prefix: prefix <= key,
+            ITERATOR_GE: lambda prefix: prefix >= key,
+            ITERATOR_GT: lambda prefix: prefix > key
+        }[iterator]
+        return [tpl for tuple_key, tpl in rows if check(tuple_key[:size])]
+
+
+class StandinSpace(object):
+    '''
+    Space of a :class:`StandinServer` keeping tuples by primary key.
+    '''
+
+    def __init__(self, sid, name, format=None, engine='memtx'):
+        self.sid = sid
+        self.name = name
+        self.format = list(format or [])
+        self.engine = engine
+        self.indexes = []
+        self.tuples = {}
+
+    def index(self, index):
+        for item in self.indexes:
+            if item.iid == index or item.name == index:
+                return item
+        raise DatabaseError(ER_NO_SUCH_INDEX, "No index #%s is defined in "
+                            "space '%s'" % (index, self.name))
+
+    def _pk(self, tpl):
+        return _frozen(self.indexes[0].key(tpl))
+
+    def _check_unique(self, tpl, replaced):
+        for index in self.indexes[1:]:
+            if not index.unique:
+                continue
+            key = index.key(tpl)
+            for other in index.select(key):
+                if other is not replaced:
+                    raise DatabaseError(
+                        ER_TUPLE_FOUND, "Duplicate key exists in unique "
+                        "index '%s' in space '%s'" % (index.name, self.name))
+
+    def insert(self, tpl):
+        pk = self._pk(tpl)
+        if pk in self.tuples:
+            raise DatabaseError(ER_TUPLE_FOUND, "Duplicate key exists in "
+                                "unique index '%s' in space '%s'" % (
+                                    self.indexes[0].name, self.name))
+        self._check_unique(tpl, None)
+        self.tuples[pk] = tpl
+        return tpl
+
+    def replace(self, tpl):
+        pk = self._pk(tpl)
+        self._check_unique(tpl, self.tuples.get(pk))
+        self.tuples[pk] = tpl
+        return tpl
+
+    def _get(self, index, key):
+        found = self.index(index).select(key)
+        if len(found) > 1:
+            raise DatabaseError(ER_ILLEGAL_PARAMS, 'Key of a non-unique '
+                                'index matches several tuples')
+        return found[0] if found else None
+
+    def delete(self, index, key):
+        tpl = self._get(index, key)
+        if tpl is not None:
+            del self.tuples[self._pk(tpl)]
+        return tpl
+
+    def update(self, index, key, ops):
+        old = self._get(index, key)
+        if old is None:
+            return None
+        new = _apply_ops(old, ops)
+        if self._pk(new) != self._pk(old):
+            raise DatabaseError(ER_ILLEGAL_PARAMS, 'Attempt to modify a '
+                                'tuple field which is part of index '
+                                "'%s'" % self.indexes[0].name)
+        self._check_unique(new, old)
+        self.tuples[self._pk(new)] = new
+        return new
+
+    def upsert(self, tpl, ops):
+        old = self.tuples.get(self._pk(tpl))
+        if old is None:
+            self.insert(tpl)
+            return
+        try:
+            new = _apply_ops(old, ops)
+        except DatabaseError:
+            # Tarantool logs and skips failing operations of an upsert
+            return
+        if self._pk(new) == self._pk(old):
+            self.tuples[self._pk(new)] = new
+
+
+def _frozen(key):
+    return tuple(_frozen(item) if isinstance(item, list) else item
+                 for item in key)
+
+
+def _apply_ops(tpl, ops):
+    '''
+    Apply update operations with :func:`~tarantool.replication.apply_ops`
+    and report the failures with the error codes of the server.
+
+    :return: a copy of the tuple with update operations applied
+    '''
+    for op in ops:
+        if len(op) < 3:
+            raise DatabaseError(ER_ILLEGAL_PARAMS, 'Invalid update operation')
+        try:
+            tpl = apply_ops(tpl, [op])
+        except IndexError as e:
+            raise DatabaseError(ER_NO_SUCH_FIELD_NO, str(e))
+        except TypeError:
+            raise DatabaseError(ER_UPDATE_ARG_TYPE, "Argument type in "
+                                "operation '%s' on field %s does not match "
+                                "field type" % (op[0], op[1]))
+        except ValueError as e:
+            raise DatabaseError(ER_UNKNOWN_UPDATE_OP, str(e))
+    return list(tpl)
+
+
+class _Client(object):
+    '''
+    Connection of a client. Responses delayed by the latency of the
+    server are sent by a writer thread in the order of their deadlines.
+    '''
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.salt = os.urandom(32)
+        self.user = 'guest'
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._pending = []
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._writer = None
+
+    def greeting(self):
+        server = self.server
+        line1 = ('Tarantool %s (Binary) %s' % (
+            server.version, server.uuid)).encode().ljust(63) + b'\n'
+        line2 = base64.b64encode(self.salt).ljust(63) + b'\n'
+        return line1 + line2
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        with self._cond:
+            self._cond.notify_all()
+
+    def send(self, packet, delay):
+        if delay <= 0:
+            with self._send_lock:
+                self.sock.sendall(packet)
+            return
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write)
+                self._writer.daemon = True
+                self._writer.start()
+            self._seq += 1
+            heapq.heappush(self._pending,
+                           (time.time() + delay, self._seq, packet))
+            self._cond.notify()
+
+    def _write(self):
+        while True:
+            with self._cond:
+                while not self.closed:
+                    if self._pending:
+                        wait = self._pending[0][0] - time.time()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self.closed:
+                    return
+                packet = heapq.heappop(self._pending)[2]
+            try:
+                with self._send_lock:
+                    self.sock.sendall(packet)
+            except socket.error:
+                return
+
+    def _wait_resumed(self):
+        '''
+        Wait while the server is paused.
+
+        :return: False if the connection is closed meanwhile
+        '''
+        while not self.server._resumed.wait(0.1):
+            if self.closed:
+                return False
+        return not self.closed
+
+    def serve(self):
+        server = self.server
+        try:
+            if not self._wait_resumed():
+                return
+            # A blackholed server drops the greeting with everything else
+            greeted = not server.blackhole
+            if greeted:
+                self.sock.sendall(self.greeting())
+            buf = b''
+            while not self.closed:
+                data = self.sock.recv(65536)
+                if not data or not self._wait_resumed():
+                    break
+                if server.blackhole or not greeted:
+                    continue
+                buf += data
+                while True:
+                    frame, buf = _split_frame(buf)
+                    if frame is None:
+                        break
+                    if not server._handle(self, frame):
+                        return
+        except socket.error:
+            pass
+        finally:
+            server._forget(self)
+            if not self.closed:
+                self.close()
+
+
+def _split_frame(buf):
+    '''
+    :return: the first complete packet without its size and the rest of
+        the buffer, or (None, buf)
+    '''
+    if not buf:
+        return None, buf
+    first = ord(buf[0:1])
+    if first < 0x80:
+        size, length = 1, first
+    elif first in (0xcc, 0xcd, 0xce, 0xcf):
+        size = {0xcc: 2, 0xcd: 3, 0xce: 5, 0xcf: 9}[first]
+        if len(buf) < size:
+            return None, buf
+        length = struct.unpack('>' + {2: 'B', 3: 'H', 5: 'I', 9: 'Q'}[size],
+                               buf[1:size])[0]
+    else:
+        raise socket.error('Invalid packet size prefix')
+    if len(buf) < size + length:
+        return None, buf
+    return buf[size:size + length], buf[size + length:]
+
+
+class StandinServer(object):
+    '''
+    IPROTO server keeping spaces in memory::
+
+        with StandinServer(latency=0.001) as server:
+            server.create_space('users', parts=[[0, 'unsigned']])
+            con = tarantool.Connection('127.0.0.1', server.port)
+            con.insert('users', [1, 'Alice'])
+
+    Users authenticate with the passwords of :attr:`users`, the guest
+    user needs no password. Every user may access everything.
+
+    Stored functions and Lua expressions are Python callables in
+    :attr:`functions` and :attr:`evals` (an expression not there is
+    answered with its arguments, as 'return ...'). They are called with
+    the arguments of the request and return a list of values as a Lua
+    function returns several.
+
+    Faults are injected by the attributes, which may be changed while
+    the server runs: responses are delayed by :attr:`latency` seconds
+    plus a uniformly random part of :attr:`jitter` and a connection is
+    dropped instead of answering a request with the probability
+    :attr:`disconnect_rate`. :meth:`drop_connections` drops all of them.
+    While :attr:`blackhole` is set, the server reads and drops requests
+    and doesn't greet new connections, like a host cut off by a firewall.
+    :meth:`pause` freezes the server as a stopped process until
+    :meth:`resume`: connections are accepted, requests are answered after
+    it resumes.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=0, users=None, latency=0.0,
+                 jitter=0.0, disconnect_rate=0.0, version='2.2.1',
+                 instance_uuid=None, read_only=False):
+        '''
+        :param int port: 0 to bind to a free port, see :attr:`port`
+        :param dict users: passwords by user names
+        '''
+        self.host = host
+        self.port = port
+        self.users = dict(users or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.disconnect_rate = disconnect_rate
+        self.blackhole = False
+        self.version = version
+        self.uuid = instance_uuid or str(uuid.uuid4())
+        self.read_only = read_only
+        self.functions = {}
+        self.evals = {}
+        self.spaces = {}
+        self.schema_version = 1
+        self.requests = 0
+        self.disconnects = 0
+        self._clients = set()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._lock = threading.RLock()
+        self._socket = None
+        self._thread = None
+        self._create_system_spaces()
+
+    @property
+    def address(self):
+        return '%s:%s' % (self.host, self.port)
+
+    def start(self):
+        '''
+        Start listening. A stopped server may be started again, it keeps
+        its port and data.
+        '''
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        self.port = sock.getsockname()[1]
+        self._socket = sock
+        self._thread = threading.Thread(target=self._accept, args=(sock,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stop listening and drop connections.
+        '''
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+            self._thread.join()
+        self.drop_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def pause(self):
+        '''
+        Stop reading requests and greeting new connections.
+        '''
+        self._resumed.clear()
+
+    def resume(self):
+        '''
+        Answer requests received while paused.
+        '''
+        self._resumed.set()
+
+    def drop_connections(self):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.close()
+
+    @property
+    def connections(self):
+        '''
+        Number of connected clients.
+        '''
+        with self._lock:
+            return len(self._clients)
+
+    def _accept(self, sock):
+        while True:
+            try:
+                client_sock, _ = sock.accept()
+            except socket.error:
+                return
+            if self._socket is not sock:
+                client_sock.close()
+                return
+            client_sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(self, client_sock)
+            with self._lock:
+                self._clients.add(client)
+            thread = threading.Thread(target=client.serve)
+            thread.daemon = True
+            thread.start()
+
+    def _forget(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def create_space(self, name, format=None, parts=((0, 'unsigned'),),
+                     sid=None, engine='memtx'):
+        '''
+        Create a space with a primary index by `parts`.
+
+        :param format: list of {'name': ..., 'type': ...}
+        :param parts: parts of the primary index, [field number, type]
+        :rtype: :class:`StandinSpace`
+        '''
+        with self._lock:
+            if sid is None:
+                sid = max([FIRST_USER_SPACE - 1] + [
+                    space for space in self.spaces
+                    if space >= FIRST_USER_SPACE]) + 1
+            space = StandinSpace(sid, name, format, engine)
+            space.indexes.append(StandinIndex(space, 0, 'primary', parts))
+            self.spaces[sid] = space
+            self._schema_changed()
+            return space
+
+    def create_index(self, space, name, parts, unique=True):
+        '''
+        :param space: space id or name
+        :rtype: :class:`StandinIndex`
+        '''
+        with self._lock:
+            space = self._space(space)
+            index = StandinIndex(space, len(space.indexes), name, parts,
+                                 unique)
+            space.indexes.append(index)
+            self._schema_changed()
+            return index
+
+    def _create_system_spaces(self):
+        vspace = StandinSpace(SPACE_VSPACE, '_vspace')
+        vspace.indexes = [
+            StandinIndex(vspace, 0, 'primary', [[0, 'unsigned']]),
+            StandinIndex(vspace, 1, 'owner', [[1, 'unsigned']], False),
+            StandinIndex(vspace, 2, 'name', [[2, 'string']])]
+        vindex = StandinSpace(SPACE_VINDEX, '_vindex')
+        vindex.indexes = [
+            StandinIndex(vindex, 0, 'primary',
+                         [[0, 'unsigned'], [1, 'unsigned']]),
+            StandinIndex(vindex, 2, 'name', [[0, 'unsigned'],
+                                             [2, 'string']])]
+        self.spaces[SPACE_VSPACE] = vspace
+        self.spaces[SPACE_VINDEX] = vindex
+        self._schema_changed()
+
+    def _schema_changed(self):
+        '''
+        Rebuild the system spaces and bump the schema version.
+        '''
+        self.schema_version += 1
+        vspace = self.spaces[SPACE_VSPACE]
+        vindex = self.spaces[SPACE_VINDEX]
+        vspace.tuples = {}
+        vindex.tuples = {}
+        for space in self.spaces.values():
+            vspace.replace([space.sid, 1, space.name, space.engine, 0, {},
+                            space.format])
+            for index in space.indexes:
+                vindex.replace([space.sid, index.iid, index.name, 'tree',
+                                {'unique': index.unique}, index.parts])
+
+    def _space(self, space):
+        if space == SPACE_SPACE:
+            space = SPACE_VSPACE
+        elif space == SPACE_INDEX:
+            space = SPACE_VINDEX
+        found = self.spaces.get(space)
+        if found is None:
+            for item in self.spaces.values():
+                if item.name == space:
+                    return item
+            raise DatabaseError(ER_NO_SUCH_SPACE, "Space '%s' does not "
+                                "exist" % space)
+        return found
+
+    def _handle(self, client, frame):
+        '''
+        Execute a request and send its response.
+
+        :return: False if the connection is dropped
+        '''
+        unpacker = msgpack.Unpacker(**_UNPACKER_KWARGS)
+        unpacker.feed(frame)
+        header = unpacker.unpack()
+        try:
+            body = unpacker.unpack()
+        except msgpack.OutOfData:
+            body = {}
+        with self._lock:
+            self.requests += 1
+        if self.disconnect_rate and random.random() < self.disconnect_rate:
+            with self._lock:
+                self.disconnects += 1
+            client.close()
+            return False
+        code = header.get(IPROTO_CODE)
+        try:
+            schema_id = header.get(IPROTO_SCHEMA_ID)
+            if schema_id and schema_id != self.schema_version and code not in (
+                    REQUEST_TYPE_PING, REQUEST_TYPE_AUTHENTICATE):
+                raise DatabaseError(ER_WRONG_SCHEMA_VERSION, 'Wrong schema '
+                                    'version, current: %d, in request: %d' % (
+                                        self.schema_version, schema_id))
+            data = self._execute(client, code, body)
+            response = {IPROTO_DATA: data} if data is not None else {}
+            status = REQUEST_TYPE_OK
+        except DatabaseError as e:
+            response = {IPROTO_ERROR: e.args[1]}
+            status = REQUEST_TYPE_ERROR | e.args[0]
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            # Malformed request
+            response = {IPROTO_ERROR: 'Illegal parameters, %s' % e}
+            status = REQUEST_TYPE_ERROR | ER_ILLEGAL_PARAMS
+        packet = msgpack.packb({IPROTO_CODE: status,
+                                IPROTO_SYNC: header.get(IPROTO_SYNC, 0),
+                                IPROTO_SCHEMA_ID: self.schema_version},
+                               **_PACKER_KWARGS) + \
+            msgpack.packb(response, **_PACKER_KWARGS)
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        client.send(b'\xce' + struct.pack('>I', len(packet)) + packet, delay)
+        return True
+
+    def _execute(self, client, code, body):
+        '''
+        :return: data of the response, None for a response without it
+        '''
+        if code == REQUEST_TYPE_PING:
+            return None
+        if code == REQUEST_TYPE_AUTHENTICATE:
+            self._authenticate(client, body)
+            return None
+        if code in (REQUEST_TYPE_CALL, REQUEST_TYPE_CALL16):
+            name = body.get(IPROTO_FUNCTION_NAME)
+            func = self.functions.get(name)
+            if func is None:
+                raise DatabaseError(ER_NO_SUCH_PROC, "Procedure '%s' is not "
+                                    "defined" % name)
+            result = self._call(func, body.get(IPROTO_TUPLE, []))
+            if code == REQUEST_TYPE_CALL16:
+                result = [value if isinstance(value, list) else [value]
+                          for value in result]
+            return result
+        if code == REQUEST_TYPE_EVAL:
+            args = body.get(IPROTO_TUPLE, [])
+            func = self.evals.get(body.get(IPROTO_EXPR))
+            if func is None:
+                return list(args)
+            return self._call(func, args)
+        if code not in (REQUEST_TYPE_SELECT, REQUEST_TYPE_INSERT,
+                        REQUEST_TYPE_REPLACE, REQUEST_TYPE_DELETE,
+                        REQUEST_TYPE_UPDATE, REQUEST_TYPE_UPSERT):
+            raise DatabaseError(ER_UNKNOWN_REQUEST_TYPE, 'Unknown request '
+                                'type %s' % code)
+        with self._lock:
+            space = self._space(body.get(IPROTO_SPACE_ID))
+            if code == REQUEST_TYPE_SELECT:
+                return space.index(body.get(IPROTO_INDEX_ID, 0)).select(
+                    body.get(IPROTO_KEY), body.get(IPROTO_ITERATOR, 0),
+                    body.get(IPROTO_OFFSET, 0), body.get(IPROTO_LIMIT))
+            if self.read_only:
+                raise DatabaseError(ER_ILLEGAL_PARAMS, "Can't modify data "
+                                    "because this instance is in read-only "
+                                    "mode.")
+            if space.sid in (SPACE_VSPACE, SPACE_VINDEX):
+                raise DatabaseError(ER_UNSUPPORTED, 'Stand-in does not '
+                                    'support changing the schema by DML')
+            if code == REQUEST_TYPE_INSERT:
+                result = space.insert(body.get(IPROTO_TUPLE))
+            elif code == REQUEST_TYPE_REPLACE:
+                result = space.replace(body.get(IPROTO_TUPLE))
+            elif code == REQUEST_TYPE_DELETE:
+                result = space.delete(body.get(IPROTO_INDEX_ID, 0),
+                                      body.get(IPROTO_KEY))
+            elif code == REQUEST_TYPE_UPDATE:
+                result = space.update(body.get(IPROTO_INDEX_ID, 0),
+                                      body.get(IPROTO_KEY),
+                                      body.get(IPROTO_TUPLE))
+            else:
+                space.upsert(body.get(IPROTO_TUPLE), body.get(IPROTO_OPS))
+                return []
+            return [result] if result is not None else []
+
+    def _call(self, func, args):
+        try:
+            result = func(*args)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(ER_PROC_LUA, str(e))
+        if result is None:
+            return []
+        return list(result)
+
+    def _authenticate(self, client, body):
+        user = body.get(IPROTO_USER_NAME)
+        if user == 'guest':
+            client.user = user
+            return
+        if user not in self.users:
+            raise DatabaseError(ER_NO_SUCH_USER, "User '%s' is not found" %
+                                user)
+        scramble = body.get(IPROTO_TUPLE, [None, b''])[1]
+        if not isinstance(scramble, bytes):
+            scramble = scramble.encode('latin-1')
+        password = self.users[user]
+        if not isinstance(password, bytes):
+            password = password.encode()
+        hash1 = _sha1(password)
+        expected = strxor(hash1, _sha1(client.salt[:20] + _sha1(hash1)))
+        if scramble != expected:
+            raise DatabaseError(ER_PASSWORD_MISMATCH, "Incorrect password "
+                                "supplied for user '%s'" % user)
+        client.user = user
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+'''
+This module provides :class:`~tarantool.tracing.Tracer` class. It times
+the phases of sampled requests (encoding, sending, waiting for the
+server, receiving and decoding) and passes :class:`Span` records to user
+callbacks, e.g. to export them to a tracing system.
+'''
+
+import random
+import time
+
+from tarantool.error import warn
+from tarantool.metrics import (
+    error_name,
+    REQUEST_NAMES
+)
+from tarantool.utils import perf_counter_ns
+
+PHASES = ('encode', 'send', 'wait', 'receive', 'decode')
+
+
+class Span(object):
+    '''
+    Timings of a request in nanoseconds.
+
+    `phases` maps a phase to its duration:
+
+    * encode -- from the creation of the request until it's packed,
+    * send -- writing the request to the socket,
+    * wait -- until the size of the response is read,
+    * receive -- reading the rest of the response,
+    * decode -- building `Response`.
+
+    A request retried after a schema reload accumulates the durations of
+    all attempts. `total_ns` also includes the time to connect and the
+    time spent in the client between the phases.
+    '''
+
+    __slots__ = ('start_time', 'start_ns', 'total_ns', 'phases', 'op',
+                 'space_no', 'sync', 'node', 'request_bytes',
+                 'response_bytes', 'error', '_last')
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.start_ns = self._last = perf_counter_ns()
+        self.total_ns = None
+        self.phases = {}
+        self.op = None
+        self.space_no = None
+        self.sync = None
+        self.node = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error = None
+
+    def mark(self, phase):
+        '''
+        End the phase which started at the end of the previous one (or
+        at the creation of the request).
+        '''
+        now = perf_counter_ns()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._last
+        self._last = now
+
+    def skip(self):
+        '''
+        Don't account the time since the end of the last phase to the
+        next one (e.g. to connect before sending).
+        '''
+        self._last = perf_counter_ns()
+
+    def to_dict(self):
+        return {
+            'start_time': self.start_time,
+            'total_ns': self.total_ns,
+            'phases': dict(self.phases),
+            'op': self.op,
+            'space_no': self.space_no,
+            'sync': self.sync,
+            'node': self.node,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'error': self.error
+        }
+
+
+class Tracer(object):
+    '''
+    Samples requests of connections it is passed to as `tracer`::
+
+        def export(span):
+            print(span.op, span.total_ns, span.phases)
+
+        tracer = Tracer([export], sample_rate=0.01)
+        con = tarantool.Connection(host, port, tracer=tracer)
+
+    Callbacks are called in the thread of the request after it
+    completes, exceptions raised by them are turned into warnings.
+    '''
+
+    def __init__(self, callbacks=(), sample_rate=1.0):
+        '''
+        :param callbacks: callables accepting a :class:`Span`
+        :param float sample_rate: share of requests to trace, from 0 to 1
+        '''
+        self.callbacks = list(callbacks)
+        self.sample_rate = sample_rate
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def start(self, request):
+        '''
+        :return: a new :class:`Span` if the request is sampled, else None
+        '''
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return Span()
+
+    def finish(self, span, request, node, error=None):
+        '''
+        Complete the span of a request and pass it to the callbacks.
+        '''
+        span.total_ns = perf_counter_ns() - span.start_ns
+        span.op = REQUEST_NAMES.get(request.request_type,
+                                    str(request.request_type))
+        span.space_no = request.space_no
+        span.sync = request.sync
+        span.node = node
+        if error is not None:
+            span.error = error_name(error)
+        for callback in self.callbacks:
+            try:
+                callback(span)
+            except Exception as e:
+                warn('Trace callback failed: %r' % (e,), RuntimeWarning)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import sys
+import time
 import uuid
 
 # Compatibility layer for Python2/Python3
@@ -16,6 +17,11 @@ if sys.version_info.major == 2:
     def strxor(rhs, lhs):
         return "".join(chr(ord(x) ^ ord(y)) for x, y in zip(rhs, lhs))
 
+    perf_counter = time.time
+
+    def perf_counter_ns():
+        return int(time.time() * 1000000000)
+
 elif sys.version_info.major == 3:
     binary_types  = (bytes, )
     string_types  = (str, )
@@ -26,6 +32,13 @@ elif sys.version_info.major == 3:
     def strxor(rhs, lhs):
         return bytes([x ^ y for x, y in zip(rhs, lhs)])
 
+    perf_counter = time.perf_counter
+    if sys.version_info >= (3, 7):
+        perf_counter_ns = time.perf_counter_ns
+    else:
+        def perf_counter_ns():
+            return int(time.perf_counter() * 1000000000)
+
 else:
     pass # unreachable
 
@@ -91,3 +104,40 @@ def greeting_decode(greeting_buf):
     except Exception as e:
         print('exx', e)
         raise ValueError("Invalid greeting: " + str(greeting_buf))
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC32C_TABLE = _crc32c_table()
+
+try:
+    # Optional C implementation
+    from crc32c import crc32c as _crc32c_fast
+except ImportError:
+    _crc32c_fast = None
+
+
+def crc32c(data, crc=0):
+    '''
+    CRC-32C (Castagnoli) checksum in the flavour of Tarantool: there's
+    no implicit inversion, so xlog rows are checksummed starting from 0
+    and `digest.crc32()` (used by vshard) starts from 0xFFFFFFFF.
+    The `crc32c` package is used if installed.
+
+    :param bytes data: data to checksum
+    :param int crc: initial value or checksum of the preceding data
+    :rtype: int
+    '''
+    if _crc32c_fast is not None:
+        return _crc32c_fast(data, crc ^ 0xFFFFFFFF) ^ 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for byte in bytearray(data):
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
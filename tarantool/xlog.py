@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0301,W0105,W0401,W0614
+'''
+This module provides :class:`~tarantool.xlog.XlogReader` and
+:class:`~tarantool.xlog.XlogWriter` classes. They read and write
+snapshot (.snap) and write-ahead log (.xlog) files of Tarantool without
+a running server.
+'''
+
+import collections
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import time
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_SERVER_ID,
+    IPROTO_LSN,
+    IPROTO_TIMESTAMP,
+    IPROTO_SPACE_ID,
+    IPROTO_INDEX_ID,
+    IPROTO_INDEX_BASE,
+    IPROTO_KEY,
+    IPROTO_TUPLE,
+    IPROTO_OPS,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPSERT,
+    REQUEST_TYPE_NOP,
+    XLOG_FIXHEADER_SIZE,
+    XLOG_ROW_MARKER,
+    XLOG_ZROW_MARKER,
+    XLOG_EOF_MARKER
+)
+from tarantool.error import XlogError
+from tarantool.replication import (
+    Row,
+    unpacker
+)
+from tarantool.utils import crc32c
+
+XLOG_FILETYPES = ('SNAP', 'XLOG')
+XLOG_VERSIONS = ('0.12', '0.13')
+
+_UINT8 = struct.Struct('>B')
+_MP_UINT = {
+    0xcc: _UINT8,
+    0xcd: struct.Struct('>H'),
+    0xce: struct.Struct('>I'),
+    0xcf: struct.Struct('>Q'),
+}
+
+
+def _mp_uint(buf, pos):
+    tag = _UINT8.unpack_from(buf, pos)[0]
+    if tag < 0x80:
+        return tag, pos + 1
+    fmt = _MP_UINT.get(tag)
+    if fmt is None:
+        raise XlogError('Invalid fixheader at offset %d' % pos)
+    return fmt.unpack_from(buf, pos + 1)[0], pos + 1 + fmt.size
+
+
+def parse_vclock(value):
+    '''
+    Parse a vclock of the file header, e.g. '{1: 10, 2: 5}'.
+
+    :rtype: dict
+    '''
+    return dict((int(server_id), int(lsn)) for server_id, lsn in
+                re.findall(r'(\d+)\s*:\s*(\d+)', value))
+
+
+class XlogReader(object):
+    '''
+    Reader of a single snapshot or xlog file.
+
+    The file is memory-mapped and consists of a text header followed by
+    transaction blocks. Every block starts with a fixed header holding
+    a magic number, the length and the CRC32C of the block; the block
+    holds one or more rows encoded the same way as IPROTO packets.
+    Blocks compressed with zstd (Tarantool 1.10+) require the
+    `zstandard` package.
+
+    Iterating the reader yields :class:`~tarantool.replication.Row`
+    objects. A file that is still being written ends without the EOF
+    marker: reading stops at the last complete block and :attr:`eof`
+    stays False.
+    '''
+
+    def __init__(self, path, spaces=None, verify=True, encoding='utf-8'):
+        '''
+        :param str path: path to the file
+        :param spaces: space numbers to yield rows of (all rows if None)
+        :type spaces: list
+        :param bool verify: check CRC32C of every block; install the
+            `crc32c` package to make it cheap
+        :param str encoding: encoding of strings in tuples
+        '''
+        self.path = path
+        self.spaces = None if spaces is None else set(spaces)
+        self.verify = verify
+        self.encoding = encoding
+        self.eof = False
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise XlogError('%s: empty file' % path)
+        try:
+            self._read_meta()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_meta(self):
+        end = self._map.find(b'\n\n')
+        if end < 0:
+            raise XlogError('%s: no file header' % self.path)
+        lines = self._map[:end].decode('ascii', 'replace').split('\n')
+        if len(lines) < 2 or lines[0] not in XLOG_FILETYPES:
+            raise XlogError('%s: unknown file type %r' %
+                            (self.path, lines[0]))
+        if lines[1] not in XLOG_VERSIONS:
+            raise XlogError('%s: unsupported version %r' %
+                            (self.path, lines[1]))
+        self.filetype = lines[0]
+        self.version = lines[1]
+        self.meta = {}
+        for line in lines[2:]:
+            key, _, value = line.partition(':')
+            self.meta[key.strip()] = value.strip()
+        self.vclock = parse_vclock(self.meta.get('VClock', ''))
+        self.data_offset = end + 2
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def blocks(self, start=None, end=None):
+        '''
+        Iterate over fixed headers of transaction blocks without reading
+        the blocks.
+
+        :param int start: offset of the first block (the first block of
+            the file by default)
+        :param int end: offset to stop at (the end of the file by default)
+
+        :return: iterator of (offset, compressed, data offset, length, crc)
+        '''
+        buf = self._map
+        size = len(buf)
+        pos = self.data_offset if start is None else start
+        end = size if end is None else end
+        while pos < end and pos + 4 <= size:
+            magic = buf[pos:pos + 4]
+            if magic == XLOG_EOF_MARKER:
+                self.eof = True
+                return
+            if magic != XLOG_ROW_MARKER and magic != XLOG_ZROW_MARKER:
+                raise XlogError('%s: invalid magic at offset %d' %
+                                (self.path, pos))
+            data_start = pos + XLOG_FIXHEADER_SIZE
+            if data_start > size:
+                return
+            length, cur = _mp_uint(buf, pos + 4)
+            _, cur = _mp_uint(buf, cur)
+            crc, cur = _mp_uint(buf, cur)
+            if data_start + length > size:
+                return
+            yield (pos, magic == XLOG_ZROW_MARKER, data_start, length, crc)
+            pos = data_start + length
+
+    def segments(self, count):
+        '''
+        Split the file into at most `count` ranges of blocks of similar
+        size, so they can be decoded in parallel.
+
+        :rtype: list of (start, end) offsets
+        '''
+        size = len(self._map) - self.data_offset
+        step = max(size // max(count, 1), 1)
+        result = []
+        start = self.data_offset
+        last = start
+        for _, _, data_start, length, _ in self.blocks():
+            last = data_start + length
+            if last - start >= step:
+                result.append((start, last))
+                start = last
+        if last > start:
+            result.append((start, last))
+        return result
+
+    def _block_data(self, compressed, data_start, length, crc):
+        data = self._map[data_start:data_start + length]
+        if self.verify and crc32c(data) != crc:
+            raise XlogError('%s: checksum mismatch at offset %d' %
+                            (self.path, data_start - XLOG_FIXHEADER_SIZE))
+        if compressed:
+            if zstandard is None:
+                raise XlogError('%s: zstd compressed block, the '
+                                '`zstandard` package is required' % self.path)
+            data = zstandard.ZstdDecompressor().decompressobj() \
+                .decompress(data)
+        return data
+
+    def rows(self, start=None, end=None):
+        '''
+        Iterate over rows of the file or of a range of its blocks.
+
+        :rtype: iterator of :class:`~tarantool.replication.Row`
+        '''
+        spaces = self.spaces
+        for _, compressed, data_start, length, crc in self.blocks(start, end):
+            decoder = unpacker(self.encoding)
+            decoder.feed(self._block_data(compressed, data_start, length, crc))
+            for header in decoder:
+                if header.get(IPROTO_CODE) == REQUEST_TYPE_NOP:
+                    # NOP rows have no body
+                    body = None
+                else:
+                    body = next(decoder)
+                if spaces is not None and (
+                        body is None or body.get(IPROTO_SPACE_ID) not in spaces):
+                    continue
+                yield Row(header, body)
+
+    def __iter__(self):
+        return self.rows()
+
+
+def read_segment(path, start, end, spaces=None, verify=True,
+                 encoding='utf-8'):
+    '''
+    Decode a range of blocks of a file. It is executed by worker
+    processes of :func:`read_xlogs`.
+
+    :rtype: list of :class:`~tarantool.replication.Row`
+    '''
+    with XlogReader(path, spaces, verify, encoding) as reader:
+        return list(reader.rows(start, end))
+
+
+def read_xlogs(paths, spaces=None, verify=True, encoding='utf-8', workers=0,
+               segment_size=16 * 1024 * 1024):
+    '''
+    Iterate over rows of several files in the given order, e.g. a
+    snapshot followed by the xlogs written after it. Names of files are
+    their vclock signatures padded with zeroes, so sorting the names of
+    a single kind of files gives their order.
+
+    With `workers` > 0 files are split into segments of about
+    `segment_size` bytes decoded by a pool of processes; rows are still
+    yielded in order and at most `workers * 2` decoded segments are kept
+    in memory.
+
+    :param paths: paths to the files
+    :type paths: list of str
+    :param spaces: space numbers to yield rows of (all rows if None)
+    :type spaces: list
+    :param bool verify: check CRC32C of every block
+    :param str encoding: encoding of strings in tuples
+    :param int workers: number of decoding processes
+    :param int segment_size: approximate size of a segment in bytes
+
+    :rtype: iterator of :class:`~tarantool.replication.Row`
+    '''
+    if workers <= 0:
+        for path in paths:
+            with XlogReader(path, spaces, verify, encoding) as reader:
+                for row in reader:
+                    yield row
+        return
+
+    pool = multiprocessing.Pool(workers)
+    pending = collections.deque()
+    try:
+        for path in paths:
+            with XlogReader(path, spaces, verify, encoding) as reader:
+                size = len(reader._map) - reader.data_offset
+                segments = reader.segments(max(size // segment_size, 1))
+            for start, end in segments:
+                args = (path, start, end, spaces, verify, encoding)
+                pending.append(pool.apply_async(read_segment, args))
+                while len(pending) > workers * 2:
+                    for row in pending.popleft().get():
+                        yield row
+        while pending:
+            for row in pending.popleft().get():
+                yield row
+    finally:
+        pool.terminate()
+
+
+def xlog_name(vclock, filetype='SNAP'):
+    '''
+    Name of a file as Tarantool expects it: the signature (the sum of
+    LSNs) of the vclock the file starts from, padded with zeroes.
+
+    :rtype: str
+    '''
+    return '%020d.%s' % (sum(vclock.values()), filetype.lower())
+
+
+class XlogWriter(object):
+    '''
+    Writer of a snapshot or xlog file.
+
+    Rows are packed into transaction blocks of about `block_size` bytes
+    which are written as soon as they are full, so memory usage doesn't
+    depend on the number of rows. The file is written under the
+    '.inprogress' suffix and renamed when :meth:`close` succeeds.
+
+    Rows of a snapshot are numbered from 1 and belong to server 0, as
+    Tarantool writes them; `vclock` is the position the snapshot
+    represents. Rows of an xlog get LSNs following `vclock[server_id]`.
+
+    A server boots only from a snapshot that also contains its system
+    spaces (_schema, _space, _index, _user, ...). The simplest way to
+    get them is to create the spaces on a template instance, make a
+    snapshot of it and copy its rows::
+
+        with XlogReader(template) as reader, \\
+                XlogWriter(xlog_name(vclock), vclock=vclock) as writer:
+            for row in reader:
+                if row.space_no < 512:
+                    writer.write_row(row)
+            for tpl in data:
+                writer.insert(512, tpl)
+    '''
+
+    def __init__(self, path, filetype='SNAP', vclock=None, instance_uuid=None,
+                 server_id=1, version='0.13', server_version='1.7.6',
+                 block_size=128 * 1024, sync=True):
+        '''
+        :param str path: path to the file
+        :param str filetype: 'SNAP' or 'XLOG'
+        :param dict vclock: vclock the file starts from
+        :param str instance_uuid: UUID of the instance written to the
+            header; must match the UUID in the _cluster space of a snapshot
+        :param int server_id: id of the server writing an xlog
+        :param str version: file format, '0.13' (1.7+) or '0.12' (1.6)
+        :param str server_version: version of Tarantool in the header
+        :param int block_size: size of a transaction block in bytes;
+            1.6 (format '0.12') expects a row per block, so it's ignored
+        :param bool sync: fsync the file on close
+        '''
+        if filetype not in XLOG_FILETYPES:
+            raise XlogError('Unknown file type %r' % filetype)
+        if version not in XLOG_VERSIONS:
+            raise XlogError('Unsupported version %r' % version)
+        self.path = path
+        self.filetype = filetype
+        self.vclock = dict(vclock or {})
+        self.server_id = server_id if filetype == 'XLOG' else 0
+        self.lsn = self.vclock.get(server_id, 0) if filetype == 'XLOG' else 0
+        self.block_size = block_size if version != '0.12' else 0
+        self.sync = sync
+        self.rows = 0
+        self._packer = msgpack.Packer()
+        self._buffer = []
+        self._buffered = 0
+        self._file = open(path + '.inprogress', 'wb')
+
+        meta = [filetype, version]
+        if version == '0.13':
+            meta.append('Version: %s' % server_version)
+        if instance_uuid is not None:
+            meta.append('%s: %s' % ('Instance' if version == '0.13' else
+                                    'Server', instance_uuid))
+        meta.append('VClock: {%s}' % ', '.join(
+            '%d: %d' % item for item in sorted(self.vclock.items())))
+        self._file.write(('\n'.join(meta) + '\n\n').encode('ascii'))
+
+    def write(self, code, body, timestamp=None):
+        '''
+        Append a row.
+
+        :param int code: request type, e.g. `REQUEST_TYPE_INSERT`
+        :param dict body: body of the row keyed by IPROTO keys
+        :param float timestamp: time of the row (now by default)
+        '''
+        self.lsn += 1
+        self.rows += 1
+        packer = self._packer
+        data = packer.pack({
+            IPROTO_CODE: code,
+            IPROTO_SERVER_ID: self.server_id,
+            IPROTO_LSN: self.lsn,
+            IPROTO_TIMESTAMP: time.time() if timestamp is None else timestamp
+        }) + packer.pack(body)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            self.flush()
+
+    def insert(self, space_no, values, timestamp=None):
+        '''
+        Append an INSERT row, which is the only kind of rows in snapshots.
+        '''
+        self.write(REQUEST_TYPE_INSERT, {IPROTO_SPACE_ID: space_no,
+                                         IPROTO_TUPLE: values}, timestamp)
+
+    def write_row(self, row):
+        '''
+        Append a copy of a row read by :class:`XlogReader` or received
+        from the replication stream. It gets the LSN of this file.
+
+        :type row: :class:`~tarantool.replication.Row`
+        '''
+        body = {IPROTO_SPACE_ID: row.space_no}
+        if row.code in (REQUEST_TYPE_UPDATE, REQUEST_TYPE_DELETE):
+            body[IPROTO_INDEX_ID] = row.index_no
+            body[IPROTO_KEY] = row.key
+        if row.index_base:
+            body[IPROTO_INDEX_BASE] = row.index_base
+        if row.code == REQUEST_TYPE_UPDATE:
+            body[IPROTO_TUPLE] = row.ops
+        elif row.tuple is not None:
+            body[IPROTO_TUPLE] = row.tuple
+        if row.code == REQUEST_TYPE_UPSERT:
+            body[IPROTO_OPS] = row.ops
+        self.write(row.code, body, row.timestamp)
+
+    def flush(self):
+        '''
+        Write buffered rows as a transaction block.
+        '''
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        fixheader = XLOG_ROW_MARKER + msgpack.dumps(len(data)) + \
+            msgpack.dumps(0) + msgpack.dumps(crc32c(data))
+        # The fixed header is padded with a string
+        padding = XLOG_FIXHEADER_SIZE - len(fixheader) - 1
+        fixheader += struct.pack('>B', 0xa0 | padding) + b'\x00' * padding
+        self._file.write(fixheader)
+        self._file.write(data)
+
+    def close(self):
+        '''
+        Write the rest of rows and the EOF marker and give the file its
+        name.
+        '''
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.write(XLOG_EOF_MARKER)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        getattr(os, 'replace', os.rename)(self.path + '.inprogress',
+                                          self.path)
+
+    def abort(self):
+        '''
+        Close and remove an incomplete file.
+        '''
+        if not self._file.closed:
+            self._file.close()
+            os.remove(self.path + '.inprogress')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -15,3 +15,9 @@ pip install pyyaml
 
 # Run tests.
 python setup.py test
+
+# Check encoding and decoding didn't get slower.
+python benchmarks/codec.py --baseline benchmarks/codec_baseline.json
+
+# Check large results, connections and streams didn't take more memory.
+python benchmarks/memory.py --baseline benchmarks/memory_baseline.json
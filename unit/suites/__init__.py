@@ -8,9 +8,25 @@ from .test_schema import TestSuite_Schema
 from .test_dml import TestSuite_Request
 from .test_protocol import TestSuite_Protocol
 from .test_reconnect import TestSuite_Reconnect
+from .test_replication import TestSuite_Replication
+from .test_xlog import TestSuite_Xlog
+from .test_mesh import TestSuite_Mesh
+from .test_sharding import TestSuite_Sharding
+from .test_fanout import TestSuite_FanOut
+from .test_metrics import TestSuite_Metrics
+from .test_tracing import TestSuite_Tracing
+from .test_slowlog import TestSuite_SlowLog
+from .test_hotkeys import TestSuite_HotKeys
+from .test_capture import TestSuite_Capture
+from .test_standin import TestSuite_Standin
+from .test_bench import TestSuite_Bench
 
 test_cases = (TestSuite_Schema, TestSuite_Request, TestSuite_Protocol,
-              TestSuite_Reconnect)
+              TestSuite_Reconnect, TestSuite_Replication, TestSuite_Xlog,
+              TestSuite_Mesh, TestSuite_Sharding, TestSuite_FanOut,
+              TestSuite_Metrics, TestSuite_Tracing, TestSuite_SlowLog,
+              TestSuite_HotKeys, TestSuite_Capture, TestSuite_Standin,
+              TestSuite_Bench)
 
 def load_tests(loader, tests, pattern):
     suite = unittest.TestSuite()
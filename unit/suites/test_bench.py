@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import collections
+import sys
+import unittest
+
+from tarantool import bench
+from tarantool.error import DatabaseError
+from tarantool.request import RequestSelect
+from tarantool.standin import StandinServer
+
+
+class TestSuite_Bench(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' BENCH '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.srv = StandinServer().start()
+        self.addCleanup(self.srv.stop)
+        self.srv.create_space('bench')
+
+    def config(self, *args):
+        return bench.parse_args(['--port', str(self.srv.port),
+                                 '--keys', '100'] + list(args))
+
+    def test_00_workload(self):
+        workload = bench.Workload(512, read_ratio=0.75, keys=1000,
+                                  distribution='zipf', seed=1)
+        counts = collections.Counter(workload.key() for _ in range(10000))
+        self.assertEqual(counts.most_common(1)[0][0], 0)
+        self.assertGreater(counts[0], counts[10] * 5)
+        self.assertTrue(all(0 <= key < 1000 for key in counts))
+        requests = [workload.request(None) for _ in range(1000)]
+        reads = [request for request, read in requests if read]
+        self.assertTrue(650 < len(reads) < 850)
+        self.assertTrue(all(isinstance(request, RequestSelect)
+                            for request in reads))
+        workload = bench.Workload(512, keys=10, distribution='sequential',
+                                  worker=1, workers=2)
+        self.assertEqual([workload.key() for _ in range(7)],
+                         [5, 6, 7, 8, 9, 0, 1])
+        with self.assertRaises(ValueError):
+            bench.Workload(512, distribution='normal')
+
+    def test_01_run(self):
+        config = self.config('--connections', '2', '--pipeline', '4',
+                             '--duration', '0.4', '--interval', '0.1',
+                             '--read-ratio', '0.5', '--fill')
+        reported = []
+        report = bench.run(config, reported.append)
+        self.assertEqual(report['errors'], [])
+        total = report['total']
+        self.assertGreater(total['requests'], 0)
+        self.assertEqual(total['errors'], 0)
+        self.assertEqual(total['reads'] + total['writes'], total['requests'])
+        self.assertGreater(total['reads'], 0)
+        self.assertGreater(total['writes'], 0)
+        self.assertEqual(len(self.srv.spaces[512].tuples), 100)
+        self.assertEqual(total['latency']['count'], total['requests'])
+        # Responses after the end of the run are in the last interval
+        self.assertLessEqual(len(report['intervals']), 4)
+        self.assertEqual(sum(item['requests'] for item in report['intervals']),
+                         total['requests'])
+        self.assertEqual([item['time'] for item in reported],
+                         [item['time'] for item in report['intervals']])
+
+    def test_02_rate(self):
+        config = self.config('--connections', '2', '--rate', '100',
+                             '--duration', '0.5', '--interval', '0.25')
+        report = bench.run(config)
+        self.assertTrue(40 <= report['total']['requests'] <= 60,
+                        report['total']['requests'])
+
+        # Requests delayed by a slow server count from the time they
+        # were due
+        self.srv.latency = 0.05
+        config = self.config('--rate', '100', '--duration', '0.5',
+                             '--interval', '0.5')
+        latency = bench.run(config)['total']['latency']
+        self.assertGreater(latency['max'], 0.2)
+
+    def test_03_errors(self):
+        with self.assertRaises(DatabaseError):
+            bench.run(self.config('--space', 'missing'))
+        self.srv.read_only = True
+        report = bench.run(self.config('--duration', '0.2',
+                                       '--read-ratio', '0'))
+        self.assertGreater(report['total']['errors'], 0)
+        self.assertEqual(report['total']['requests'], 0)
+        self.assertEqual(bench.main(['--port', '1', '--duration', '0.1']), 1)
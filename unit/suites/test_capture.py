@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import io
+import socket
+import sys
+import threading
+import unittest
+
+from tarantool.capture import (
+    Capture,
+    read_capture
+)
+from tarantool.connection import Connection
+from tarantool.error import (
+    DatabaseError,
+    InterfaceError
+)
+from tarantool.mesh_connection import NodeConnection
+from tarantool.replay import (
+    Replayer,
+    format_report,
+    strip_schema_id
+)
+from tarantool.request import RequestSelect
+
+from .test_tracing import serve
+
+
+class TestSuite_Capture(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' CAPTURE AND REPLAY '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def connect(self, delay, conn_class=Connection, **kwargs):
+        client, server = socket.socketpair()
+        thread = threading.Thread(target=serve, args=(server, delay))
+        thread.daemon = True
+        thread.start()
+        con = conn_class('localhost', 3301, connect_now=False, **kwargs)
+        con._socket = client
+        con.connected = True
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+        return con
+
+    def capture(self):
+        stream = io.BytesIO()
+        capture = Capture(stream)
+        con = self.connect(0.01, capture=capture)
+        for num in range(5):
+            con.select(512, num)
+        with self.assertRaises(DatabaseError):
+            con.insert(512, [1])
+        capture.close()
+        return stream.getvalue()
+
+    def test_00_capture(self):
+        data = self.capture()
+        records = list(read_capture(io.BytesIO(data)))
+        self.assertEqual(len(records), 6)
+        self.assertEqual([record.error for record in records],
+                         [False] * 5 + [True])
+        for prev, record in zip(records, records[1:]):
+            self.assertGreaterEqual(record.offset,
+                                    prev.offset + prev.latency - 0.001)
+        self.assertTrue(all(record.latency >= 0.01 for record in records))
+        self.assertTrue(all(record.response_bytes > 5 for record in records))
+        con = Connection('localhost', 3301, connect_now=False)
+        self.assertEqual(records[1].packet, bytes(RequestSelect(
+            con, 512, 0, [1], 0, 0xffffffff, 0)))
+
+        with self.assertRaises(InterfaceError):
+            list(read_capture(io.BytesIO(data[:-1])))
+        with self.assertRaises(InterfaceError):
+            list(read_capture(io.BytesIO(b'garbage')))
+
+    def test_01_strip_schema_id(self):
+        con = Connection('localhost', 3301, connect_now=False)
+        con.schema_version = 42
+        packet = bytes(RequestSelect(con, 512, 0, [1], 0, 10, 0))
+        stripped = strip_schema_id(packet)
+        self.assertLess(len(stripped), len(packet))
+        con.schema_version = 0
+        request = RequestSelect(con, 512, 0, [1], 0, 10, 0)
+        self.assertEqual(stripped, strip_schema_id(bytes(request)))
+        self.assertTrue(stripped.endswith(request._body))
+
+    def test_02_replay(self):
+        records = list(read_capture(io.BytesIO(self.capture())))
+        for speed in (None, 2.0):
+            replayer = Replayer(
+                records, lambda: self.connect(0.002, NodeConnection),
+                connections=2, speed=speed)
+            report = replayer.run()
+            self.assertEqual((report['requests'], report['errors']), (6, 1))
+            self.assertEqual(report['latency']['count'], 5)
+            self.assertGreaterEqual(report['latency']['p50'], 0.002)
+            self.assertEqual(report['captured_latency']['count'], 6)
+            self.assertGreater(report['throughput'], 0)
+            self.assertIn('Replayed 6 requests (1 errors)',
+                          format_report(report))
+        # The captured pace is kept: 6 requests of 10 ms at double speed
+        self.assertGreaterEqual(report['duration'], 0.02)
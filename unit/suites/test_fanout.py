@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import sys
+import threading
+import time
+import unittest
+
+from tarantool.connection import Connection
+from tarantool.error import NetworkError
+from tarantool.fanout import (
+    FanOut,
+    field_key,
+    merge_sorted
+)
+from tarantool.standin import StandinServer
+
+
+def sleep_and_return(delay, value):
+    def func():
+        time.sleep(delay)
+        return value
+    return func
+
+
+def fail():
+    raise ValueError('failed')
+
+
+class TestSuite_FanOut(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' FAN-OUT '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.fanout = FanOut(workers=4)
+        self.addCleanup(self.fanout.close)
+
+    def test_00_merge_sorted(self):
+        sequences = [[1, 4, 7], [], [2, 5, 8, 9], [3, 6]]
+        self.assertEqual(list(merge_sorted(sequences)), list(range(1, 10)))
+        self.assertEqual(list(merge_sorted(sequences, limit=4)), [1, 2, 3, 4])
+        tuples = [[[9, 'a'], [2, 'c']], [[5, 'b'], [1, 'd']]]
+        self.assertEqual(list(merge_sorted(tuples, field_key(0),
+                                           reverse=True)),
+                         [[9, 'a'], [5, 'b'], [2, 'c'], [1, 'd']])
+        self.assertEqual(list(merge_sorted(tuples, field_key([1]),
+                                           limit=1)), [[9, 'a']])
+
+    def test_01_gather(self):
+        started = time.time()
+        result = self.fanout.gather(dict(
+            (num, sleep_and_return(0.1, num)) for num in range(4)))
+        self.assertEqual(result, {0: 0, 1: 1, 2: 2, 3: 3})
+        # Functions run concurrently
+        self.assertLess(time.time() - started, 0.3)
+        order = [key for key, _ in self.fanout.as_completed({
+            'slow': sleep_and_return(0.1, 1),
+            'fast': sleep_and_return(0, 2)})]
+        self.assertEqual(order, ['fast', 'slow'])
+        self.assertRaises(ValueError, self.fanout.gather,
+                          {'ok': sleep_and_return(0, 1), 'fail': fail})
+
+    def test_02_timeout(self):
+        started = time.time()
+        self.assertRaises(NetworkError, self.fanout.gather, {
+            'slow': sleep_and_return(0.5, 1),
+            'fast': sleep_and_return(0, 2)}, timeout=0.05)
+        self.assertLess(time.time() - started, 0.3)
+
+    def test_03_merge(self):
+        self.assertEqual(self.fanout.merge({
+            'a': sleep_and_return(0.02, [[1], [3], [5]]),
+            'b': sleep_and_return(0, [[2], [4]])}, field_key(0), limit=4),
+            [[1], [2], [3], [4]])
+
+    def test_04_timeout_shutdown(self):
+        srv = StandinServer().start()
+        self.addCleanup(srv.stop)
+        srv.create_space('test')
+        conn = Connection(srv.host, srv.port, reconnect_delay=0)
+        self.addCleanup(conn.close)
+        conn.ping()
+        srv.pause()
+        done = threading.Event()
+
+        def select():
+            try:
+                return conn.select('test')
+            finally:
+                done.set()
+        self.assertRaises(NetworkError, self.fanout.gather,
+                          {'test': select}, timeout=0.05,
+                          connections={'test': conn})
+        # The abandoned request has failed instead of waiting for the
+        # response, which would be read by the next request otherwise
+        self.assertTrue(done.wait(1))
+        srv.resume()
+        self.assertEqual(len(conn.select('test')), 0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import sys
+import time
+import unittest
+
+from tarantool.hotkeys import (
+    HotKeyProfiler,
+    SpaceSaving
+)
+from tarantool.mesh_connection import LeastOutstandingStrategy
+from tarantool.schema import (
+    SchemaIndex,
+    SchemaSpace
+)
+
+from .test_mesh import (
+    NODES,
+    FakeMesh
+)
+
+
+class TestSuite_HotKeys(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' HOT KEYS '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        NODES.clear()
+        NODES[3301] = {}
+
+    def mesh(self, profiler):
+        con = FakeMesh([{'host': 'localhost', 'port': 3301}],
+                       strategy_class=LeastOutstandingStrategy,
+                       connect_now=False, hot_keys=profiler)
+        self.addCleanup(con.close)
+        space = SchemaSpace([512, 0, 'users', 'memtx', 0, {},
+                             [{'name': 'id', 'type': 'unsigned'},
+                              {'name': 'region', 'type': 'string'}]],
+                            con.schema.schema)
+        SchemaIndex([512, 0, 'primary', 'tree', {'unique': True},
+                     [[1, 'string'], [0, 'unsigned']]], space)
+        return con
+
+    def test_00_space_saving(self):
+        summary = SpaceSaving(10)
+        stream = [1] * 100 + [2] * 50 + list(range(100, 300))
+        for pos in range(len(stream)):
+            summary.add(stream[(pos * 3) % len(stream)])
+        counts = dict((item, (count, error))
+                      for item, count, error in summary.items())
+        self.assertEqual(len(counts), 10)
+        # Frequent items are kept, counts are never underestimated
+        for item, real in ((1, 100), (2, 50)):
+            count, error = counts[item]
+            self.assertGreaterEqual(count, real)
+            self.assertLessEqual(count - error, real)
+
+        # The least counted item is replaced, though counts of items
+        # have grown since they were added
+        summary = SpaceSaving(3)
+        for item in 'abc':
+            summary.add(item)
+        summary.add('a', 5)
+        summary.add('c', 2)
+        summary.add('d')
+        self.assertEqual(sorted(summary.items()),
+                         [('a', 6, 0), ('c', 3, 0), ('d', 2, 1)])
+        summary.add('e')
+        self.assertEqual(sorted(summary.items()),
+                         [('a', 6, 0), ('c', 3, 0), ('e', 3, 2)])
+        self.assertEqual(len(summary._heap), 3)
+
+    def test_01_top(self):
+        profiler = HotKeyProfiler(sample_rate=1, capacity=100)
+        con = self.mesh(profiler)
+        for num in range(30):
+            con.select(512, 'hot')
+            con.select(512, num)
+            if num % 2:
+                con.select(512, 'warm', index=1)
+        con.replace(512, [7, 'eu', 'data'])
+        con.delete(513, 7)
+        top = profiler.top(2)
+        self.assertEqual([(item['space'], item['index'], item['key'],
+                           item['op']) for item in top],
+                         [(512, 0, ('hot',), 'read'),
+                          (512, 1, ('warm',), 'read')])
+        self.assertGreaterEqual(top[0]['count'], 30)
+        self.assertEqual(top[0]['estimate'], top[0]['count'])
+        keys = [(item['key'], item['op']) for item in profiler.top(100)]
+        # Writes are keyed by the primary index from the schema cache
+        self.assertIn((('eu', 7), 'write'), keys)
+        self.assertIn(((7,), 'write'), keys)
+        spaces = profiler.top_spaces()
+        self.assertEqual([(item['space'], item['reads'], item['writes'])
+                          for item in spaces],
+                         [(512, 75, 1), (513, 0, 1)])
+        self.assertAlmostEqual(sum(item['share'] for item in spaces), 1)
+
+    def test_02_sampling(self):
+        profiler = HotKeyProfiler(sample_rate=0.1)
+        con = self.mesh(profiler)
+        for _ in range(1000):
+            con.select(512, 'hot')
+        top = profiler.top(1)[0]
+        self.assertTrue(50 < top['count'] < 150)
+        self.assertEqual(top['estimate'], top['count'] * 10)
+        profiler.reset()
+        self.assertEqual(profiler.top(), [])
+
+    def test_03_window(self):
+        profiler = HotKeyProfiler(sample_rate=1, window=0.2, slices=2)
+        con = self.mesh(profiler)
+        con.select(512, 'old')
+        time.sleep(0.25)
+        con.select(512, 'new')
+        self.assertEqual([item['key'] for item in profiler.top()],
+                         [('new',)])
+        time.sleep(0.25)
+        self.assertEqual(profiler.top_spaces(), [])
+        # Expired slices are dropped
+        con.select(512, 'new')
+        self.assertLessEqual(len(profiler._slices), 3)
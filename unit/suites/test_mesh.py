@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import sys
+import time
+import errno
+import socket
+import threading
+import unittest
+import warnings
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_SYNC,
+    IPROTO_SCHEMA_ID,
+    IPROTO_DATA,
+    IPROTO_ERROR,
+    REQUEST_TYPE_CALL,
+    REQUEST_TYPE_EVAL,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_ERROR
+)
+from tarantool.error import (
+    DatabaseError,
+    NetworkError
+)
+from tarantool.mesh_connection import (
+    MeshConnection,
+    HealthChecker,
+    HedgingPolicy,
+    parse_uri,
+    NodeConnection,
+    LeastOutstandingStrategy,
+    LatencyStrategy,
+    PowerOfTwoStrategy,
+    addr_key,
+    race_connect
+)
+from tarantool.response import unpacker_kwargs
+from tarantool.standin import StandinServer
+
+# Behaviour of fake instances by port
+NODES = {}
+
+
+class FakeNode(NodeConnection):
+    '''
+    Instance answering CALL with the 'call' value of its behaviour, EVAL
+    with its 'ro' status, 'lag' and 'vclock' and other requests with
+    [[port]] after a delay. Connecting takes 'connect_delay'.
+    INSERT fails on a read-only instance.
+    '''
+
+    def _opt_reconnect(self):
+        if not self.connected:
+            time.sleep(NODES[self.port].get('connect_delay', 0))
+        if NODES[self.port].get('down'):
+            self.connected = False
+            raise NetworkError(socket.error(errno.ECONNREFUSED,
+                                            'Connection refused'))
+        self.connected = True
+
+    def send_raw(self, data, span=None):
+        node = NODES[self.port]
+        unpacker = msgpack.Unpacker(**unpacker_kwargs())
+        unpacker.feed(data)
+        unpacker.unpack()  # length
+        header = unpacker.unpack()
+        node['requests'] = node.get('requests', 0) + 1
+        time.sleep(node.get('delay', 0))
+        code = header[IPROTO_CODE]
+        data = [[self.port]]
+        if code == REQUEST_TYPE_CALL:
+            data = [node['call']]
+        elif code == REQUEST_TYPE_EVAL:
+            data = [node.get('ro', False), node.get('lag'),
+                    node.get('vclock', [])]
+        elif code == REQUEST_TYPE_INSERT and node.get('ro'):
+            return msgpack.packb({IPROTO_CODE: REQUEST_TYPE_ERROR | 7}) + \
+                msgpack.packb({IPROTO_ERROR: "Can't modify data because "
+                               "this instance is in read-only mode."})
+        node.setdefault('codes', []).append(code)
+        return msgpack.packb({IPROTO_CODE: 0,
+                              IPROTO_SYNC: header.get(IPROTO_SYNC, 0),
+                              IPROTO_SCHEMA_ID: 1}) + \
+            msgpack.packb({IPROTO_DATA: data})
+
+
+class FakeMesh(MeshConnection):
+    node_class = FakeNode
+
+
+class TestSuite_Mesh(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' MESH '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        NODES.clear()
+        self.addrs = []
+        for port in (3301, 3302, 3303):
+            NODES[port] = {}
+            self.addrs.append({'host': 'localhost', 'port': port})
+
+    def mesh(self, strategy_class, **kwargs):
+        con = FakeMesh(self.addrs, strategy_class=strategy_class,
+                       connect_now=False, **kwargs)
+        self.addCleanup(con.close)
+        return con
+
+    def load(self, con, threads=6, requests=20):
+        def worker():
+            for _ in range(requests):
+                con.select(512, 1)
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return dict((port, NODES[port].get('requests', 0)) for port in NODES)
+
+    def test_00_least_outstanding(self):
+        con = self.mesh(LeastOutstandingStrategy)
+        for node in NODES.values():
+            node['delay'] = 0.002
+        counts = self.load(con)
+        self.assertEqual(sum(counts.values()), 120)
+        for count in counts.values():
+            self.assertGreater(count, 20)
+        stats = con.node_stats()
+        self.assertEqual(len(stats), 3)
+        self.assertEqual(sum(s['requests'] for s in stats), 120)
+        self.assertTrue(all(s['inflight'] == 0 for s in stats))
+        self.assertTrue(all(s['latency'] > 0 for s in stats))
+
+    def test_01_latency(self):
+        con = self.mesh(LatencyStrategy)
+        NODES[3301]['delay'] = 0.05
+        NODES[3302]['delay'] = 0.001
+        NODES[3303]['delay'] = 0.001
+        latency = con.ping_nodes()
+        self.assertGreater(latency[('localhost', 3301)], 0.04)
+        counts = self.load(con, threads=2)
+        # The slow instance has got only the ping
+        self.assertEqual(counts[3301], 1)
+        self.assertEqual(counts[3302] + counts[3303], 42)
+
+    def test_02_weights(self):
+        self.addrs[0]['weight'] = 4
+        con = self.mesh(PowerOfTwoStrategy)
+        for node in NODES.values():
+            node['delay'] = 0.001
+        counts = self.load(con)
+        self.assertGreater(counts[3301], counts[3302])
+        self.assertGreater(counts[3301], counts[3303])
+
+    def test_03_unavailable(self):
+        con = self.mesh(LeastOutstandingStrategy)
+        NODES[3302]['down'] = True
+        for _ in range(10):
+            self.assertIn(con.select(512, 1)[0][0], (3301, 3303))
+        self.assertEqual(con.ping_nodes()[('localhost', 3302)], None)
+        for node in NODES.values():
+            node['down'] = True
+        self.assertRaises(NetworkError, con.select, 512, 1)
+
+    def test_04_health_check(self):
+        con = self.mesh(LeastOutstandingStrategy)
+        checker = HealthChecker(con, max_failures=2, ejection_time=0.05,
+                                max_ejection_time=10)
+        con.health_checker = checker
+        stats = con.strategy.stats
+
+        # Dead instance is ejected after failed pings
+        NODES[3302]['down'] = True
+        checker.check()
+        self.assertTrue(stats[('localhost', 3302)].healthy)
+        checker.check()
+        self.assertFalse(stats[('localhost', 3302)].healthy)
+        NODES[3302]['down'] = False
+        for _ in range(10):
+            self.assertIn(con.select(512, 1)[0][0], (3301, 3303))
+        self.assertEqual(NODES[3302].get('requests', 0), 0)
+
+        # It's re-admitted after the ejection time
+        checker.check()
+        self.assertFalse(stats[('localhost', 3302)].healthy)
+        time.sleep(0.06)
+        checker.check()
+        self.assertTrue(stats[('localhost', 3302)].healthy)
+
+        # Slow instance is ejected for twice as long
+        NODES[3302]['delay'] = 0.05
+        checker.check()
+        node = stats[('localhost', 3302)]
+        self.assertFalse(node.healthy)
+        self.assertEqual(node.ejections, 2)
+        self.assertGreater(node.ejected_until - time.time(), 0.07)
+        self.assertEqual([s['healthy'] for s in con.node_stats()].count(False),
+                         1)
+
+        # The background thread pings instances
+        NODES[3301]['down'] = True
+        checker.interval = 0.01
+        checker.start()
+        time.sleep(0.2)
+        self.assertFalse(stats[('localhost', 3301)].healthy)
+        con.close()
+        self.assertIs(con.health_checker._thread, None)
+
+    def test_05_discovery(self):
+        self.assertEqual(parse_uri('user:pass@example.org:3301'),
+                         {'host': 'example.org', 'port': 3301})
+        self.assertEqual(parse_uri('3301', 'example.org'),
+                         {'host': 'example.org', 'port': 3301})
+        self.assertEqual(parse_uri('/var/run/tarantool.sock'), None)
+
+        con = self.mesh(LeastOutstandingStrategy,
+                        cluster_discovery_function='cluster',
+                        cluster_discovery_delay=0.01)
+        NODES[3304] = {}
+        NODES[3305] = {'down': True}
+        for port in (3301, 3302, 3303):
+            NODES[port]['call'] = ['localhost:3301', 'localhost:3302',
+                                   'replicator:secret@localhost:3304',
+                                   'localhost:3305']
+        deadline = time.time() + 5
+        while ('localhost', 3304) not in con.strategy.stats and \
+                time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([addr['port'] for addr in con.strategy.addrs],
+                         [3301, 3302, 3304])
+        self.assertEqual(sorted(s['port'] for s in con.node_stats()),
+                         [3301, 3302, 3304])
+        # The removed instance is disconnected
+        self.assertNotIn(('localhost', 3303), con._nodes)
+        con.discovery.stop()
+        for port in NODES:
+            NODES[port]['requests'] = 0
+        self.load(con, threads=3, requests=10)
+        self.assertEqual(NODES[3303]['requests'], 0)
+        self.assertGreater(NODES[3304]['requests'], 0)
+
+    def test_06_read_write_split(self):
+        NODES[3301]['call'] = []
+        NODES[3302]['ro'] = True
+        NODES[3303]['ro'] = True
+        con = self.mesh(LeastOutstandingStrategy, read_write_split=True,
+                        ro_functions=['stats'])
+        con.refresh_roles()
+        self.assertEqual([s['ro'] for s in con.node_stats()],
+                         [False, True, True])
+        for _ in range(4):
+            self.assertEqual(con.insert(512, [1])[0][0], 3301)
+            self.assertIn(con.select(512, 1)[0][0], (3302, 3303))
+        NODES[3302]['call'] = NODES[3303]['call'] = ['replica']
+        self.assertEqual(con.call('stats').data, [['replica']])
+        self.assertEqual(con.call('f', mode='ro').data, [['replica']])
+        self.assertEqual(con.call('f').data, [[]])
+        self.assertNotIn(REQUEST_TYPE_INSERT, NODES[3302]['codes'])
+        self.assertNotIn(1, NODES[3301]['codes'])
+
+        # Re-election: the write is retried on the new leader
+        NODES[3301]['ro'] = True
+        NODES[3303]['ro'] = False
+        self.assertEqual(con.insert(512, [1])[0][0], 3303)
+        self.assertEqual([s['ro'] for s in con.node_stats()],
+                         [True, True, False])
+        # A write to a read-only cluster fails
+        NODES[3303]['ro'] = True
+        self.assertRaises(DatabaseError, con.insert, 512, [1])
+
+    def test_07_lag(self):
+        NODES[3302].update(ro=True, lag=10.0)
+        NODES[3303].update(ro=True, lag=0.1)
+        con = self.mesh(LeastOutstandingStrategy, read_write_split=True,
+                        max_lag=1.0)
+        con.refresh_roles()
+        for _ in range(4):
+            self.assertEqual(con.select(512, 1)[0][0], 3303)
+        # Reads go to the leader if all replicas lag
+        NODES[3303]['lag'] = 5.0
+        con.refresh_roles()
+        self.assertEqual(con.select(512, 1)[0][0], 3301)
+
+    def test_08_read_your_writes(self):
+        NODES[3301]['vclock'] = [10]
+        NODES[3302].update(ro=True, vclock=[9])
+        NODES[3303].update(ro=True, vclock={1: 10})
+        con = self.mesh(LeastOutstandingStrategy, read_write_split=True,
+                        read_your_writes=True, read_your_writes_timeout=2)
+        con.refresh_roles()
+        self.assertEqual(con.select(512, 1)[0][0] in (3302, 3303), True)
+        con.insert(512, [1])
+        for _ in range(4):
+            self.assertEqual(con.select(512, 1)[0][0], 3303)
+
+        # The read waits for a replica to catch up
+        NODES[3301]['vclock'] = [11]
+        con.insert(512, [2])
+
+        def catch_up():
+            time.sleep(0.05)
+            NODES[3302]['vclock'] = [11]
+        thread = threading.Thread(target=catch_up)
+        thread.start()
+        self.assertEqual(con.select(512, 1)[0][0], 3302)
+        thread.join()
+
+        # and falls back to the leader on timeout
+        con.read_your_writes_timeout = 0.05
+        NODES[3301]['vclock'] = [12]
+        con.insert(512, [3])
+        self.assertEqual(con.select(512, 1)[0][0], 3301)
+
+    def test_09_race_connect(self):
+        NODES[3301].update(down=True, connect_delay=0.3)
+        NODES[3302]['connect_delay'] = 0.05
+        con = self.mesh(LeastOutstandingStrategy)
+        nodes = [con._new_node(addr) for addr in self.addrs]
+        started = time.time()
+        # 3302 is started 0.1s after 3301 and wins before 3303 is started
+        self.assertIs(race_connect(nodes, stagger=0.1), nodes[1])
+        self.assertLess(time.time() - started, 0.25)
+        time.sleep(0.2)
+        self.assertTrue(nodes[1].connected)
+        self.assertFalse(nodes[2].connected)
+
+        # Failed attempts don't wait for the stagger
+        for node in NODES.values():
+            node.update(down=True, connect_delay=0)
+        nodes = [con._new_node(addr) for addr in self.addrs]
+        started = time.time()
+        self.assertRaises(NetworkError, race_connect, nodes, 10)
+        self.assertLess(time.time() - started, 1)
+
+        # Instances of a load balancing strategy are connected at once
+        for node in NODES.values():
+            node.update(down=False, connect_delay=0.1)
+        NODES[3301]['down'] = True
+        started = time.time()
+        self.assertEqual(con._warm_nodes(self.addrs), {
+            ('localhost', 3301): False, ('localhost', 3302): True,
+            ('localhost', 3303): True})
+        self.assertLess(time.time() - started, 0.25)
+
+    def test_10_hedging(self):
+        policy = HedgingPolicy(max_delay=0.02, budget=0, burst=1,
+                               min_samples=5)
+        con = self.mesh(LeastOutstandingStrategy, hedging=policy)
+        # The first candidate is the primary, the next one the hedge
+        con.strategy.choose = lambda candidates: candidates[0]
+        NODES[3301]['delay'] = 0.2
+        started = time.time()
+        self.assertEqual(con.select(512, 1)[0][0], 3302)
+        self.assertLess(time.time() - started, 0.15)
+        # The budget is exhausted
+        self.assertEqual(con.select(512, 1)[0][0], 3301)
+        self.assertEqual(policy.to_dict(), {
+            'requests': 2, 'fired': 1, 'won': 1, 'throttled': 1,
+            'outstanding': 0, 'delay': 0.02})
+        # Writes aren't hedged
+        con.insert(512, [1])
+        self.assertEqual(policy.requests, 2)
+
+        # The delay follows the latency of reads
+        NODES[3301]['delay'] = 0.001
+        for _ in range(40):
+            con.select(512, 1)
+        self.assertLess(policy.delay(), 0.02)
+        self.assertGreaterEqual(policy.delay(), 0.001)
+        # Reads are sent by reusable threads
+        self.assertEqual(con._hedge_workers._threads, 2)
+
+        # Hedges in flight are limited
+        policy = HedgingPolicy(max_delay=0.01, budget=1, burst=10,
+                               max_outstanding=1)
+        con = self.mesh(LeastOutstandingStrategy, hedging=policy)
+        con.strategy.choose = lambda candidates: candidates[0]
+        for port in (3301, 3302):
+            NODES[port]['delay'] = 0.2
+        threads = [threading.Thread(target=con.select, args=(512, 1))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((policy.fired, policy.throttled), (1, 1))
+        self.assertEqual(policy.to_dict()['outstanding'], 0)
+
+        # The read is sent by the calling thread if no thread is free
+        policy = HedgingPolicy(workers=0)
+        con = self.mesh(LeastOutstandingStrategy, hedging=policy)
+        NODES[3301]['delay'] = NODES[3302]['delay'] = 0
+        self.assertEqual(len(con.select(512, 1)), 1)
+        self.assertEqual(policy.fired, 0)
+
+    def test_11_dead_instance(self):
+        servers = [StandinServer().start() for _ in range(3)]
+        for server in servers:
+            self.addCleanup(server.stop)
+            server.create_space('test')
+        addrs = [{'host': server.host, 'port': server.port}
+                 for server in servers]
+        con = MeshConnection(addrs, strategy_class=LeastOutstandingStrategy,
+                             reconnect_delay=0.1, reconnect_max_attempts=10)
+        self.addCleanup(con.close)
+        # The first candidate is always chosen
+        con.strategy.choose = lambda candidates: candidates[0]
+        con.select('test', 1)
+        servers[0].stop()
+        dead = con.strategy.stats[(servers[0].host, servers[0].port)]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            started = time.time()
+            for _ in range(6):
+                con.select('test', 1)
+            # A dead instance costs a single attempt to connect
+            self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(caught, [])
+        self.assertEqual(dead.failures, 1)
+        self.assertGreater(dead.retry_at, time.time())
+        self.assertNotIn(dead, con.strategy.candidates())
+
+        # It is tried again after the retry delay
+        servers[0].start()
+        time.sleep(0.15)
+        for _ in range(6):
+            con.select('test', 1)
+        self.assertEqual(dead.failures, 0)
+        self.assertGreater(dead.requests, 1)
+
+    def test_12_eject_on_request(self):
+        con = self.mesh(LeastOutstandingStrategy, health_check_interval=5)
+        con.strategy.choose = lambda candidates: candidates[0]
+        NODES[3301]['down'] = True
+        stats = con.strategy.stats[('localhost', 3301)]
+        # The first failed connect ejects the instance
+        self.assertEqual(con.select(512, 1)[0][0], 3302)
+        self.assertFalse(stats.healthy)
+        self.assertNotIn(stats, con.strategy.candidates())
+        self.assertEqual(con.select(512, 1)[0][0], 3302)
+        self.assertEqual(stats.errors, 1)
+
+        with self.assertRaises(ValueError):
+            FakeMesh(self.addrs, health_check_interval=1, connect_now=False)
+        with self.assertRaises(ValueError):
+            FakeMesh(self.addrs, read_write_split=True, connect_now=False)
+
+    def test_13_update_race(self):
+        strategy = LeastOutstandingStrategy(self.addrs)
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    strategy.choose(strategy.candidates())
+                    strategy.getnext()
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target=reader)
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            self.addCleanup(sys.setswitchinterval, interval)
+        thread.start()
+        try:
+            for num in range(2000):
+                strategy.update(self.addrs[num % 3:] or self.addrs)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(strategy.stats),
+                         sorted(addr_key(addr) for addr in strategy.addrs))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import sys
+import unittest
+
+from tarantool.error import DatabaseError
+from tarantool.mesh_connection import LeastOutstandingStrategy
+from tarantool.metrics import (
+    Histogram,
+    Metrics
+)
+
+from .test_mesh import (
+    NODES,
+    FakeMesh
+)
+
+
+class TestSuite_Metrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' METRICS '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def test_00_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(99), 0.0)
+        values = [i / 100000.0 for i in range(1, 10001)]
+        for value in values:
+            histogram.record(value)
+        self.assertEqual(histogram.count, 10000)
+        self.assertEqual(histogram.max, 0.1)
+        for percent in (50, 90, 99, 99.9):
+            exact = values[int(percent / 100.0 * len(values)) - 1]
+            self.assertLessEqual(abs(histogram.percentile(percent) - exact),
+                                 exact / 8)
+        self.assertEqual(histogram.percentile(100), 0.1)
+        # Small values are exact
+        histogram = Histogram()
+        for usec in (1, 2, 3, 15):
+            histogram.record(usec / 1000000.0)
+        self.assertEqual(histogram.percentile(75), 3 / 1000000.0)
+        self.assertEqual(histogram.cumulative((0.000002, 0.00001, 1)),
+                         [2, 3, 4])
+
+    def test_01_requests(self):
+        NODES.clear()
+        NODES[3301] = {'ro': True}
+        metrics = Metrics()
+        con = FakeMesh([{'host': 'localhost', 'port': 3301}],
+                       strategy_class=LeastOutstandingStrategy,
+                       connect_now=False, metrics=metrics)
+        self.addCleanup(con.close)
+        for _ in range(3):
+            con.select(512, 1)
+        con.ping()
+        self.assertRaises(DatabaseError, con.insert, 512, [1])
+
+        snapshot = metrics.snapshot()
+        requests = dict((item['op'], item) for item in snapshot['requests'])
+        self.assertEqual(sorted(requests), ['insert', 'ping', 'select'])
+        select = requests['select']
+        self.assertEqual((select['space'], select['node'], select['count']),
+                         (512, 'localhost:3301', 3))
+        self.assertEqual(requests['ping']['space'], None)
+        self.assertGreater(select['bytes_sent'], 0)
+        self.assertGreater(select['bytes_received'], 0)
+        self.assertGreater(select['latency']['max'], 0)
+        self.assertEqual(requests['insert']['errors'], 1)
+        self.assertEqual(snapshot['errors'], [{
+            'op': 'insert', 'space': 512, 'node': 'localhost:3301',
+            'error': 'ER_READONLY', 'count': 1}])
+
+        text = metrics.prometheus()
+        self.assertIn('# TYPE tarantool_client_request_duration_seconds '
+                      'histogram\n', text)
+        self.assertIn('tarantool_client_request_duration_seconds_count'
+                      '{op="select",space="512",node="localhost:3301"} 3\n',
+                      text)
+        self.assertIn('tarantool_client_request_duration_seconds_bucket'
+                      '{op="ping",space="",node="localhost:3301",le="+Inf"}'
+                      ' 1\n', text)
+        self.assertIn('tarantool_client_errors_total{op="insert",space="512",'
+                      'node="localhost:3301",error="ER_READONLY"} 1\n', text)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['requests'], [])
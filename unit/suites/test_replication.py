@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_LSN,
+    IPROTO_SERVER_ID,
+    IPROTO_SPACE_ID,
+    IPROTO_INDEX_ID,
+    IPROTO_KEY,
+    IPROTO_TUPLE,
+    REQUEST_TYPE_OK,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_REPLACE,
+    REQUEST_TYPE_UPDATE,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_UPSERT,
+    IPROTO_OPS,
+    ITERATOR_GE,
+    ITERATOR_LT,
+    ITERATOR_REQ
+)
+from tarantool.connection import Connection
+from tarantool.error import InterfaceError, NetworkError
+from tarantool.schema import Schema, SchemaSpace, SchemaIndex
+from tarantool.replication import Row, apply_ops
+from tarantool.cache import SubscribeCache
+from tarantool.mirror import Mirror
+from tarantool.cdc import ChangeConsumer, FileCheckpoint
+from tarantool.export import JoinExporter, read_export
+from tarantool.utils import version_id
+
+
+class FakeResponse(object):
+    def __init__(self, header, body):
+        self.header = header
+        self.code = header.get(IPROTO_CODE)
+        self.body = body
+        self.data = body.get(IPROTO_TUPLE)
+
+
+class FakeConnection(object):
+    '''
+    Serves SELECT from a dict and SUBSCRIBE from a queue of rows.
+    '''
+    def __init__(self):
+        self.schema = Schema(self)
+        space = SchemaSpace([512, 1, 'test', 'memtx', 0, {}, []],
+                            self.schema.schema)
+        SchemaIndex([512, 0, 'primary', 'tree', {'unique': True},
+                     [[0, 'unsigned']]], space)
+        SchemaIndex([512, 1, 'secondary', 'tree', {'unique': False},
+                     [[1, 'string']]], space)
+        self.tuples = {}
+        self.snapshot = []
+        self.rows = queue.Queue()
+        self.selects = 0
+        self.server_vclock = [0]
+        self._socket = object()
+
+    def select(self, space_no, key):
+        self.selects += 1
+        tpl = self.tuples.get(key[0])
+        return FakeResponse({}, {IPROTO_TUPLE: [tpl] if tpl else []})
+
+    def eval(self, expr):
+        return [self.server_vclock]
+
+    def join(self, server_uuid):
+        for tpl in self.snapshot:
+            yield FakeResponse({IPROTO_CODE: REQUEST_TYPE_INSERT},
+                               {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: tpl})
+
+    def connect(self):
+        self._socket = object()
+
+    def subscribe(self, cluster_uuid, server_uuid, vclock):
+        while True:
+            row = self.rows.get()
+            if row is None:
+                return
+            yield row
+
+    def shutdown(self):
+        self.rows.put(None)
+
+    def close(self):
+        self._socket = None
+
+    def push(self, code, lsn, body):
+        self.rows.put(FakeResponse(
+            {IPROTO_CODE: code, IPROTO_LSN: lsn, IPROTO_SERVER_ID: 1},
+            body))
+
+
+def pack_frame(header, body=None):
+    payload = msgpack.packb(header)
+    if body is not None:
+        payload += msgpack.packb(body)
+    return b'\xce' + struct.pack('>I', len(payload)) + payload
+
+
+class TestSuite_Replication(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' REPLICATION '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.con = FakeConnection()
+        self.cache = None
+
+    def tearDown(self):
+        if self.cache is not None:
+            self.cache.stop()
+
+    def start_cache(self):
+        self.cache = SubscribeCache(self.con, self.con, 'cluster', 'server')
+        self.cache.start()
+
+    def wait_lsn(self, follower, lsn):
+        deadline = time.time() + 5
+        while follower.vclock.get(1) != lsn and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(follower.vclock.get(1), lsn)
+
+    def test_00_row_decode(self):
+        row = Row({IPROTO_CODE: REQUEST_TYPE_UPDATE, IPROTO_LSN: 7},
+                  {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1],
+                   IPROTO_TUPLE: [['=', 1, 'x']]})
+        self.assertTrue(row.is_dml)
+        self.assertEqual(row.op, 'update')
+        self.assertEqual(row.ops, [['=', 1, 'x']])
+        self.assertIsNone(row.tuple)
+        self.assertEqual(row.primary_key([0]), (1,))
+
+        row = Row({IPROTO_CODE: REQUEST_TYPE_REPLACE},
+                  {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: ['a', 2, 'b']})
+        self.assertEqual(row.primary_key([1, 0]), (2, 'a'))
+
+        row = Row({IPROTO_CODE: REQUEST_TYPE_DELETE},
+                  {IPROTO_SPACE_ID: 512, IPROTO_INDEX_ID: 1,
+                   IPROTO_KEY: ['a']})
+        self.assertIsNone(row.primary_key([0]))
+
+        self.assertFalse(Row({IPROTO_CODE: REQUEST_TYPE_OK}, {}).is_dml)
+
+    def test_01_cache_hit(self):
+        self.start_cache()
+        self.con.tuples[1] = [1, 'a']
+        self.assertEqual(self.cache.get('test', 1), [[1, 'a']])
+        # Results are copies, mutating them doesn't spoil the cache
+        self.cache.get('test', 1).append([2, 'b'])
+        self.assertEqual(self.cache.get('test', [1]), [[1, 'a']])
+        self.assertEqual(self.con.selects, 1)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_02_cache_update(self):
+        self.start_cache()
+        self.con.tuples[1] = [1, 'a']
+        self.cache.get('test', 1)
+        # Heartbeats and rows of unknown spaces are skipped
+        self.con.push(REQUEST_TYPE_OK, 1, {})
+        self.con.push(REQUEST_TYPE_INSERT, 2,
+                      {IPROTO_SPACE_ID: 513, IPROTO_TUPLE: [1]})
+        self.con.push(REQUEST_TYPE_REPLACE, 3,
+                      {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: [1, 'b']})
+        self.wait_lsn(self.cache, 3)
+        self.assertEqual(self.cache.get('test', 1), [[1, 'b']])
+        self.con.push(REQUEST_TYPE_DELETE, 4,
+                      {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1]})
+        self.wait_lsn(self.cache, 4)
+        self.assertEqual(self.cache.get('test', 1), [])
+        self.assertEqual(self.con.selects, 1)
+
+    def test_03_cache_evict(self):
+        self.start_cache()
+        self.con.tuples[1] = [1, 'a']
+        self.con.tuples[2] = [2, 'b']
+        self.cache.get('test', 1)
+        self.cache.get('test', 2)
+        self.assertEqual(len(self.cache), 2)
+        self.con.push(REQUEST_TYPE_UPDATE, 1,
+                      {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1],
+                       IPROTO_TUPLE: [['=', 1, 'c']]})
+        self.wait_lsn(self.cache, 1)
+        self.assertEqual(len(self.cache), 1)
+        # DELETE through a secondary index flushes the whole space
+        self.con.push(REQUEST_TYPE_DELETE, 2,
+                      {IPROTO_SPACE_ID: 512, IPROTO_INDEX_ID: 1,
+                       IPROTO_KEY: ['b']})
+        self.wait_lsn(self.cache, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_04_cache_stop(self):
+        self.start_cache()
+        self.con.tuples[1] = [1, 'a']
+        self.cache.get('test', 1)
+        self.cache.stop()
+        self.assertFalse(self.cache.running)
+        self.assertEqual(len(self.cache), 0)
+        self.cache.get('test', 1)
+        self.assertEqual(self.con.selects, 2)
+
+    def test_05_apply_ops(self):
+        tpl = [2, 2, 'tuple_3']
+        self.assertEqual(apply_ops(tpl, [('+', 1, 3)]), [2, 5, 'tuple_3'])
+        self.assertEqual(apply_ops(tpl, [(':', 2, 3, 2, 'lalal')]),
+                         [2, 2, 'tuplalal_3'])
+        self.assertEqual(apply_ops(tpl, [('!', 2, '1'), ('#', 3, 1)]),
+                         [2, 2, '1'])
+        self.assertEqual(apply_ops(tpl, [('=', 3, 'x'), ('=', -1, 'y')]),
+                         [2, 2, 'tuple_3', 'y'])
+        self.assertEqual(apply_ops(tpl, [('=', 1, 'x')], index_base=1),
+                         ['x', 2, 'tuple_3'])
+        self.assertEqual(tpl, [2, 2, 'tuple_3'])
+        with self.assertRaises(IndexError):
+            apply_ops(tpl, [('+', 5, 1)])
+
+    def test_06_mirror(self):
+        self.con.snapshot = [[i, 'name_%d' % (i % 3)] for i in range(10)]
+        mirror = Mirror(self.con, 'server', ['test'],
+                        indexes={'test': ['secondary']})
+        mirror.start()
+        try:
+            self.assertEqual(mirror.select('test', 5), [[5, 'name_2']])
+            mirror.select('test', 5)[0][1] = 'name_0'
+            self.assertEqual(mirror.select('test', 5), [[5, 'name_2']])
+            self.assertEqual(len(mirror.select('test')), 10)
+            self.assertEqual(
+                [t[0] for t in mirror.select('test', 'name_1',
+                                             index='secondary')],
+                [1, 4, 7])
+            self.assertEqual(
+                [t[0] for t in mirror.select('test', 'name_1', index=1,
+                                             iterator=ITERATOR_GE,
+                                             limit=4, offset=1)],
+                [4, 7, 2, 5])
+            self.assertEqual(
+                [t[0] for t in mirror.select('test', 'name_1', index=1,
+                                             iterator=ITERATOR_LT)],
+                [9, 6, 3, 0])
+            self.assertEqual(
+                [t[0] for t in mirror.select('test', 'name_2', index=1,
+                                             iterator=ITERATOR_REQ)],
+                [8, 5, 2])
+
+            self.con.push(REQUEST_TYPE_UPDATE, 1,
+                          {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1],
+                           IPROTO_TUPLE: [['=', 1, 'name_2']]})
+            self.con.push(REQUEST_TYPE_DELETE, 2,
+                          {IPROTO_SPACE_ID: 512, IPROTO_KEY: [2]})
+            self.con.push(REQUEST_TYPE_UPSERT, 3,
+                          {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: [5, 'x'],
+                           IPROTO_OPS: [['=', 1, 'name_0']]})
+            self.con.push(REQUEST_TYPE_UPSERT, 4,
+                          {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: [10, 'name_2'],
+                           IPROTO_OPS: [['=', 1, 'name_0']]})
+            self.wait_lsn(mirror, 4)
+            self.assertEqual(
+                [t[0] for t in mirror.select('test', 'name_2', index=1)],
+                [1, 8, 10])
+            self.assertEqual(mirror.select('test', [5]), [[5, 'name_0']])
+            self.assertEqual(mirror.select('test', 2), [])
+            self.con.server_vclock = [6]
+            self.assertEqual(mirror.lag(self.con), 2)
+        finally:
+            mirror.stop()
+        self.assertIsNone(mirror.error)
+        with self.assertRaises(InterfaceError):
+            mirror.select('test', 5)
+
+    def test_07_mirror_error(self):
+        self.con.snapshot = [[1, 'name_1']]
+        mirror = Mirror(self.con, 'server', ['test'])
+        mirror.start()
+        try:
+            self.con.push(REQUEST_TYPE_UPDATE, 1,
+                          {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1],
+                           IPROTO_TUPLE: [['+', 1, 1]]})
+            mirror._thread.join(5)
+            self.assertFalse(mirror.running)
+            self.assertIsInstance(mirror.error, TypeError)
+            with self.assertRaises(InterfaceError):
+                mirror.select('test', 1)
+        finally:
+            mirror.stop()
+
+    def test_08_shutdown_unblocks_reader(self):
+        con = Connection(None, None, connect_now=False)
+        con._socket, peer = socket.socketpair()
+        errors = []
+
+        def reader():
+            try:
+                con._read_response()
+            except NetworkError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        time.sleep(0.05)
+        con.shutdown()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        con.close()
+        peer.close()
+
+    def consume(self, workers):
+        con = Connection(None, None, connect_now=False)
+        con.schema = self.con.schema
+        con._socket, master = socket.socketpair()
+        tmpdir = tempfile.mkdtemp()
+        checkpoint = FileCheckpoint(os.path.join(tmpdir, 'vclock.json'))
+        consumer = ChangeConsumer(con, 'cluster', 'server', checkpoint,
+                                  spaces=['test'], batch_size=2,
+                                  workers=workers)
+        self.assertEqual(consumer.vclock, {})
+        rows = [
+            ({IPROTO_CODE: REQUEST_TYPE_INSERT, IPROTO_LSN: 1,
+              IPROTO_SERVER_ID: 1},
+             {IPROTO_SPACE_ID: 512, IPROTO_TUPLE: [1, 'a']}),
+            ({IPROTO_CODE: REQUEST_TYPE_INSERT, IPROTO_LSN: 2,
+              IPROTO_SERVER_ID: 1},
+             {IPROTO_SPACE_ID: 513, IPROTO_TUPLE: [1]}),
+            ({IPROTO_CODE: REQUEST_TYPE_OK}, None),
+            ({IPROTO_CODE: REQUEST_TYPE_DELETE, IPROTO_LSN: 3,
+              IPROTO_SERVER_ID: 1},
+             {IPROTO_SPACE_ID: 512, IPROTO_KEY: [1]}),
+        ]
+        master.sendall(b''.join(pack_frame(*row) for row in rows))
+        batches = []
+
+        def sink(events):
+            batches.append(events)
+            if events[-1].lsn == 3:
+                consumer.stop()
+
+        try:
+            consumer.consume(sink)
+        finally:
+            con.close()
+            master.close()
+        try:
+            events = [event for batch in batches for event in batch]
+            self.assertEqual([(e.op, e.key, e.lsn) for e in events],
+                             [('insert', [1], 1), ('delete', [1], 3)])
+            self.assertEqual(events[0].tuple, [1, 'a'])
+            self.assertEqual(checkpoint.load(), {1: 3})
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_09_cdc(self):
+        self.consume(workers=0)
+
+    def test_10_cdc_workers(self):
+        self.consume(workers=2)
+
+    def export(self, workers):
+        con = Connection(None, None, connect_now=False)
+        con.schema = self.con.schema
+        con.version_id = version_id(1, 7, 0)
+        con.connected = True
+        con._socket, master = socket.socketpair()
+        ok = ({IPROTO_CODE: REQUEST_TYPE_OK}, {})
+        rows = [ok]
+        for i in range(10):
+            rows.append(({IPROTO_CODE: REQUEST_TYPE_INSERT},
+                         {IPROTO_SPACE_ID: 512 + i % 2,
+                          IPROTO_TUPLE: [i, 'tuple_%d' % i]}))
+        rows.append(ok)
+        rows.append(({IPROTO_CODE: REQUEST_TYPE_DELETE, IPROTO_LSN: 1},
+                     {IPROTO_SPACE_ID: 512, IPROTO_KEY: [0]}))
+        rows.append(ok)
+
+        def serve():
+            # Reply once JOIN is received
+            master.recv(1024)
+            master.sendall(b''.join(pack_frame(*row) for row in rows))
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            exporter = JoinExporter(con, 'server', tmpdir, spaces=['test'],
+                                    workers=workers, batch_size=3)
+            stats = exporter.run()
+            self.assertEqual(stats.rows, 6)
+            self.assertTrue(stats.bytes > 0)
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['512.final.msgpack', '512.msgpack'])
+            self.assertEqual(
+                list(read_export(os.path.join(tmpdir, '512.msgpack'))),
+                [[i, 'tuple_%d' % i] for i in range(0, 10, 2)])
+            self.assertEqual(
+                list(read_export(os.path.join(tmpdir, '512.final.msgpack'))),
+                [['delete', [0], None, None]])
+        finally:
+            thread.join()
+            con.close()
+            master.close()
+            shutil.rmtree(tmpdir)
+
+    def test_11_export(self):
+        self.export(workers=0)
+
+    def test_12_export_workers(self):
+        self.export(workers=2)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import sys
+import time
+import unittest
+
+from tarantool.error import (
+    DatabaseError,
+    InterfaceError
+)
+from tarantool.sharded_connection import (
+    ShardedConnection,
+    bucket_id_strcrc32
+)
+
+
+class FakeResponse(list):
+    @property
+    def data(self):
+        return list(self)
+
+
+class FakeReplicaset(object):
+    '''
+    Replica set storing `buckets`: select returns [[name, key]] or all
+    [name, bucket_id] tuples without a key, methods of spaces called by
+    vshard.storage.call return their arguments, other functions return
+    its name.
+    '''
+
+    def __init__(self, name, buckets, owners, delay=0):
+        self.name = name
+        self.buckets = buckets
+        self.owners = owners
+        self.delay = delay
+        self.requests = []
+        self.tuples = [[self.name, bucket_id] for bucket_id in sorted(buckets)]
+
+    def call(self, func_name, args):
+        self.requests.append(func_name)
+        if func_name == 'vshard.storage.buckets_discovery':
+            return FakeResponse([sorted(self.buckets)])
+        if func_name != 'vshard.storage.call':
+            return FakeResponse([self.name])
+        bucket_id, mode, func_name, args = args
+        if bucket_id not in self.buckets:
+            return FakeResponse([None, {
+                'type': 'ShardingError', 'code': 1, 'name': 'WRONG_BUCKET',
+                'destination': self.owners.get(bucket_id)}])
+        if func_name == 'fail':
+            return FakeResponse([None, {'code': 32, 'message': 'oops'}])
+        if func_name.startswith('box.space.'):
+            self.requests.append(func_name)
+            return FakeResponse(args)
+        return FakeResponse([self.name, mode, args])
+
+    def select(self, space_name, key, **kwargs):
+        self.requests.append('select')
+        time.sleep(self.delay)
+        if key is None:
+            return FakeResponse(self.tuples[:kwargs.get('limit')])
+        return FakeResponse([[self.name, key]])
+
+    def close(self):
+        pass
+
+
+class TestSuite_Sharding(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' SHARDING '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.owners = {}
+        for bucket_id in range(1, 11):
+            self.owners[bucket_id] = 'rs1' if bucket_id <= 5 else 'rs2'
+        self.rs1 = FakeReplicaset('rs1', set(range(1, 6)), self.owners, 0.05)
+        self.rs2 = FakeReplicaset('rs2', set(range(6, 11)), self.owners, 0.05)
+        self.con = ShardedConnection({'rs1': self.rs1, 'rs2': self.rs2},
+                                     bucket_count=10)
+
+    def test_00_bucket_id(self):
+        # vshard.router.bucket_id_strcrc32(1) of a 3000 bucket cluster
+        self.assertEqual(bucket_id_strcrc32(1), 477)
+        self.assertEqual(bucket_id_strcrc32(1), bucket_id_strcrc32('1'))
+        self.assertEqual(bucket_id_strcrc32(1.0), bucket_id_strcrc32(1))
+        self.assertNotEqual(bucket_id_strcrc32([1, 'a']),
+                            bucket_id_strcrc32([1, 'b']))
+        self.assertEqual(bucket_id_strcrc32([1, 'a']),
+                         bucket_id_strcrc32(['1', 'a']))
+        for key in range(100):
+            self.assertTrue(1 <= bucket_id_strcrc32(key, 10) <= 10)
+
+    def test_01_route(self):
+        self.assertEqual(self.con.select('test', bucket_id=3, key=1)[0][0],
+                         'rs1')
+        self.assertEqual(self.con.insert('test', [1], 7)[0], [1])
+        self.assertEqual(self.rs2.requests[-1], 'box.space.test:insert')
+        # Buckets are discovered once
+        self.con.select('test', bucket_id=8, key=1)
+        self.assertEqual(self.rs1.requests.count(
+            'vshard.storage.buckets_discovery'), 1)
+        key = 12345
+        name = 'rs1' if bucket_id_strcrc32(key, 10) <= 5 else 'rs2'
+        self.assertEqual(self.con.select('test', key)[0][0], name)
+        self.assertRaises(InterfaceError, self.con.select, 'test',
+                          bucket_id=11)
+        self.assertRaises(InterfaceError, self.con.select, 'test',
+                          bucket_id=12)
+        # Unknown buckets trigger discovery at most once per delay
+        self.assertEqual(self.rs1.requests.count(
+            'vshard.storage.buckets_discovery'), 1)
+        self.con.discovery_delay = 0
+        self.assertRaises(InterfaceError, self.con.select, 'test',
+                          bucket_id=11)
+        self.assertEqual(self.rs1.requests.count(
+            'vshard.storage.buckets_discovery'), 2)
+
+    def test_05_moved_bucket_write(self):
+        self.assertEqual(self.con.route(7), 'rs2')
+        # The bucket moves while the map still points to the old owner
+        self.rs2.buckets.remove(7)
+        self.rs1.buckets.add(7)
+        self.owners[7] = 'rs1'
+        self.assertEqual(self.con.replace('test', [1, 'a'], 7).data,
+                         [[1, 'a']])
+        self.assertEqual(self.rs1.requests[-1], 'box.space.test:replace')
+        self.assertEqual(self.con.route(7), 'rs1')
+        self.assertEqual(self.con.update('test', 1, [('+', 2, 1)],
+                                         bucket_id=7, index='pk').data,
+                         [[1], [['+', 3, 1]]])
+        self.assertEqual(self.rs1.requests[-1],
+                         'box.space.test.index.pk:update')
+        self.assertEqual(self.con.delete('test', [1], bucket_id=7).data,
+                         [[1]])
+        self.assertEqual(self.con.upsert('test', [1], [('=', 0, 2)],
+                                         7).data,
+                         [[1], [['=', 1, 2]]])
+
+    def test_02_call(self):
+        self.assertEqual(self.con.call(2, 'f', [1], mode='read'),
+                         ['rs1', 'read', [1]])
+        # The bucket moves to another replica set
+        self.rs1.buckets.remove(2)
+        self.rs2.buckets.add(2)
+        self.owners[2] = 'rs2'
+        self.assertEqual(self.con.call(2, 'f', [1]), ['rs2', 'write', [1]])
+        self.assertEqual(self.con.route(2), 'rs2')
+        with self.assertRaises(DatabaseError) as cm:
+            self.con.call(2, 'fail')
+        self.assertEqual(cm.exception.args[0], 32)
+
+    def test_03_fan_out(self):
+        keys = list(range(20))
+        started = time.time()
+        responses = self.con.select_many('test', keys)
+        elapsed = time.time() - started
+        self.assertEqual([response[0][1] for response in responses], keys)
+        for key, response in zip(keys, responses):
+            name = 'rs1' if bucket_id_strcrc32(key, 10) <= 5 else 'rs2'
+            self.assertEqual(response[0][0], name)
+        # Replica sets are queried in parallel
+        self.assertLess(elapsed, 20 * 0.05)
+        result = self.con.map_call('name')
+        self.assertEqual(dict((name, response.data[0])
+                              for name, response in result.items()),
+                         {'rs1': 'rs1', 'rs2': 'rs2'})
+
+    def test_04_map_select(self):
+        self.assertEqual(self.con.map_select('test', sort_key=1, limit=4),
+                         [['rs1', 1], ['rs1', 2], ['rs1', 3], ['rs1', 4]])
+        self.rs2.tuples = [['rs2', 0]]
+        self.assertEqual(self.con.map_select('test', sort_key=[1], limit=2),
+                         [['rs2', 0], ['rs1', 1]])
+        self.rs2.tuples = []
+        self.assertEqual(self.con.map_select('test', sort_key=1), [
+            ['rs1', bucket_id] for bucket_id in range(1, 6)])
+        self.assertEqual(len(self.con.map_select('test', limit=3)), 3)
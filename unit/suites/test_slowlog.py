@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import logging
+import re
+import sys
+import unittest
+
+from tarantool.error import DatabaseError
+from tarantool.mesh_connection import LeastOutstandingStrategy
+from tarantool.schema import (
+    SchemaIndex,
+    SchemaSpace
+)
+from tarantool.slowlog import (
+    SlowRequestLog,
+    truncate
+)
+
+from .test_mesh import (
+    NODES,
+    FakeMesh
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSuite_SlowLog(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' SLOW LOG '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        NODES.clear()
+        NODES[3301] = {'delay': 0.02, 'call': []}
+        self.handler = ListHandler()
+        self.logger = logging.getLogger('tarantool.slowlog.test')
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def mesh(self, **kwargs):
+        self.slow_log = SlowRequestLog(0.01, self.logger, **kwargs)
+        con = FakeMesh([{'host': 'localhost', 'port': 3301}],
+                       strategy_class=LeastOutstandingStrategy,
+                       connect_now=False, slow_log=self.slow_log)
+        self.addCleanup(con.close)
+        space = SchemaSpace([512, 0, 'users', 'memtx', 0, {},
+                             [{'name': 'id', 'type': 'unsigned'}]],
+                            con.schema.schema)
+        SchemaIndex([512, 0, 'primary', 'tree', {'unique': True},
+                     [[0, 'unsigned']]], space)
+        return con
+
+    def test_00_log(self):
+        con = self.mesh(key_length=12)
+        response = con.select(512, 1)
+        record = self.handler.records[0]
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertTrue(re.match(
+            r'^Slow request: \d+\.\d ms select space=users\(512\) '
+            r'index=primary\(0\) key=\[1\] response=\d+ bytes '
+            r'sync=%d node=localhost:3301$' % response.sync,
+            record.getMessage()))
+        entry = record.tarantool_request
+        self.assertEqual((entry['op'], entry['space'], entry['error']),
+                         ('select', 'users(512)', None))
+        self.assertGreaterEqual(entry['latency'], 0.02)
+
+        con.call('func', [1])
+        self.assertIn(' call function=func ',
+                      self.handler.records[1].getMessage())
+        NODES[3301]['ro'] = True
+        self.assertRaises(DatabaseError, con.insert, 513, ['x' * 20])
+        message = self.handler.records[2].getMessage()
+        self.assertIn(" space=513 key=['xxxxxxx... ", message)
+        self.assertTrue(message.endswith(' error=ER_READONLY'))
+
+        # Fast requests aren't logged
+        NODES[3301]['delay'] = 0
+        con.select(512, 1)
+        self.assertEqual(len(self.handler.records), 3)
+        self.assertEqual(truncate('abc', 5), "'abc'")
+
+    def test_01_rate_limit(self):
+        con = self.mesh(rate=0, burst=2)
+        for _ in range(5):
+            con.ping()
+        self.assertEqual(len(self.handler.records), 2)
+        self.assertEqual((self.slow_log.logged, self.slow_log.suppressed),
+                         (2, 3))
+        self.slow_log.rate = 1000
+        con.ping()
+        self.assertTrue(self.handler.records[2].getMessage().endswith(
+            ' (3 slow requests not logged)'))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import socket
+import struct
+import sys
+import time
+import unittest
+
+import msgpack
+
+import tarantool
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_SYNC,
+    ITERATOR_GE,
+    ITERATOR_LT,
+    REQUEST_TYPE_PING
+)
+from tarantool.error import (
+    DatabaseError,
+    NetworkError
+)
+from tarantool.response import unpacker_kwargs
+from tarantool.standin import StandinServer
+
+
+def ping_packet(sync):
+    header = msgpack.packb({IPROTO_CODE: REQUEST_TYPE_PING,
+                            IPROTO_SYNC: sync})
+    return msgpack.packb(len(header)) + header
+
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class TestSuite_Standin(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' STAND-IN SERVER '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.srv = StandinServer(users={'test': 'secret'}).start()
+        self.addCleanup(self.srv.stop)
+        self.srv.create_space('users', format=[
+            {'name': 'id', 'type': 'unsigned'},
+            {'name': 'name', 'type': 'string'},
+            {'name': 'visits', 'type': 'unsigned'}])
+        self.srv.create_index('users', 'name', [[1, 'string']])
+
+    def connect(self, **kwargs):
+        con = tarantool.Connection('127.0.0.1', self.srv.port,
+                                   reconnect_delay=0.01, **kwargs)
+        self.addCleanup(con.close)
+        return con
+
+    def test_00_dml(self):
+        con = self.connect()
+        for num, name in enumerate(('c', 'a', 'b')):
+            con.insert('users', [num, name, 0])
+        with self.assertRaisesRegexp(DatabaseError, 'Duplicate key'):
+            con.insert('users', [1, 'x', 0])
+        with self.assertRaisesRegexp(DatabaseError, 'Duplicate key'):
+            con.insert('users', [5, 'a', 0])
+        self.assertEqual(con.select('users', 'b', index='name').data,
+                         [[2, 'b', 0]])
+        self.assertEqual([row[0] for row in con.select('users')], [0, 1, 2])
+        self.assertEqual([row[1] for row in con.select(
+            'users', 'b', index='name', iterator=ITERATOR_GE)], ['b', 'c'])
+        self.assertEqual([row[0] for row in con.select(
+            'users', 2, iterator=ITERATOR_LT, limit=1)], [1])
+        self.assertEqual(con.select('users', [], offset=1, limit=1).data,
+                         [[1, 'a', 0]])
+        self.assertEqual(con.update('users', 1, [('+', 'visits', 2),
+                                                 ('=', 1, 'z')]).data,
+                         [[1, 'z', 2]])
+        con.upsert('users', [1, 'u', 0], [('+', 2, 1)])
+        con.upsert('users', [7, 'u', 0], [('+', 2, 1)])
+        self.assertEqual(con.select('users', [1]).data, [[1, 'z', 3]])
+        self.assertEqual(con.select('users', [7]).data, [[7, 'u', 0]])
+        self.assertEqual(con.replace('users', [7, 'v', 1]).data,
+                         [[7, 'v', 1]])
+        self.assertEqual(con.delete('users', 7).data, [[7, 'v', 1]])
+        self.assertEqual(con.delete('users', 7).data, [])
+        with self.assertRaisesRegexp(DatabaseError, 'does not exist'):
+            con.select(600)
+
+        self.srv.read_only = True
+        with self.assertRaisesRegexp(DatabaseError, 'read-only'):
+            con.insert('users', [8, 'w', 0])
+
+    def test_01_auth(self):
+        con = self.connect(user='test', password='secret')
+        self.assertEqual(con.insert('users', [1, 'a', 0]).data, [[1, 'a', 0]])
+        with self.assertRaisesRegexp(NetworkError, 'Incorrect password'):
+            self.connect(user='test', password='wrong')
+        with self.assertRaisesRegexp(NetworkError, 'is not found'):
+            self.connect(user='nobody', password='secret')
+
+    def test_02_call_eval(self):
+        self.srv.functions['sum'] = lambda *args: [sum(args)]
+        self.srv.evals['return box.info.ro'] = lambda: [False]
+        con = self.connect()
+        self.assertEqual(con.call('sum', [1, 2, 3]).data, [6])
+        con.call_16 = True
+        self.assertEqual(con.call('sum', [1, 2]).data, [[3]])
+        self.assertEqual(con.eval('return box.info.ro').data, [False])
+        self.assertEqual(con.eval('return ...', [1, 'a']).data, [1, 'a'])
+        with self.assertRaisesRegexp(DatabaseError, 'not defined'):
+            con.call('missing')
+
+    def test_03_pipelining(self):
+        self.srv.jitter = 0.05
+        sock = socket.create_connection(('127.0.0.1', self.srv.port))
+        self.addCleanup(sock.close)
+        recv_exactly(sock, 128)
+        sock.sendall(b''.join(ping_packet(sync) for sync in range(1, 21)))
+        syncs = []
+        for _ in range(20):
+            size = struct.unpack('>I', recv_exactly(sock, 5)[1:])[0]
+            unpacker = msgpack.Unpacker(**unpacker_kwargs())
+            unpacker.feed(recv_exactly(sock, size))
+            syncs.append(unpacker.unpack()[IPROTO_SYNC])
+        self.assertEqual(sorted(syncs), list(range(1, 21)))
+        # Jitter reorders responses
+        self.assertNotEqual(syncs, list(range(1, 21)))
+
+    def test_04_faults(self):
+        con = self.connect()
+        self.srv.latency = 0.05
+        started = time.time()
+        con.ping()
+        self.assertGreaterEqual(time.time() - started, 0.05)
+        self.srv.latency = 0
+
+        self.srv.drop_connections()
+        time.sleep(0.05)
+        self.assertEqual(self.srv.connections, 0)
+        self.assertEqual(con.insert('users', [1, 'a', 0]).data,
+                         [[1, 'a', 0]])
+
+        self.srv.disconnect_rate = 1.0
+        sock = socket.create_connection(('127.0.0.1', self.srv.port))
+        self.addCleanup(sock.close)
+        recv_exactly(sock, 128)
+        sock.sendall(ping_packet(1))
+        self.assertEqual(recv_exactly(sock, 5), b'')
+        self.assertEqual(self.srv.disconnects, 1)
+
+    def test_05_restart_and_schema(self):
+        con = self.connect()
+        con.insert('users', [1, 'a', 0])
+        port = self.srv.port
+        self.srv.stop()
+        self.srv.start()
+        self.assertEqual(self.srv.port, port)
+        # The connection is restored and the schema is reloaded when the
+        # server reports a new schema version
+        self.srv.create_space('items', parts=[[0, 'string']])
+        self.assertEqual(con.select('users', 1).data, [[1, 'a', 0]])
+        self.assertEqual(con.schema_version, self.srv.schema_version)
+        self.assertEqual(con.insert('items', ['x']).data, [['x']])
+
+    def test_06_pause_blackhole(self):
+        con = self.connect(socket_timeout=0.2)
+        self.srv.pause()
+        started = time.time()
+        with self.assertRaises(NetworkError):
+            con.ping()
+        self.assertGreaterEqual(time.time() - started, 0.2)
+        self.srv.resume()
+
+        sock = socket.create_connection(('127.0.0.1', self.srv.port))
+        self.addCleanup(sock.close)
+        sock.settimeout(5)
+        recv_exactly(sock, 128)
+        self.srv.pause()
+        handled = self.srv.requests
+        sock.sendall(ping_packet(7))
+        time.sleep(0.1)
+        self.assertEqual(self.srv.requests, handled)
+        # The request is answered after the server resumes
+        self.srv.resume()
+        self.assertEqual(len(recv_exactly(sock, 5)), 5)
+
+        self.srv.blackhole = True
+        sock = socket.create_connection(('127.0.0.1', self.srv.port))
+        self.addCleanup(sock.close)
+        sock.settimeout(0.1)
+        with self.assertRaises(socket.timeout):
+            sock.recv(128)
+        with self.assertRaises(NetworkError):
+            self.connect(connection_timeout=0.1, socket_timeout=0.1)
+
+    def test_07_update_ops(self):
+        self.srv.create_space('tuples')
+        con = self.connect()
+        con.insert('tuples', [2, 2, 'tuple_3'])
+        # The splice offset is numbered from 1, as on the server
+        self.assertEqual(con.update('tuples', 2, [
+            (':', 2, 3, 2, 'lalal')]).data, [[2, 2, 'tuplalal_3']])
+        # Assignment of the field next to the last one appends it
+        self.assertEqual(con.update('tuples', 2, [('=', 3, 'new')]).data,
+                         [[2, 2, 'tuplalal_3', 'new']])
+        self.assertEqual(con.update('tuples', 2, [('#', -1, 1),
+                                                  ('!', 1, 1)]).data,
+                         [[2, 1, 2, 'tuplalal_3']])
+        with self.assertRaisesRegexp(DatabaseError, 'not found') as cm:
+            con.update('tuples', 2, [('=', 9, 0)])
+        self.assertEqual(cm.exception.args[0], 37)
+        with self.assertRaises(DatabaseError) as cm:
+            con.update('tuples', 2, [('+', 3, 1)])
+        self.assertEqual(cm.exception.args[0], 26)
+        with self.assertRaises(DatabaseError) as cm:
+            con.update('tuples', 2, [('?', 1, 1)])
+        self.assertEqual(cm.exception.args[0], 28)
+        self.assertEqual(con.select('tuples', 2).data,
+                         [[2, 1, 2, 'tuplalal_3']])
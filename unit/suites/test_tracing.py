@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import socket
+import struct
+import sys
+import threading
+import time
+import unittest
+import warnings
+
+import msgpack
+
+from tarantool.connection import Connection
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_DATA,
+    IPROTO_ERROR,
+    IPROTO_SCHEMA_ID,
+    IPROTO_SYNC,
+    REQUEST_TYPE_ERROR,
+    REQUEST_TYPE_INSERT
+)
+from tarantool.error import DatabaseError
+from tarantool.mesh_connection import LeastOutstandingStrategy
+from tarantool.response import unpacker_kwargs
+from tarantool.tracing import (
+    PHASES,
+    Tracer
+)
+
+from .test_mesh import (
+    NODES,
+    FakeMesh
+)
+
+
+def serve(sock, delay):
+    '''
+    Answer requests read from the socket after a delay: INSERT fails
+    with ER_TUPLE_FOUND, other requests return [[1]].
+    '''
+    while True:
+        try:
+            data = sock.recv(65536)
+        except socket.error:
+            return
+        if not data:
+            return
+        unpacker = msgpack.Unpacker(**unpacker_kwargs())
+        unpacker.feed(data)
+        unpacker.unpack()  # length
+        header = unpacker.unpack()
+        time.sleep(delay)
+        if header[IPROTO_CODE] == REQUEST_TYPE_INSERT:
+            body = msgpack.packb({
+                IPROTO_CODE: REQUEST_TYPE_ERROR | 3,
+                IPROTO_SYNC: header[IPROTO_SYNC]}) + \
+                msgpack.packb({IPROTO_ERROR: 'Duplicate key exists'})
+        else:
+            body = msgpack.packb({IPROTO_CODE: 0,
+                                  IPROTO_SYNC: header[IPROTO_SYNC],
+                                  IPROTO_SCHEMA_ID: 1}) + \
+                msgpack.packb({IPROTO_DATA: [[1]]})
+        sock.sendall(b'\xce' + struct.pack('>I', len(body)) + body)
+
+
+class TestSuite_Tracing(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' TRACING '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.spans = []
+        self.tracer = Tracer([self.spans.append])
+
+    def connect(self, delay):
+        client, server = socket.socketpair()
+        thread = threading.Thread(target=serve, args=(server, delay))
+        thread.daemon = True
+        thread.start()
+        con = Connection('localhost', 3301, connect_now=False,
+                         tracer=self.tracer)
+        con._socket = client
+        con.connected = True
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+        return con
+
+    def test_00_phases(self):
+        con = self.connect(0.02)
+        response = con.select(512, 1)
+        self.assertEqual(len(self.spans), 1)
+        span = self.spans[0]
+        self.assertEqual(sorted(span.phases), sorted(PHASES))
+        self.assertGreaterEqual(span.phases['wait'], 15000000)
+        self.assertGreaterEqual(span.total_ns, sum(span.phases.values()))
+        self.assertEqual((span.op, span.space_no, span.node, span.error),
+                         ('select', 512, 'localhost:3301', None))
+        self.assertEqual(span.sync, response.sync)
+        self.assertGreater(span.request_bytes, 0)
+        self.assertGreater(span.response_bytes, 0)
+        self.assertEqual(span.to_dict()['op'], 'select')
+
+        self.assertRaises(DatabaseError, con.insert, 512, [1])
+        self.assertEqual(self.spans[1].error, 'ER_TUPLE_FOUND')
+
+    def test_01_sampling(self):
+        con = self.connect(0)
+        self.tracer.sample_rate = 0
+        for _ in range(10):
+            con.ping()
+        self.assertEqual(self.spans, [])
+        self.tracer.sample_rate = 0.5
+        for _ in range(200):
+            con.ping()
+        self.assertTrue(50 < len(self.spans) < 150)
+
+    def test_02_callback_error(self):
+        con = self.connect(0)
+
+        def fail(span):
+            raise ValueError()
+        self.tracer.callbacks.insert(0, fail)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            con.ping()
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(len(self.spans), 1)
+
+    def test_03_mesh(self):
+        NODES.clear()
+        NODES[3301] = {'delay': 0.01}
+        con = FakeMesh([{'host': 'localhost', 'port': 3301}],
+                       strategy_class=LeastOutstandingStrategy,
+                       connect_now=False, tracer=self.tracer)
+        self.addCleanup(con.close)
+        con.select(512, 1)
+        span = self.spans[0]
+        self.assertEqual(span.node, 'localhost:3301')
+        self.assertIn('encode', span.phases)
+        self.assertIn('decode', span.phases)
+        self.assertGreaterEqual(span.total_ns, 10000000)
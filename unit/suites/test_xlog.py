@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import msgpack
+
+from tarantool.const import (
+    IPROTO_CODE,
+    IPROTO_INDEX_ID,
+    IPROTO_KEY,
+    IPROTO_LSN,
+    IPROTO_SERVER_ID,
+    IPROTO_TIMESTAMP,
+    IPROTO_SPACE_ID,
+    IPROTO_TUPLE,
+    REQUEST_TYPE_INSERT,
+    REQUEST_TYPE_DELETE,
+    REQUEST_TYPE_NOP,
+    XLOG_FIXHEADER_SIZE,
+    XLOG_ROW_MARKER,
+    XLOG_EOF_MARKER
+)
+from tarantool.error import XlogError
+from tarantool.utils import crc32c
+from tarantool.xlog import (
+    XlogReader,
+    XlogWriter,
+    read_xlogs,
+    xlog_name
+)
+
+
+def pack_block(rows):
+    data = b''
+    for header, body in rows:
+        data += msgpack.packb(header)
+        if body is not None:
+            data += msgpack.packb(body)
+    fixheader = XLOG_ROW_MARKER + msgpack.packb(len(data)) + \
+        msgpack.packb(0) + msgpack.packb(crc32c(data))
+    padding = XLOG_FIXHEADER_SIZE - len(fixheader)
+    fixheader += msgpack.packb(b'\x00' * (padding - 1), use_bin_type=False)
+    return fixheader + data
+
+
+def insert(lsn, space_no, tpl):
+    return ({IPROTO_CODE: REQUEST_TYPE_INSERT, IPROTO_LSN: lsn,
+             IPROTO_SERVER_ID: 1, IPROTO_TIMESTAMP: 1.5},
+            {IPROTO_SPACE_ID: space_no, IPROTO_TUPLE: tpl})
+
+
+class TestSuite_Xlog(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        print(' XLOG '.center(70, '='), file=sys.stderr)
+        print('-' * 70, file=sys.stderr)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, blocks, filetype=b'SNAP', eof=True):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as fp:
+            fp.write(filetype + b'\n0.13\nVersion: 1.7.6\n'
+                     b'Instance: 3b151c25-4c4a-4b5d-8042-0f1b3a6f61c3\n'
+                     b'VClock: {1: 10}\n\n')
+            for block in blocks:
+                fp.write(block)
+            if eof:
+                fp.write(XLOG_EOF_MARKER)
+        return path
+
+    def test_00_read(self):
+        path = self.write('00000000000000000010.snap', [
+            pack_block([insert(1, 512, [1, 'a'])]),
+            pack_block([insert(2, 512, [2, 'b']), insert(3, 513, [3]),
+                        ({IPROTO_CODE: REQUEST_TYPE_NOP, IPROTO_LSN: 4,
+                          IPROTO_SERVER_ID: 1}, None)]),
+        ])
+        with XlogReader(path) as reader:
+            self.assertEqual(reader.filetype, 'SNAP')
+            self.assertEqual(reader.version, '0.13')
+            self.assertEqual(reader.vclock, {1: 10})
+            self.assertEqual(reader.meta['Version'], '1.7.6')
+            rows = list(reader)
+            self.assertTrue(reader.eof)
+        self.assertEqual([row.lsn for row in rows], [1, 2, 3, 4])
+        self.assertEqual(rows[0].tuple, [1, 'a'])
+        self.assertEqual(rows[0].op, 'insert')
+        self.assertFalse(rows[3].is_dml)
+
+        with XlogReader(path, spaces=[513]) as reader:
+            self.assertEqual([row.tuple for row in reader], [[3]])
+
+    def test_01_errors(self):
+        block = pack_block([insert(1, 512, [1])])
+        path = self.write('corrupt.xlog', [block[:-1] + b'\x00'], b'XLOG')
+        with XlogReader(path) as reader:
+            self.assertRaises(XlogError, list, reader)
+        with XlogReader(path, verify=False) as reader:
+            self.assertEqual(len(list(reader)), 1)
+
+        path = self.write('magic.xlog', [b'\x00' * 20], b'XLOG')
+        with XlogReader(path) as reader:
+            self.assertRaises(XlogError, list, reader)
+
+        path = os.path.join(self.tmpdir, 'bad.snap')
+        with open(path, 'wb') as fp:
+            fp.write(b'VYLOG\n0.13\n\n')
+        self.assertRaises(XlogError, XlogReader, path)
+
+        # A file being written stops at the last complete block
+        path = self.write('tail.xlog', [block, block[:-3]], b'XLOG', eof=False)
+        with XlogReader(path) as reader:
+            self.assertEqual(len(list(reader)), 1)
+            self.assertFalse(reader.eof)
+
+    def test_02_parallel(self):
+        paths = []
+        lsn = 0
+        for name in ('1.xlog', '2.xlog'):
+            blocks = []
+            for _ in range(50):
+                rows = []
+                for _ in range(20):
+                    lsn += 1
+                    rows.append(insert(lsn, 512 + lsn % 2, [lsn, 'x' * 10]))
+                blocks.append(pack_block(rows))
+            paths.append(self.write(name, blocks, b'XLOG'))
+
+        expected = [row.lsn for row in read_xlogs(paths, spaces=[512])]
+        self.assertEqual(expected, list(range(2, lsn + 1, 2)))
+        with XlogReader(paths[0]) as reader:
+            self.assertEqual(len(reader.segments(4)), 4)
+        result = [row.lsn for row in read_xlogs(paths, spaces=[512],
+                                                workers=2,
+                                                segment_size=4096)]
+        self.assertEqual(result, expected)
+
+    def test_03_write(self):
+        vclock = {1: 10, 2: 5}
+        self.assertEqual(xlog_name(vclock), '00000000000000000015.snap')
+        path = os.path.join(self.tmpdir, xlog_name(vclock))
+        with XlogWriter(path, vclock=vclock, block_size=1024,
+                        instance_uuid='3b151c25-4c4a-4b5d-8042-0f1b3a6f61c3'
+                        ) as writer:
+            for i in range(1000):
+                writer.insert(512 + i % 2, [i, u'строка %d' % i], 1.5)
+            self.assertFalse(os.path.exists(path))
+        with XlogReader(path) as reader:
+            self.assertEqual(reader.filetype, 'SNAP')
+            self.assertEqual(reader.vclock, vclock)
+            self.assertEqual(reader.meta['Instance'],
+                             '3b151c25-4c4a-4b5d-8042-0f1b3a6f61c3')
+            self.assertGreater(len(list(reader.blocks())), 10)
+            rows = list(reader)
+            self.assertTrue(reader.eof)
+        self.assertEqual([row.lsn for row in rows], list(range(1, 1001)))
+        self.assertEqual(rows[7].server_id, 0)
+        self.assertEqual(rows[7].space_no, 513)
+        self.assertEqual(rows[7].tuple, [7, u'строка 7'])
+        self.assertEqual(rows[7].timestamp, 1.5)
+
+        # Rows are copied into an xlog with LSNs of the writer
+        path = os.path.join(self.tmpdir, xlog_name(vclock, 'XLOG'))
+        with XlogWriter(path, 'XLOG', vclock=vclock, version='0.12') as writer:
+            for row in rows[:3]:
+                writer.write_row(row)
+            writer.write(REQUEST_TYPE_DELETE, {IPROTO_SPACE_ID: 512,
+                                               IPROTO_INDEX_ID: 0,
+                                               IPROTO_KEY: [0]})
+        with XlogReader(path) as reader:
+            self.assertEqual(reader.version, '0.12')
+            self.assertEqual(len(list(reader.blocks())), 4)
+            rows = list(reader)
+        self.assertEqual([(row.server_id, row.lsn) for row in rows],
+                         [(1, 11), (1, 12), (1, 13), (1, 14)])
+        self.assertEqual(rows[2].tuple, [2, u'строка 2'])
+        self.assertEqual((rows[3].op, rows[3].key), ('delete', [0]))
+
+        # A failed write leaves no file
+        path = os.path.join(self.tmpdir, 'failed.snap')
+        try:
+            with XlogWriter(path) as writer:
+                writer.insert(512, [1])
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['00000000000000000015.snap',
+                          '00000000000000000015.xlog'])